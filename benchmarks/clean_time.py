@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Batched clean time check and benchmark.
+
+Verifies that clean_time_batch (the single user and the batch computation) produces exactly the clean time strings and
+days since of relativedelta and utils.build_clean_time_str for random and edge case clean dates and UTC offsets, with
+NumPy (if installed) and without, then times relativedelta against the batch for a notification bucket.
+
+Usage (from the repository root):
+    python -m benchmarks.clean_time --users 10000
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+from typing import List, Tuple
+
+from dateutil.relativedelta import relativedelta
+
+import clean_time_batch
+import utils
+
+EDGE_DATES = ["2000-02-29 00:00:00", "2020-01-31 23:59:59", "2019-12-31 12:00:00", "2021-02-28 00:00:01",
+              "1999-03-31 06:30:00", "2024-02-29 23:59:59", "1970-01-01 00:00:00", "1969-12-31 23:00:00",
+              "2099-12-31 23:59:59", "2031-01-31 00:00:00"]
+EDGE_NOWS = [datetime.datetime(2024, 2, 29, 0, 0, 0, 500000), datetime.datetime(2023, 3, 1, 0, 0, 0),
+             datetime.datetime(2024, 3, 31, 23, 59, 59, 999999), datetime.datetime(2021, 1, 31, 0, 0, 0)]
+EDGE_OFFSETS = ["", "+00:00", "+05:30", "-08:00", "+14:00", "-00:45"]
+
+
+def scalar_clean_time(clean_date_str: str, offset_str: str, now: datetime.datetime) -> Tuple[str, int]:
+    """Clean time computed with relativedelta for a given UTC time."""
+    clean_date_time = utils.EPOCH + datetime.timedelta(seconds=utils.parse_date_time_to_epoch(clean_date_str))
+    local_dt = now + datetime.timedelta(minutes=utils.parse_utc_offset(offset_str) or 0)
+    return utils.build_clean_time_str(relativedelta(local_dt, clean_date_time)), (local_dt - clean_date_time).days
+
+
+def single_clean_time(clean_date_str: str, offset_str: str, now: datetime.datetime) -> Tuple[str, int]:
+    """Clean time computed like database.get_clean_time_str for a given UTC time."""
+    clean_time = clean_time_batch.compute_clean_time(utils.parse_date_time_to_epoch(clean_date_str),
+                                                     (utils.parse_utc_offset(offset_str) or 0) * 60, now)
+    return utils.format_clean_time_str(*clean_time[:7]), clean_time[7]
+
+
+def batch_clean_times(clean_date_strs: List[str], offset_strs: List[str], now: datetime.datetime) -> list:
+    clean_epochs = [utils.parse_date_time_to_epoch(s) for s in clean_date_strs]
+    offsets = [(utils.parse_utc_offset(s) or 0) * 60 for s in offset_strs]
+    return clean_time_batch.format_clean_times(clean_time_batch.compute_clean_times(clean_epochs, offsets, now))
+
+
+def random_cases(rng: random.Random, count: int) -> Tuple[List[str], List[str]]:
+    dates = [f"{rng.randint(1950, 2040)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+             f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}" for _ in range(count)]
+    offsets = [rng.choice(EDGE_OFFSETS) for _ in range(count)]
+    return dates, offsets
+
+
+def check(rng: random.Random, count: int) -> int:
+    """Compare batch and scalar results, returns the number of mismatches."""
+    cases = [([d for d in EDGE_DATES for _ in EDGE_OFFSETS], EDGE_OFFSETS * len(EDGE_DATES), now)
+             for now in EDGE_NOWS]
+    cases += [random_cases(rng, count) + (datetime.datetime(2020, 1, 1) + datetime.timedelta(
+        seconds=rng.randint(0, 20 * 365 * 86400), microseconds=rng.randint(0, 999999)),) for _ in range(10)]
+    mismatches = 0
+    for dates, offsets, now in cases:
+        expected = [scalar_clean_time(d, o, now) for d, o in zip(dates, offsets)]
+        single = [single_clean_time(d, o, now) for d, o in zip(dates, offsets)]
+        batch = batch_clean_times(dates, offsets, now)
+        for actual, one, exp, d, o in zip(batch, single, expected, dates, offsets):
+            if actual != exp or one != exp:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"MISMATCH {d} {o!r} at {now}: batch {actual}, single {one} != {exp}")
+    return mismatches
+
+
+def bench(rng: random.Random, users: int, repeat: int) -> Tuple[float, float]:
+    dates, offsets = random_cases(rng, users)
+    now = datetime.datetime.utcnow()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        [scalar_clean_time(d, o, now) for d, o in zip(dates, offsets)]
+    scalar = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        batch_clean_times(dates, offsets, now)
+    return scalar, (time.perf_counter() - start) / repeat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="Users per notification bucket")
+    parser.add_argument("--cases", type=int, default=2000, help="Random cases per check round")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    numpy = clean_time_batch.load_numpy()
+    failed = False
+    for name, module in (("numpy", numpy), ("python", None)):
+        if name == "numpy" and numpy is None:
+            print("numpy: not installed, skipped")
+            continue
+        clean_time_batch.numpy = module
+        rng = random.Random(args.seed)
+        mismatches = check(rng, args.cases)
+        failed |= bool(mismatches)
+        scalar, batch = bench(rng, args.users, args.repeat)
+        print(f"{name}: {'OK' if not mismatches else f'{mismatches} MISMATCHES'}  {args.users} users  "
+              f"scalar {scalar * 1000:.1f} ms  batch {batch * 1000:.1f} ms  ({scalar / batch:.1f}x)")
+    clean_time_batch.numpy = numpy
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
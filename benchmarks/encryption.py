@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Encrypted database benchmark.
+
+Measures the cost of SQLCipher's key derivation, the time to open and key a connection (plaintext, keyed with the
+passphrase so SQLCipher derives the key, and keyed with the raw key derived once per process as the bot does) and the
+per-handler latency of the handler scenarios (benchmarks.handlers) on a plaintext and an encrypted copy of the same
+seeded database. Each database mode runs in its own process, as the configuration is read at import. The encrypted
+runs need pysqlcipher3 and are skipped without it.
+
+Usage (from the repository root):
+    python -m benchmarks.encryption --iterations 1000 --users 10000
+    python -m benchmarks.encryption --kdf-iter 64000 --output encryption.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Union
+
+from benchmarks import fakes
+from benchmarks.handlers import get_git_revision, get_scenarios, run_scenario
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSPHRASE = "benchmark passphrase"
+MODES = ("plaintext", "encrypted")
+
+
+def sqlcipher_available() -> bool:
+    import encryption
+    try:
+        encryption.load_sqlcipher()
+    except RuntimeError:
+        return False
+    return True
+
+
+def median_ms(function: Callable[[], None], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def measure_keying(tmp_dir: str, kdf_iter: int, repeat: int) -> Dict[str, float]:
+    """Median ms of the key derivation and of opening a connection and reading from it, per keying method."""
+    import sqlite3
+
+    import encryption
+
+    results = {"derive key": median_ms(lambda: encryption.derive_key(PASSPHRASE, os.urandom(16), kdf_iter), repeat)}
+    plain = os.path.join(tmp_dir, "keying-plain.db")
+    fakes.create_database(plain, 10)
+
+    def open_and_read(driver, path: str, key: Union[str, None] = None, pragmas: List[str] = ()) -> None:
+        connection = driver.connect(path)
+        if key:
+            connection.execute(f'PRAGMA key = "{key}"')
+        for pragma in pragmas:
+            connection.execute(pragma)
+        connection.execute("SELECT COUNT(*) FROM USERS").fetchone()
+        connection.close()
+
+    results["open plaintext"] = median_ms(lambda: open_and_read(sqlite3, plain), repeat)
+    if sqlcipher_available():
+        sqlcipher = encryption.load_sqlcipher()
+        encrypted = os.path.join(tmp_dir, "keying-encrypted.db")
+        raw_key = encryption.database_key(encrypted, PASSPHRASE, None, kdf_iter)
+        encryption.encrypt_database(plain, encrypted, raw_key)
+        passphrase = PASSPHRASE.replace("'", "''")
+        results["open encrypted, passphrase (KDF per connection)"] = median_ms(
+            lambda: open_and_read(sqlcipher, encrypted, pragmas=[f"PRAGMA key = '{passphrase}'",
+                                                                 f"PRAGMA kdf_iter = {kdf_iter}"]), repeat)
+        results["open encrypted, derived raw key"] = median_ms(lambda: open_and_read(sqlcipher, encrypted, raw_key),
+                                                               repeat)
+    return results
+
+
+def run_mode(mode: str, iterations: int, warmup: int, users: int, only: List[str], seed: int, kdf_iter: int) -> dict:
+    """Run the handler scenarios on a plaintext or encrypted database (in this process)."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "SoberSerenityEncryption.db")
+        fakes.create_database(db_name, users, seed)
+        if mode == "encrypted":
+            import encryption
+            plain, db_name = db_name, os.path.join(tmp_dir, "SoberSerenityEncrypted.db")
+            encryption.encrypt_database(plain, db_name, encryption.database_key(db_name, PASSPHRASE, None, kdf_iter))
+            os.remove(plain)
+            os.environ["SOBER_SERENITY_DB_ENCRYPTED"] = "1"
+            os.environ["SOBER_SERENITY_DB_PASSPHRASE"] = PASSPHRASE
+            os.environ["SOBER_SERENITY_DB_KDF_ITER"] = str(kdf_iter)
+        # Must be set before the bot modules read their configuration
+        os.environ["SOBER_SERENITY_DB_NAME"] = db_name
+        os.environ.setdefault("SOBER_SERENITY_TOKEN", fakes.STUB_TOKEN)
+        import database
+        start = time.perf_counter()
+        database.migrate()
+        first_query_ms = (time.perf_counter() - start) * 1000
+        rng = random.Random(seed)
+        results = {scenario.name: run_scenario(scenario, iterations, warmup, users, rng)
+                   for scenario in get_scenarios() if not only or scenario.name in only}
+        database.POOL.close_all()
+    return {"migrate_ms": first_query_ms, "results": results}
+
+
+def run_child(mode: str, args: argparse.Namespace) -> dict:
+    command = [sys.executable, "-m", "benchmarks.encryption", "--mode", mode, "--iterations", str(args.iterations),
+               "--warmup", str(args.warmup), "--users", str(args.users), "--seed", str(args.seed),
+               "--kdf-iter", str(args.kdf_iter)] + (["--only"] + args.only if args.only else [])
+    result = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd(), check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000, help="Measured calls per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured calls per scenario")
+    parser.add_argument("--users", type=int, default=1000, help="Number of seeded users")
+    parser.add_argument("--kdf-iter", type=int, default=256000, help="KDF iterations of the passphrase")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements of key derivation and connection opening")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--only", nargs="*", default=[], help="Scenario names to run")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.iterations, args.warmup, args.users, args.only, args.seed,
+                                  args.kdf_iter)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        keying = measure_keying(tmp_dir, args.kdf_iter, args.repeat)
+    for name, ms in keying.items():
+        print(f"{name:<50}{ms:>10.2f} ms")
+    modes = [mode for mode in MODES if mode == "plaintext" or sqlcipher_available()]
+    if len(modes) < len(MODES):
+        print("encrypted database: skipped, pysqlcipher3 is not installed")
+    runs = {mode: run_child(mode, args) for mode in modes}
+    print(f"\n{'p50 µs':<30}" + "".join(f"{mode:>12}" for mode in modes) + ("       ratio" if len(modes) > 1 else ""))
+    for scenario, result in runs["plaintext"]["results"].items():
+        line = f"{scenario:<30}" + "".join(f"{runs[mode]['results'][scenario]['p50_us']:>12.1f}" for mode in modes)
+        if len(modes) > 1:
+            line += f"{runs['encrypted']['results'][scenario]['p50_us'] / result['p50_us']:>12.2f}"
+        print(line)
+    print(f"{'migrate (first connection) ms':<30}" + "".join(f"{runs[mode]['migrate_ms']:>12.1f}" for mode in modes))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": get_git_revision(),
+                                "iterations": args.iterations, "users": args.users, "kdf_iter": args.kdf_iter},
+                       "keying_ms": keying, "runs": runs}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
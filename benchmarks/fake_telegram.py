@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Local fake Telegram Bot API endpoint."""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Callable, Union
+from urllib.parse import parse_qsl
+
+# Longest time getUpdates waits for updates
+LONG_POLL_TIMEOUT = 1.0
+
+BOT_INFO = {"id": 123456, "is_bot": True, "first_name": "SoberSerenityBot", "username": "SoberSerenityBot"}
+
+
+class FakeTelegram:
+    """Bot API endpoint answering every method successfully on a local port.
+
+    Point the bot at it with SOBER_SERENITY_BOT_API_URL=<base_url>. An optional fixed latency simulates the round trip
+    to Telegram and `listener` is called with (method, data, arrival time) for every request. Updates added with
+    `push_update` are served to a polling bot by getUpdates, which waits up to a second for updates like a long poll.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0,
+                 listener: Union[Callable[[str, dict, float], None], None] = None) -> None:
+        """
+        :param port: Port to listen on, 0 picks a free port
+        :param latency: Seconds to wait before answering a request
+        :param listener: Called for every request
+        """
+        self.latency = latency
+        self.listener = listener
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._message_ids = count(1)
+        self._update_ids = count(1)
+        self._updates = []
+        self._updates_added = threading.Condition(self._lock)
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Bot API base URL (the bot appends its token)."""
+        return f"http://127.0.0.1:{self._server.server_address[1]}/bot"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FakeTelegram", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push_update(self, update_json: dict) -> None:
+        """Queue an update for getUpdates (the update_id is assigned)."""
+        with self._lock:
+            self._updates.append(dict(update_json, update_id=next(self._update_ids)))
+            self._updates_added.notify_all()
+
+    def _get_updates(self, data: dict) -> list:
+        offset = int(data.get("offset") or 0)
+        timeout = min(float(data.get("timeout") or 0), LONG_POLL_TIMEOUT)
+        with self._lock:
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+            self._updates_added.wait_for(lambda: self._updates, timeout)
+            return list(self._updates)
+
+    def _result(self, method: str, data: dict) -> Union[dict, bool, list]:
+        if method == "getUpdates":
+            return self._get_updates(data)
+        if method == "getMe":
+            return BOT_INFO
+        if method in ("sendMessage", "editMessageText"):
+            return {"message_id": next(self._message_ids), "date": int(time.time()), "text": data.get("text", ""),
+                    "chat": {"id": int(data.get("chat_id", 0)), "type": "private"}, "from": BOT_INFO}
+        return True
+
+    def _handler_class(self) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                arrived = time.perf_counter()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if "json" in self.headers.get("Content-Type", ""):
+                    data = json.loads(body or b"{}")
+                else:
+                    data = dict(parse_qsl(body.decode()))
+                method = self.path.rsplit("/", 1)[-1]
+                with fake._lock:
+                    fake.requests[method] += 1
+                if fake.listener:
+                    fake.listener(method, data, arrived)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                response = json.dumps({"ok": True, "result": fake._result(method, data)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+        return Handler
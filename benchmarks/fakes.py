@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Fakes shared by the benchmarks: a seeded SQLite database, a stub Bot and synthetic updates."""
+import datetime
+import json
+import random
+import sqlite3
+import threading
+import warnings
+from itertools import count
+from queue import Queue
+from typing import Tuple
+
+from telegram import Bot, Update
+from telegram.ext import CallbackContext, Dispatcher
+
+# Any syntactically valid token, the stub bot never talks to Telegram
+STUB_TOKEN = "123456:BENCHMARK"
+
+PRAYER_TITLES = ["LordsPrayer", "SerenityPrayer", "StJosephsPrayer", "TenderAndCompassionateGod", "ThirdStepPrayer",
+                 "SeventhStepPrayer", "EleventhStepPrayer"]
+
+_LOREM = "One day at a time we learn to live with serenity, courage and wisdom. "
+
+
+def create_database(path: str, users: int, seed: int = 0) -> None:
+    """Create and seed a bot database with the legacy, unversioned schema.
+
+    The benchmarks bring it up to date with database.migrate() like the bot does at startup, which also exercises the
+    migrations.
+
+    :param path: Database file
+    :param users: Number of users. Users have IDs 1..users, most of them with a clean date set.
+    :param seed: Random seed
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE USERS(user_id, user_name, first_name, last_name, addictions, clean_date, utc_offset,
+                           daily_notification);
+        CREATE TABLE DAILY_REFLECTION(date, day, month, title, snippet, reference, page, content, copyright,
+                                      website);
+        CREATE TABLE JUST_FOR_TODAY(date, day, month, title, snippet, reference, page, content, just_for_today,
+                                    copyright, website);
+        CREATE TABLE PRAYERS(title, name, prayer);
+        CREATE TABLE MOTIVATIONAL_QUOTES(sl_no, quote);
+    """)
+    date = datetime.date(2020, 1, 1)
+    while date.year == 2020:
+        page = date.timetuple().tm_yday
+        common = (str(date), date.day, date.strftime("%B"), f"Reading {page}", _LOREM, "Basic Text", page,
+                  _LOREM * 25)
+        connection.execute("INSERT INTO DAILY_REFLECTION VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           common + ("Copyright", "https://example.org"))
+        connection.execute("INSERT INTO JUST_FOR_TODAY VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           common + (_LOREM, "Copyright", "https://example.org"))
+        date += datetime.timedelta(days=1)
+    connection.executemany("INSERT INTO PRAYERS VALUES (?, ?, ?)",
+                           [(title, title, _LOREM * 4) for title in PRAYER_TITLES])
+    connection.executemany("INSERT INTO MOTIVATIONAL_QUOTES VALUES (?, ?)",
+                           [(i, f"Quote {i}: {_LOREM}") for i in range(200)])
+    rows = []
+    for user_id in range(1, users + 1):
+        clean_date = "" if user_id % 10 == 0 else \
+            f"{rng.randint(1990, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} " \
+            f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+        notification = f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00" if user_id % 3 == 0 else ""
+        rows.append((user_id, f"user{user_id}", f"First{user_id}", f"Last{user_id}", "", clean_date, "",
+                     notification))
+    connection.executemany("INSERT INTO USERS VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+
+
+class StubRequest:
+    """Bot API request layer recording requests instead of sending them.
+
+    Requests are JSON encoded like the real request layer does, so serialization cost is included in measurements.
+    """
+
+    def __init__(self) -> None:
+        self.requests = []
+        self._lock = threading.Lock()
+        self._message_ids = count(1)
+
+    def post(self, url: str, data: dict, timeout: float = None):
+        json.dumps(data)
+        endpoint = url.rsplit("/", 1)[-1]
+        with self._lock:
+            self.requests.append((endpoint, data))
+        if endpoint == "sendMessage":
+            return {"message_id": next(self._message_ids), "date": 0, "text": data.get("text", ""),
+                    "chat": {"id": data["chat_id"], "type": "private"}}
+        return True
+
+    def stop(self) -> None:
+        pass
+
+
+class StubBot(Bot):
+    """Bot recording Bot API requests instead of sending them."""
+
+    def __init__(self) -> None:
+        super().__init__(STUB_TOKEN, request=StubRequest())
+
+    @property
+    def requests(self) -> list:
+        """(endpoint, data) of all requests."""
+        return self.request.requests
+
+    def sent_messages(self) -> list:
+        """Data of all sendMessage requests."""
+        return [data for endpoint, data in self.requests if endpoint == "sendMessage"]
+
+
+def create_dispatcher(bot: Bot) -> Dispatcher:
+    """Create a dispatcher without worker threads, used to build CallbackContexts."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return Dispatcher(bot, Queue(), workers=0)
+
+
+_update_ids = count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"First{user_id}", "last_name": f"Last{user_id}",
+            "username": f"user{user_id}"}
+
+
+def _chat(user_id: int) -> dict:
+    return {"id": user_id, "type": "private", "first_name": f"First{user_id}", "last_name": f"Last{user_id}",
+            "username": f"user{user_id}"}
+
+
+def command_update_json(user_id: int, text: str) -> dict:
+    """Update JSON of a command message sent by a user."""
+    command_length = len(text.split()[0])
+    return {"update_id": next(_update_ids),
+            "message": {"message_id": next(_update_ids), "date": 0, "chat": _chat(user_id), "from": _user(user_id),
+                        "text": text, "entities": [{"type": "bot_command", "offset": 0, "length": command_length}]}}
+
+
+def callback_update_json(user_id: int, data: str) -> dict:
+    """Update JSON of an inline keyboard button press by a user."""
+    return {"update_id": next(_update_ids),
+            "callback_query": {"id": str(next(_update_ids)), "from": _user(user_id), "chat_instance": str(user_id),
+                               "data": data,
+                               "message": {"message_id": next(_update_ids), "date": 0, "chat": _chat(user_id),
+                                           "text": "menu"}}}
+
+
+def build(update_json: dict, bot: Bot, dispatcher: Dispatcher) -> Tuple[Update, CallbackContext]:
+    """Build Update and CallbackContext as the dispatcher would."""
+    update = Update.de_json(update_json, bot)
+    return update, CallbackContext.from_update(update, dispatcher)
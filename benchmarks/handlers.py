@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Handler micro-benchmarks.
+
+Runs every command and callback handler of soberserenitybot.py against a temporary, seeded SQLite database and a
+stub Bot recording messages instead of sending them, and reports p50/p99 latency and ops/sec per handler.
+
+Usage (from the repository root):
+    python -m benchmarks.handlers --iterations 2000 --output results.json
+    python -m benchmarks.handlers --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+from benchmarks import fakes
+
+
+class Scenario(NamedTuple):
+    """Benchmark scenario.
+
+    name: Scenario name
+    handler: Name of the handler function in soberserenitybot
+    build_json: Callable returning Update JSON for a user ID
+    """
+    name: str
+    handler: str
+    build_json: Callable[[int], dict]
+
+
+def get_scenarios() -> List[Scenario]:
+    """All benchmarked commands and callbacks."""
+    from models import MenuElements
+
+    def command(text: str) -> Callable[[int], dict]:
+        return lambda user_id: fakes.command_update_json(user_id, text)
+
+    def callback(element) -> Callable[[int], dict]:
+        return lambda user_id: fakes.callback_update_json(user_id, element.value.data)
+
+    return [
+        Scenario("start", "start", command("/start")),
+        Scenario("menu", "start", command("/menu")),
+        Scenario("help", "help_command", command("/help")),
+        Scenario("profile", "profile", command("/profile")),
+        Scenario("clean_time", "clean_time", command("/clean_time")),
+        Scenario("set_clean_date", "set_clean_date", command("/set_clean_date 2015-06-01 08:00:00")),
+        Scenario("daily_reflection", "readings", command("/daily_reflection")),
+        Scenario("just_for_today", "readings", command("/just_for_today")),
+        Scenario("serenity_prayer", "prayers", command("/serenity_prayer")),
+        Scenario("third_step_prayer", "prayers", command("/third_step_prayer")),
+        Scenario("set_utc_offset", "set_utc_offset", command("/set_utc_offset +05:30")),
+        Scenario("enable_daily_notification", "enable_daily_notification",
+                 command("/enable_daily_notification 2020-01-01 07:30:00")),
+        Scenario("disable_daily_notification", "disable_daily_notification", command("/disable_daily_notification")),
+        Scenario("unknown_command", "unknown_command", command("/no_such_command")),
+        Scenario("callback_main_menu", "main_menu", callback(MenuElements.MAIN_MENU)),
+        Scenario("callback_profile", "profile", callback(MenuElements.PROFILE)),
+        Scenario("callback_clean_time", "clean_time", callback(MenuElements.CLEAN_TIME)),
+        Scenario("callback_readings_menu", "readings_menu", callback(MenuElements.READINGS)),
+        Scenario("callback_prayers_menu", "prayers_menu", callback(MenuElements.PRAYERS)),
+        Scenario("callback_daily_reflection", "readings", callback(MenuElements.DAILY_REFLECTION)),
+        Scenario("callback_just_for_today", "readings", callback(MenuElements.JUST_FOR_TODAY)),
+        Scenario("callback_lords_prayer", "prayers", callback(MenuElements.LORDS_PRAYER)),
+    ]
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    index = min(len(sorted_samples) - 1, max(0, round(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def run_scenario(scenario: Scenario, iterations: int, warmup: int, users: int, rng: random.Random) -> dict:
+    """Run a scenario and summarize its latency."""
+    import instrumentation
+    import soberserenitybot
+
+    handler = getattr(soberserenitybot, scenario.handler)
+    bot = fakes.StubBot()
+    dispatcher = fakes.create_dispatcher(bot)
+    samples = []
+    for i in range(warmup + iterations):
+        if i == warmup:
+            instrumentation.reset()
+        update, context = fakes.build(scenario.build_json(rng.randint(1, users)), bot, dispatcher)
+        start = time.perf_counter()
+        handler(update, context)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            samples.append(elapsed)
+    stats = instrumentation.get_handler_stats(handler.__name__)
+    samples.sort()
+    return {"handler": scenario.handler,
+            "iterations": iterations,
+            "p50_us": percentile(samples, 0.50) * 1e6,
+            "p99_us": percentile(samples, 0.99) * 1e6,
+            "mean_us": statistics.fmean(samples) * 1e6,
+            "ops_per_sec": len(samples) / sum(samples),
+            "queries_per_call": stats.queries.mean(),
+            "requests_per_call": len(bot.requests) / (warmup + iterations)}
+
+
+def get_git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(iterations: int, warmup: int, users: int, only: List[str], seed: int) -> dict:
+    """Create a temporary database and run all (or only the selected) scenarios."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "SoberSerenityBenchmark.db")
+        fakes.create_database(db_name, users, seed)
+        # Must be set before the bot modules read their configuration
+        os.environ["SOBER_SERENITY_DB_NAME"] = db_name
+        os.environ.setdefault("SOBER_SERENITY_TOKEN", fakes.STUB_TOKEN)
+        import database
+        database.migrate()
+        rng = random.Random(seed)
+        for scenario in get_scenarios():
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = run_scenario(scenario, iterations, warmup, users, rng)
+            print_result(scenario.name, results[scenario.name])
+        database.POOL.close_all()
+    return {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "revision": get_git_revision(),
+                     "python": platform.python_version(),
+                     "platform": platform.platform(),
+                     "iterations": iterations,
+                     "warmup": warmup,
+                     "users": users},
+            "results": results}
+
+
+def print_result(name: str, result: dict) -> None:
+    print(f"{name:<30}{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}{result['ops_per_sec']:>12.0f}"
+          f"{result['queries_per_call']:>8.2f}")
+
+
+def compare(baseline: Dict[str, dict], current: Dict[str, dict]) -> None:
+    """Print p50/p99 and throughput change against a baseline run."""
+    print(f"\n{'scenario':<30}{'p50 Δ%':>10}{'p99 Δ%':>10}{'ops/s Δ%':>12}{'q Δ':>8}")
+    for name, result in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        print(f"{name:<30}{(result['p50_us'] / base['p50_us'] - 1) * 100:>+10.1f}"
+              f"{(result['p99_us'] / base['p99_us'] - 1) * 100:>+10.1f}"
+              f"{(result['ops_per_sec'] / base['ops_per_sec'] - 1) * 100:>+12.1f}"
+              f"{result['queries_per_call'] - base['queries_per_call']:>+8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000, help="Measured calls per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured calls per scenario")
+    parser.add_argument("--users", type=int, default=1000, help="Number of seeded users")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--only", nargs="*", default=[], help="Scenario names to run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<30}{'p50 µs':>10}{'p99 µs':>10}{'ops/s':>12}{'q/call':>8}")
+    report = run(args.iterations, args.warmup, args.users, args.only, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], report["results"])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Update log replay load generator.
+
+Replays an update log (recorded with SOBER_SERENITY_UPDATE_LOG, or synthesized) against the bot's dispatcher and
+handlers, with a temporary seeded database and a local fake Telegram endpoint, and reports throughput, the latency
+from injecting an update to its reply reaching the endpoint, and error counts.
+
+Usage (from the repository root):
+    python -m benchmarks.replay --synthesize 5000 --rate 50 --users 2000 --output updates.log
+    python -m benchmarks.replay updates.log --speed 10 --users 20000
+    python -m benchmarks.replay updates.log --speed max --api-latency-ms 80 --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Tuple
+
+from benchmarks import fakes
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.handlers import get_git_revision, get_scenarios, percentile
+
+# Share of synthesized updates per scenario name, the rest is spread evenly over the other scenarios
+SYNTHETIC_WEIGHTS = {"menu": 20, "callback_main_menu": 10, "clean_time": 10, "callback_clean_time": 10,
+                     "daily_reflection": 8, "callback_daily_reflection": 8, "just_for_today": 6,
+                     "callback_just_for_today": 6}
+
+
+def synthesize(count: int, users: int, rate: float, seed: int) -> Iterator[Tuple[float, dict]]:
+    """Generate (unix time, update JSON) records of a realistic command and callback mix.
+
+    :param count: Number of updates
+    :param users: Number of distinct users
+    :param rate: Updates per second
+    :param seed: Random seed
+    """
+    rng = random.Random(seed)
+    scenarios = get_scenarios()
+    weights = [SYNTHETIC_WEIGHTS.get(scenario.name, 1) for scenario in scenarios]
+    t = time.time()
+    for _ in range(count):
+        t += rng.expovariate(rate)
+        scenario = rng.choices(scenarios, weights)[0]
+        yield round(t, 3), scenario.build_json(rng.randint(1, users))
+
+
+def remap_users(update_json: dict, users: int) -> dict:
+    """Map the user and chat IDs of an update onto IDs 1..users (the seeded users)."""
+    def remap(obj) -> None:
+        if isinstance(obj, dict):
+            for key in ("from", "chat"):
+                if isinstance(obj.get(key), dict) and "id" in obj[key]:
+                    obj[key]["id"] = abs(obj[key]["id"]) % users + 1
+            for value in obj.values():
+                remap(value)
+        elif isinstance(obj, list):
+            for value in obj:
+                remap(value)
+    remap(update_json)
+    return update_json
+
+
+class ResponseTracker:
+    """Matches replies arriving at the fake endpoint with the injected updates, first in first out per chat."""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.unmatched = 0
+        self._pending: Dict[int, Deque[float]] = {}
+        self._outstanding = 0
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def injected(self, chat_id: int) -> None:
+        with self._lock:
+            self._pending.setdefault(chat_id, deque()).append(time.perf_counter())
+            self._outstanding += 1
+
+    def on_request(self, method: str, data: dict, arrived: float) -> None:
+        if method != "sendMessage":
+            return
+        with self._lock:
+            pending = self._pending.get(int(data.get("chat_id", 0)))
+            if not pending:
+                self.unmatched += 1
+                return
+            self.latencies.append(arrived - pending.popleft())
+            self._outstanding -= 1
+            if not self._outstanding:
+                self._done.notify_all()
+
+    def wait(self, timeout: float) -> int:
+        """Wait for all replies, returns the number of updates left without a reply."""
+        with self._lock:
+            self._done.wait_for(lambda: not self._outstanding, timeout)
+            return self._outstanding
+
+
+def replay(records: List[Tuple[float, dict]], speed: float, users: int, api_latency: float, timeout: float,
+           seed: int) -> dict:
+    """Replay update records against the bot and summarize the run.
+
+    :param records: (unix time, update JSON) records
+    :param speed: Speed multiplier for the recorded inter-arrival times, 0 injects as fast as possible
+    :param users: Number of seeded users, update user IDs are mapped onto them
+    :param api_latency: Seconds the fake endpoint waits before answering a request
+    :param timeout: Seconds to wait for outstanding replies after the last update
+    :param seed: Random seed for the database
+    """
+    tracker = ResponseTracker()
+    fake = FakeTelegram(latency=api_latency, listener=tracker.on_request)
+    fake.start()
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "SoberSerenityReplay.db")
+        fakes.create_database(db_name, users, seed)
+        # Must be set before the bot modules read their configuration
+        os.environ["SOBER_SERENITY_DB_NAME"] = db_name
+        os.environ["SOBER_SERENITY_BOT_API_URL"] = fake.base_url
+        os.environ.setdefault("SOBER_SERENITY_TOKEN", fakes.STUB_TOKEN)
+        os.makedirs("Logs", exist_ok=True)
+        import database
+        database.migrate()
+        import outbound
+        from soberserenitybot import SoberSerenity
+        from telegram import Update
+
+        bot = SoberSerenity(fakes.STUB_TOKEN)
+        bot.add_handlers()
+        bot.dispatcher.add_error_handler(lambda update, context: errors.append(repr(context.error)))
+        database.CONTENT_CACHE.load()
+        outbound.OUTBOUND.start()
+        dispatcher_thread = threading.Thread(target=bot.dispatcher.start, name="dispatcher", daemon=True)
+        dispatcher_thread.start()
+
+        updates = [Update.de_json(remap_users(update_json, users), bot.updater.bot) for _, update_json in records]
+        start = time.perf_counter()
+        first_t = records[0][0] if records else 0.0
+        for (t, _), update in zip(records, updates):
+            if speed:
+                delay = (t - first_t) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            tracker.injected(update.effective_chat.id)
+            bot.dispatcher.update_queue.put(update)
+        injected_in = time.perf_counter() - start
+        unanswered = tracker.wait(timeout)
+        elapsed = time.perf_counter() - start
+
+        bot.dispatcher.stop()
+        outbound.OUTBOUND.stop()
+        database.POOL.close_all()
+    fake.stop()
+
+    latencies = sorted(tracker.latencies)
+    answered = len(latencies)
+    return {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "revision": get_git_revision(),
+                     "speed": speed or "max",
+                     "users": users,
+                     "api_latency_ms": api_latency * 1000},
+            "updates": len(records),
+            "answered": answered,
+            "unanswered": unanswered,
+            "unmatched_replies": tracker.unmatched,
+            "errors": len(errors),
+            "error_samples": errors[:10],
+            "inject_rate": len(records) / injected_in if injected_in else 0.0,
+            "throughput": answered / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else 0.0,
+            "p90_ms": percentile(latencies, 0.90) * 1000 if latencies else 0.0,
+            "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else 0.0,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "api_requests": dict(fake.requests)}
+
+
+def write_log(path: str, records: Iterator[Tuple[float, dict]]) -> None:
+    """Write records in the update log format."""
+    with open(path, "w", encoding="utf-8") as f:
+        for t, update_json in records:
+            f.write(json.dumps({"t": t, "u": update_json}, separators=(",", ":")) + "\n")
+
+
+def parse_speed(value: str) -> float:
+    return 0.0 if value == "max" else float(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", help="Update log to replay")
+    parser.add_argument("--synthesize", type=int, metavar="COUNT",
+                        help="Synthesize COUNT updates instead of reading a log")
+    parser.add_argument("--rate", type=float, default=20.0, help="Updates per second of synthesized updates")
+    parser.add_argument("--output", help="Write synthesized updates to this log file instead of replaying them")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="Speed multiplier, e.g. 1, 10 or max")
+    parser.add_argument("--users", type=int, default=1000, help="Number of distinct (seeded) users")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0,
+                        help="Simulated Bot API round trip of the fake endpoint")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for outstanding replies")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.synthesize:
+        records = list(synthesize(args.synthesize, args.users, args.rate, args.seed))
+        if args.output:
+            write_log(args.output, records)
+            return
+    elif args.log:
+        from update_log import read_update_log
+        records = list(read_update_log(args.log))
+    else:
+        parser.error("either an update log or --synthesize is required")
+
+    report = replay(records, args.speed, args.users, args.api_latency_ms / 1000, args.timeout, args.seed)
+    print(f"updates {report['updates']}  answered {report['answered']}  unanswered {report['unanswered']}  "
+          f"errors {report['errors']}")
+    print(f"inject {report['inject_rate']:.0f}/s  throughput {report['throughput']:.0f}/s")
+    print(f"latency p50 {report['p50_ms']:.1f} ms  p90 {report['p90_ms']:.1f} ms  p99 {report['p99_ms']:.1f} ms  "
+          f"max {report['max_ms']:.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Sharded mode scaling benchmark.
+
+Runs the shard router (SOBER_SERENITY_SHARDS) with 1, 2, 4, ... worker processes against a temporary seeded database
+and a local fake Telegram endpoint, POSTs the same synthesized updates to its webhook listener from client threads
+and reports throughput and reply latency per number of workers. Handlers are CPU bound against a fast endpoint, so
+throughput grows with the workers up to the number of CPU cores left over by the load generator, the router and the
+fake endpoint (which share this process).
+
+Usage (from the repository root):
+    python -m benchmarks.sharding --shards 1 2 4 --updates 4000 --users 2000
+    python -m benchmarks.sharding --shards 1 4 --api-latency-ms 80 --json sharding.json
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from itertools import count
+from typing import List
+
+from benchmarks import fakes
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.handlers import get_git_revision, percentile
+from benchmarks.replay import ResponseTracker, synthesize
+
+WEBHOOK_PATH = "webhook"
+
+
+def post_updates(port: int, bodies: List[bytes], tracker: ResponseTracker, chat_ids: List[int]) -> int:
+    """POST encoded updates to the webhook listener on one keep-alive connection, retrying rejected ones.
+
+    :return: Number of rejected (and retried) updates
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    rejected = 0
+    try:
+        for body, chat_id in zip(bodies, chat_ids):
+            tracker.injected(chat_id)
+            while True:
+                connection.request("POST", f"/{WEBHOOK_PATH}", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 503:
+                    break
+                rejected += 1
+                time.sleep(0.01)
+            if response.status != 200:
+                raise RuntimeError(f"Webhook answered {response.status}")
+    finally:
+        connection.close()
+    return rejected
+
+
+def run(shards: int, updates: List[dict], api_latency: float, clients: int, timeout: float) -> dict:
+    """Route the updates to `shards` worker processes and summarize the run."""
+    import sharding
+    from soberserenitybot import run_shard
+
+    tracker = ResponseTracker()
+    fake = FakeTelegram(latency=api_latency, listener=tracker.on_request)
+    fake.start()
+    # Read by the worker processes when they start
+    os.environ["SOBER_SERENITY_BOT_API_URL"] = fake.base_url
+    router = sharding.ShardRouter(shards, run_shard, "127.0.0.1", 0, WEBHOOK_PATH, len(updates) + shards)
+    router.start()
+    try:
+        # One /start per worker, answered once the worker has started and warmed up
+        user_ids = [next(user_id for user_id in count(1) if sharding.shard_of(user_id, shards) == shard)
+                    for shard in range(shards)]
+        post_updates(router.port, [json.dumps(fakes.command_update_json(user_id, "/start")).encode()
+                                   for user_id in user_ids], tracker, user_ids)
+        if tracker.wait(timeout):
+            raise RuntimeError(f"Workers did not answer within {timeout} s")
+        tracker.latencies.clear()
+
+        bodies = [json.dumps(update_json).encode() for update_json in updates]
+        chat_ids = [sharding.update_chat_id(update_json) for update_json in updates]
+        rejected = []
+        threads = [threading.Thread(target=lambda i: rejected.append(
+                       post_updates(router.port, bodies[i::clients], tracker, chat_ids[i::clients])), args=(i,))
+                   for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        unanswered = tracker.wait(timeout)
+        elapsed = time.perf_counter() - start
+        routed = dict(router.routed)
+    finally:
+        router.stop()
+        fake.stop()
+
+    latencies = sorted(tracker.latencies)
+    return {"shards": shards,
+            "updates": len(updates),
+            "answered": len(latencies),
+            "unanswered": unanswered,
+            "rejected": sum(rejected),
+            "routed": {str(shard): routed_count - 1 for shard, routed_count in sorted(routed.items())},
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else 0.0,
+            "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else 0.0}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="Numbers of worker processes")
+    parser.add_argument("--updates", type=int, default=4000, help="Number of updates per run")
+    parser.add_argument("--users", type=int, default=2000, help="Number of distinct (seeded) users")
+    parser.add_argument("--clients", type=int, default=8, help="Client threads POSTing updates")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0,
+                        help="Simulated Bot API round trip of the fake endpoint")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for outstanding replies")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    updates = [update_json for _, update_json in synthesize(args.updates, args.users, 1.0, args.seed)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "SoberSerenitySharding.db")
+        fakes.create_database(db_name, args.users, args.seed)
+        # Must be set before the bot modules read their configuration, the workers inherit them
+        os.environ["SOBER_SERENITY_DB_NAME"] = db_name
+        os.environ["SOBER_SERENITY_LOG_FILE"] = os.path.join(tmp_dir, "Logs", "SoberSerenityBotLog.log")
+        os.environ["SOBER_SERENITY_FAST_START"] = "0"
+        os.environ.setdefault("SOBER_SERENITY_TOKEN", fakes.STUB_TOKEN)
+        import database
+        database.migrate()
+        database.POOL.close_all()
+
+        print(f"{os.cpu_count()} CPU cores, {args.updates} updates, {args.users} users, "
+              f"API latency {args.api_latency_ms:.0f} ms")
+        for shards in args.shards:
+            result = run(shards, updates, args.api_latency_ms / 1000, args.clients, args.timeout)
+            results.append(result)
+            speedup = result["throughput"] / results[0]["throughput"] if results[0]["throughput"] else 0.0
+            print(f"shards {shards:>2}  throughput {result['throughput']:>7.0f}/s  x{speedup:.2f}  "
+                  f"p50 {result['p50_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms  "
+                  f"unanswered {result['unanswered']}  rejected {result['rejected']}  routed {result['routed']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": get_git_revision(),
+                                "cpu_count": os.cpu_count(), "users": args.users,
+                                "api_latency_ms": args.api_latency_ms},
+                       "runs": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
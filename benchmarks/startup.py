@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Startup benchmark.
+
+Measures the import time of the bot (in a fresh interpreter, with the slowest imports) and the time from starting the
+bot process to its first reply, with fast start (SOBER_SERENITY_FAST_START=1, warm-up after polling starts) and
+without. The bot runs as a real process polling a local fake Telegram endpoint, against a temporary seeded database.
+
+Usage (from the repository root):
+    python -m benchmarks.startup --repeat 5 --users 20000
+"""
+import argparse
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Tuple
+
+from benchmarks import fakes
+from benchmarks.fake_telegram import FakeTelegram
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import soberserenitybot; print(time.perf_counter() - start)"
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def bot_env(**overrides) -> dict:
+    env = dict(os.environ, SOBER_SERENITY_TOKEN=fakes.STUB_TOKEN, PYTHONPATH=REPO_DIR)
+    env.update(overrides)
+    return env
+
+
+def measure_import(repeat: int) -> Tuple[List[float], List[Tuple[int, str]]]:
+    """Import times (seconds) of soberserenitybot and the slowest direct imports (cumulative us, module)."""
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=bot_env(), capture_output=True, text=True,
+                                cwd=REPO_DIR, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import soberserenitybot"], env=bot_env(),
+                            capture_output=True, text=True, cwd=REPO_DIR, check=True)
+    direct = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        # Direct imports of soberserenitybot are indented one level (three spaces)
+        if match and len(match.group(3)) == 3:
+            direct.append((int(match.group(2)), match.group(4)))
+    return times, sorted(direct, reverse=True)[:8]
+
+
+def measure_first_response(fast_start: bool, users: int, command: str, timeout: float) -> float:
+    """Seconds from (re)starting the bot process until the reply to a command sent before the start arrives."""
+    replied = threading.Event()
+
+    def on_request(method: str, data: dict, arrived: float) -> None:
+        if method == "sendMessage" and int(data.get("chat_id", 0)) == 1:
+            replied.set()
+
+    fake = FakeTelegram(listener=on_request)
+    fake.start()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "SoberSerenityStartup.db")
+        fakes.create_database(db_name, users)
+        env = bot_env(SOBER_SERENITY_DB_NAME=db_name, SOBER_SERENITY_BOT_API_URL=fake.base_url,
+                      SOBER_SERENITY_FAST_START="1" if fast_start else "0")
+        # A restart finds the database already migrated
+        subprocess.run([sys.executable, "-c", "import database; database.migrate()"], env=env, cwd=tmp_dir,
+                       check=True)
+        fake.push_update(fakes.command_update_json(1, command))
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "soberserenitybot.py")], env=env,
+                                   cwd=tmp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not replied.wait(timeout):
+                raise RuntimeError(f"No reply within {timeout} s")
+            elapsed = time.perf_counter() - start
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    fake.stop()
+    return elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Measurements per mode")
+    parser.add_argument("--users", type=int, default=10000, help="Number of seeded users")
+    parser.add_argument("--command", default="/start", help="Command answered first, e.g. /daily_reflection")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the first reply")
+    args = parser.parse_args()
+
+    times, direct = measure_import(args.repeat)
+    print(f"import soberserenitybot: median {statistics.median(times) * 1000:.0f} ms  "
+          f"min {min(times) * 1000:.0f} ms")
+    for cumulative, module in direct:
+        print(f"  {module:<28} {cumulative / 1000:>7.1f} ms")
+    for fast_start in (False, True):
+        results = [measure_first_response(fast_start, args.users, args.command, args.timeout)
+                   for _ in range(args.repeat)]
+        print(f"first response ({args.command}, fast start {'on' if fast_start else 'off'}): "
+              f"median {statistics.median(results) * 1000:.0f} ms  min {min(results) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
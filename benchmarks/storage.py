@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Storage backend benchmark.
+
+Runs the conformance tests of the storage backends (SOBER_SERENITY_STORAGE: sqlite, kv, memory) in
+tests/test_repositories.py first, then the handler scenarios of benchmarks.handlers with each backend on a seeded
+database and compares their latency. A small user cache (--user-cache-size) makes most profile lookups reach the
+backend.
+
+Usage (from the repository root):
+    python -m benchmarks.storage --check
+    python -m benchmarks.storage --iterations 1000 --users 20000 --user-cache-size 1 --output storage.json
+"""
+import argparse
+import dbm
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks import fakes
+from benchmarks.handlers import get_git_revision, get_scenarios, run_scenario
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFORMANCE_TESTS = os.path.join("tests", "test_repositories.py")
+
+
+def run_conformance_tests() -> int:
+    """Run the storage backend conformance tests (tests/test_repositories.py) in a separate pytest process.
+
+    :return: pytest exit code
+    """
+    return subprocess.run([sys.executable, "-m", "pytest", "-q", CONFORMANCE_TESTS], cwd=REPO_DIR).returncode
+
+
+def benchmark(backends: List[str], iterations: int, warmup: int, users: int, only: List[str], seed: int) -> dict:
+    """Run the handler scenarios with every backend."""
+    import database
+
+    results = {}
+    for backend in backends:
+        database.use_storage(backend)
+        rng = random.Random(seed)
+        results[backend] = {scenario.name: run_scenario(scenario, iterations, warmup, users, rng)
+                            for scenario in get_scenarios() if not only or scenario.name in only}
+    database.close_repositories()
+    return results
+
+
+def print_comparison(results: Dict[str, Dict[str, dict]]) -> None:
+    backends = list(results)
+    print(f"{'p50 µs':<30}" + "".join(f"{backend:>12}" for backend in backends))
+    for scenario in results[backends[0]]:
+        print(f"{scenario:<30}" + "".join(f"{results[backend][scenario]['p50_us']:>12.1f}" for backend in backends))
+    print(f"{'total ops/s (harmonic)':<30}" + "".join(
+        f"{len(results[backend]) / sum(1 / result['ops_per_sec'] for result in results[backend].values()):>12.0f}"
+        for backend in backends))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="Only run the conformance tests")
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "kv", "memory"], help="Backends to benchmark")
+    parser.add_argument("--iterations", type=int, default=1000, help="Measured calls per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured calls per scenario")
+    parser.add_argument("--users", type=int, default=1000, help="Number of seeded users")
+    parser.add_argument("--user-cache-size", type=int, help="User profiles cached in memory (default: configured)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--only", nargs="*", default=[], help="Scenario names to run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    status = run_conformance_tests()
+    if status or args.check:
+        return status
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, "SoberSerenityStorage.db")
+        fakes.create_database(db_name, args.users, args.seed)
+        # Must be set before the bot modules read their configuration
+        os.environ["SOBER_SERENITY_DB_NAME"] = db_name
+        os.environ["SOBER_SERENITY_KV_PATH"] = os.path.join(tmp_dir, "SoberSerenityUsers.kv")
+        os.environ.setdefault("SOBER_SERENITY_TOKEN", fakes.STUB_TOKEN)
+        if args.user_cache_size is not None:
+            os.environ["SOBER_SERENITY_USER_CACHE_SIZE"] = str(args.user_cache_size)
+        import database
+        database.migrate()
+        results = benchmark(args.backends, args.iterations, args.warmup, args.users, args.only, args.seed)
+        database.POOL.close_all()
+        kv_store = dbm.whichdb(os.environ["SOBER_SERENITY_KV_PATH"]) if "kv" in args.backends else None
+    if kv_store:
+        print(f"kv store: {kv_store}")
+    print_comparison(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": get_git_revision(),
+                                "iterations": args.iterations, "users": args.users,
+                                "user_cache_size": args.user_cache_size},
+                       "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,99 +1,45 @@
 #!/usr/bin/env python3
+import datetime
+from typing import Union
 from uuid import uuid4
 
-from telegram import InlineKeyboardMarkup, InlineKeyboardButton, Update
+from telegram import Update
 from telegram.ext import CallbackContext
 
 import database
-from models import MenuElements
-from strings import Strings
-
-
-def main_menu_keyboard() -> InlineKeyboardMarkup:
-    """Main menu keyboard"""
-    keyboard = [
-        [
-            InlineKeyboardButton(Strings.PROFILE_BUTTON, callback_data=str(MenuElements.PROFILE.value.data)),
-            InlineKeyboardButton(Strings.CLEAN_TIME_BUTTON, callback_data=str(MenuElements.CLEAN_TIME.value.data))
-        ],
-        [
-            InlineKeyboardButton(Strings.READINGS_BUTTON, callback_data=str(MenuElements.READINGS.value.data)),
-            InlineKeyboardButton(Strings.PRAYERS_BUTTON, callback_data=str(MenuElements.PRAYERS.value.data)),
-        ],
-    ]
-    return InlineKeyboardMarkup(keyboard, resize_keyboard=True)
-
-
-def readings_menu_keyboard() -> InlineKeyboardMarkup:
-    """Readings menu keyboard"""
-    keyboard = [
-        [
-            InlineKeyboardButton(Strings.DAILY_REFLECTION_BUTTON,
-                                 callback_data=str(MenuElements.DAILY_REFLECTION.value.data)),
-            InlineKeyboardButton(Strings.JUST_FOR_TODAY_BUTTON,
-                                 callback_data=str(MenuElements.JUST_FOR_TODAY.value.data)),
-        ],
-        [InlineKeyboardButton(Strings.MAIN_MENU_BUTTON, callback_data=str(MenuElements.MAIN_MENU.value.data))],
-    ]
-    return InlineKeyboardMarkup(keyboard, resize_keyboard=True)
-
-
-def prayers_menu_keyboard() -> InlineKeyboardMarkup:
-    """Prayers menu keyboard"""
-    keyboard = [
-        [
-            InlineKeyboardButton(Strings.LORDS_PRAYER_BUTTON, callback_data=str(MenuElements.LORDS_PRAYER.value.data)),
-            InlineKeyboardButton(Strings.SERENITY_PRAYER_BUTTON,
-                                 callback_data=str(MenuElements.SERENITY_PRAYER.value.data)),
-        ],
-        [
-            InlineKeyboardButton(Strings.ST_JOSEPHS_PRAYER_BUTTON,
-                                 callback_data=str(MenuElements.ST_JOSEPHS_PRAYER.value.data)),
-            InlineKeyboardButton(Strings.TENDER_AND_COMPASSIONATE_GOD_BUTTON,
-                                 callback_data=str(MenuElements.TENDER_AND_COMPASSIONATE_GOD.value.data)),
-        ],
-        [
-            InlineKeyboardButton(Strings.THIRD_STEP_PRAYER_BUTTON,
-                                 callback_data=str(MenuElements.THIRD_STEP_PRAYER.value.data)),
-            InlineKeyboardButton(Strings.SEVENTH_STEP_PRAYER_BUTTON,
-                                 callback_data=str(MenuElements.SEVENTH_STEP_PRAYER.value.data)),
-        ],
-        [
-            InlineKeyboardButton(Strings.ELEVENTH_STEP_PRAYER_BUTTON,
-                                 callback_data=str(MenuElements.ELEVENTH_STEP_PRAYER.value.data)),
-            InlineKeyboardButton(Strings.MAIN_MENU_BUTTON, callback_data=str(MenuElements.MAIN_MENU.value.data)),
-        ],
-    ]
-    return InlineKeyboardMarkup(keyboard, resize_keyboard=True)
-
-
-def main_menu_message() -> str:
-    """Main menu message"""
-    return Strings.MAIN_MENU
-
-
-def readings_menu_message() -> str:
-    """Reading menu message"""
-    return Strings.READINGS_MENU
-
-
-def prayers_menu_message() -> str:
-    """Prayers menu message"""
-    return Strings.PRAYERS_MENU
-
-
-def answer_callback_query(update: Update) -> Update:
-    """Answer Callback Query.
-    This is required for callback queries only. Command invocation wouldn't require this."""
-    if hasattr(update, "callback_query") and hasattr(update.callback_query, "answer"):
-        update.callback_query.answer()
-    return update
-
-
-def get_daily_notification(context: CallbackContext, user_id) -> tuple:
-    """Get enabled daily notification jobs for user."""
-    user_job = context.job_queue.get_jobs_by_name(str(user_id))
-    return user_job
+import scheduler
+from config import Config
+from models import Keyboards
+from responses import RESPONSES
+
+
+def main_menu_keyboard() -> str:
+    """Main menu keyboard (pre-encoded)"""
+    return RESPONSES.keyboard(Keyboards.MAIN_MENU)
+
+
+def readings_menu_keyboard() -> str:
+    """Readings menu keyboard (pre-encoded)"""
+    return RESPONSES.keyboard(Keyboards.READINGS_MENU)
+
+
+def prayers_menu_keyboard() -> str:
+    """Prayers menu keyboard (pre-encoded)"""
+    return RESPONSES.keyboard(Keyboards.PRAYERS_MENU)
+
+
+def get_daily_notification(user_id: int) -> Union[datetime.time, None]:
+    """Get local time of enabled daily notification for user, None if daily notification is not enabled."""
+    minute = scheduler.NOTIFICATIONS.get(user_id)
+    if minute is None:
+        return None
+    return get_notification_local_time(user_id, minute)
+
+
+def get_notification_local_time(user_id: int, minute: int) -> datetime.time:
+    """Convert UTC minute of day of a daily notification to user's local time."""
+    local_minute = scheduler.utc_minute_to_local_minute(minute, database.get_time_offset(user_id))
+    return datetime.time(local_minute // 60, local_minute % 60)
 
 
 def update_context_with_user_data(update: Update, context: CallbackContext) -> tuple:
@@ -111,6 +57,11 @@ def update_context_with_user_data(update: Update, context: CallbackContext) -> t
     return update, context
 
 
+def is_admin(user: dict) -> bool:
+    """Check if user is allowed to use admin commands."""
+    return user.get("UserID") in Config.ADMIN_USER_IDS
+
+
 def get_user(update: Update, context: CallbackContext) -> tuple:
     """Get user from user_data in context."""
     update, context = update_context_with_user_data(update, context)
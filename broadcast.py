@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError
+
+import database
+from config import Config
+from models import BroadcastRecord, BroadcastStatus
+from outbound import MAX_SEND_ATTEMPTS
+
+# Seconds between broadcast checkpoints while a batch is being sent
+CHECKPOINT_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+# Broadcasts currently running in this process, by broadcast ID
+ACTIVE: Dict[int, "Broadcast"] = {}
+_active_lock = threading.Lock()
+
+
+class Broadcast:
+    """Message sent to every user.
+
+    User IDs are streamed from the USERS table in ascending order, one batch of `Config.BROADCAST_BATCH_SIZE` at a
+    time, and sent on a bounded pool of `Config.BROADCAST_WORKERS` threads. The highest user ID up to which every user
+    was handled is stored in the BROADCASTS table every `CHECKPOINT_INTERVAL` seconds and at the end of each batch, so
+    an interrupted broadcast resumes where it stopped instead of starting over. Delivery is at least once: the users
+    handled since the last checkpoint (about a second of sending) and those being sent to are sent the message again.
+    """
+
+    def __init__(self, bot: Bot, record: BroadcastRecord) -> None:
+        self.bot = bot
+        self.record = record
+        self._started = None
+        self._sent_at_start = record.sent + record.failed
+        self._remaining = 0
+
+    def run(self) -> None:
+        """Send the message to all remaining users. Blocks until done."""
+        self._started = time.perf_counter()
+        self._remaining = database.count_users_after(self.record.last_user_id)
+        logger.info("Broadcast %s: sending to %s users", self.record.broadcast_id, self._remaining)
+        checkpointed = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=Config.BROADCAST_WORKERS) as executor:
+            while True:
+                user_ids = database.get_user_ids_after(self.record.last_user_id, Config.BROADCAST_BATCH_SIZE)
+                if not user_ids:
+                    break
+                # Results arrive in user ID order, every user up to the current one was handled
+                for user_id, sent in zip(user_ids, executor.map(self._send, user_ids)):
+                    self.record = self.record._replace(last_user_id=user_id, sent=self.record.sent + int(sent),
+                                                       failed=self.record.failed + int(not sent))
+                    if time.perf_counter() - checkpointed >= CHECKPOINT_INTERVAL:
+                        database.update_broadcast(self.record)
+                        checkpointed = time.perf_counter()
+                database.update_broadcast(self.record)
+                checkpointed = time.perf_counter()
+                logger.info("Broadcast %s: %s", self.record.broadcast_id, self.progress())
+        self.record = self.record._replace(status=BroadcastStatus.FINISHED.value)
+        database.update_broadcast(self.record)
+        logger.info("Broadcast %s finished: %s", self.record.broadcast_id, self.progress())
+
+    def _send(self, user_id: int) -> bool:
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            try:
+                # Plain text: the message is typed by an admin, a stray < or & would make Telegram reject it as HTML
+                # for every single user
+                self.bot.send_message(chat_id=user_id, text=self.record.message)
+                return True
+            except RetryAfter as e:
+                if attempt == MAX_SEND_ATTEMPTS:
+                    logger.warning("Broadcast %s: sending to %s failed, still rate limited after %s attempts",
+                                   self.record.broadcast_id, user_id, MAX_SEND_ATTEMPTS)
+                    return False
+                time.sleep(e.retry_after)
+            except TelegramError as e:
+                logger.info("Broadcast %s: sending to %s failed: %s", self.record.broadcast_id, user_id, e)
+                return False
+        return False
+
+    def progress(self) -> str:
+        """Progress with throughput and estimated time to finish."""
+        done = self.record.sent + self.record.failed
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        rate = (done - self._sent_at_start) / elapsed if elapsed else 0.0
+        remaining = max(self._remaining - (done - self._sent_at_start), 0)
+        eta = f"{remaining / rate:.0f}s" if rate else "unknown"
+        return f"{self.record.sent} sent, {self.record.failed} failed, {remaining} remaining, " \
+               f"{rate:.1f} msg/s, ETA {eta}"
+
+
+def _run(broadcast: Broadcast) -> None:
+    with _active_lock:
+        ACTIVE[broadcast.record.broadcast_id] = broadcast
+    try:
+        broadcast.run()
+    except Exception:
+        logger.exception("Broadcast %s interrupted", broadcast.record.broadcast_id)
+    finally:
+        with _active_lock:
+            ACTIVE.pop(broadcast.record.broadcast_id, None)
+
+
+def start_broadcast(bot: Bot, message: str) -> Broadcast:
+    """Start sending a message to all users on a background thread."""
+    broadcast = Broadcast(bot, database.create_broadcast(message))
+    threading.Thread(target=_run, args=(broadcast,), name=f"Broadcast-{broadcast.record.broadcast_id}",
+                     daemon=True).start()
+    return broadcast
+
+
+def resume_broadcasts(bot: Bot) -> List[Broadcast]:
+    """Resume broadcasts interrupted by a restart on background threads."""
+    broadcasts = []
+    for record in database.get_unfinished_broadcasts():
+        with _active_lock:
+            if record.broadcast_id in ACTIVE:
+                continue
+        broadcast = Broadcast(bot, record)
+        threading.Thread(target=_run, args=(broadcast,), name=f"Broadcast-{record.broadcast_id}",
+                         daemon=True).start()
+        broadcasts.append(broadcast)
+    return broadcasts
+
+
+def get_active_broadcasts() -> List[Broadcast]:
+    """Get broadcasts currently running in this process."""
+    with _active_lock:
+        return list(ACTIVE.values())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Union
+
+from models import CacheStats
+
+
+class ContentCache:
+    """Read-only cache of rendered content.
+
+    The whole content is loaded in one pass by `loader`, either explicitly with `load()` (e.g. at startup) or lazily on
+    first access. `invalidate()` drops the content so it is loaded again on next access.
+    """
+
+    def __init__(self, loader: Callable[[], dict]) -> None:
+        """
+        :param loader: Callable returning the complete content as a dict of key -> rendered message
+        """
+        self._loader = loader
+        self._entries = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def load(self) -> dict:
+        """Load (or reload) the content."""
+        with self._lock:
+            self._entries = self._loader()
+            return self._entries
+
+    def invalidate(self) -> None:
+        """Drop cached content. It is reloaded on next access."""
+        with self._lock:
+            self._entries = None
+
+    def get(self, key: Hashable) -> Union[str, None]:
+        """Get rendered content for a key, None if there is no such content."""
+        entries = self._entries
+        if entries is None:
+            with self._lock:
+                # Loaded only once if requests arrive while the content is being loaded
+                entries = self._entries
+                if entries is None:
+                    entries = self._entries = self._loader()
+        value = entries.get(key)
+        if value is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return value
+
+    def stats(self) -> CacheStats:
+        """Get cache statistics."""
+        size = len(self._entries) if self._entries is not None else 0
+        return CacheStats(size=size, hits=self._hits, misses=self._misses)
+
+
+class QuoteSampler:
+    """Random sampler over a small, rarely changing list of strings.
+
+    Items are kept in memory and drawn from a shuffle bag: every item is returned once, in random order, before the bag
+    is refilled, so repeats are rare. The items are reloaded when `version` reports a different value than at last load.
+    The version is checked at most once every `refresh_interval` seconds.
+    """
+
+    def __init__(self, loader: Callable[[], list], version: Callable[[], Hashable], refresh_interval: float) -> None:
+        """
+        :param loader: Callable returning all items
+        :param version: Callable returning a cheap signature of the source which changes whenever the items change
+        :param refresh_interval: Minimum number of seconds between version checks
+        """
+        self._loader = loader
+        self._version = version
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._items = ()
+        self._bag = []
+        self._loaded_version = None
+        self._checked_at = None
+
+    def _refresh(self, now: float) -> None:
+        self._checked_at = now
+        version = self._version()
+        if version == self._loaded_version and self._items:
+            return
+        self._items = tuple(self._loader())
+        self._bag = []
+        self._loaded_version = version
+
+    def sample(self) -> Union[str, None]:
+        """Draw the next item from the shuffle bag, None if there are no items."""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self._refresh_interval:
+                self._refresh(now)
+            if not self._bag:
+                if not self._items:
+                    return None
+                self._bag = list(range(len(self._items)))
+                random.shuffle(self._bag)
+            return self._items[self._bag.pop()]
+
+    def invalidate(self) -> None:
+        """Force a reload of the items on next sample."""
+        with self._lock:
+            self._checked_at = None
+            self._loaded_version = None
+
+
+class UserCache:
+    """Bounded LRU cache of user profiles keyed by user ID.
+
+    Profiles are stored and returned as copies so callers can't modify cached profiles by accident. Writers must keep
+    the cache in sync with the database with `put()` or `update()` (write-through).
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """
+        :param max_size: Maximum number of cached profiles. The least recently used profile is evicted first.
+        """
+        self._max_size = max(1, max_size)
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id: int) -> Union[dict, None]:
+        """Get cached user profile, None if the user is not cached."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                self._misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self._hits += 1
+            return dict(user)
+
+    def put(self, user: dict) -> None:
+        """Add or replace a user profile."""
+        with self._lock:
+            self._users[user["UserID"]] = dict(user)
+            self._users.move_to_end(user["UserID"])
+            if len(self._users) > self._max_size:
+                self._users.popitem(last=False)
+
+    def update(self, user_id: int, key: str, value) -> None:
+        """Update a single field of a cached user profile. Users not in the cache are left alone."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                user[key] = value
+
+    def clear(self) -> None:
+        """Remove all user profiles from the cache."""
+        with self._lock:
+            self._users.clear()
+
+    def remove(self, user_id: int) -> None:
+        """Remove a user profile from the cache."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> CacheStats:
+        """Get cache statistics."""
+        with self._lock:
+            return CacheStats(size=len(self._users), hits=self._hits, misses=self._misses)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import datetime
+from typing import Callable, List, Sequence, Tuple
+
+from models import CleanTimes
+from utils import datetime_to_epoch, format_clean_time_str
+
+# NumPy is optional (the batch is computed element by element without it) and imported on first use, see load_numpy
+_NOT_LOADED = object()
+numpy = _NOT_LOADED
+
+
+def load_numpy():
+    """Import NumPy if it is installed.
+
+    Importing NumPy takes a while, so it is done on the first batch (or during warm-up) instead of at startup.
+
+    :return: numpy module, None if NumPy isn't installed
+    """
+    global numpy
+    if numpy is _NOT_LOADED:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+SECONDS_PER_DAY = 86400
+
+
+def _where_scalar(condition: bool, a: int, b: int) -> int:
+    return a if condition else b
+
+
+def _days_from_civil(y, m, d):
+    """Days since 1970-01-01 of a proleptic Gregorian date (Howard Hinnant's days_from_civil)."""
+    y = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * ((m + 9) % 12) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _civil_from_days(z, where: Callable):
+    """Proleptic Gregorian (year, month, day) of days since 1970-01-01 (Howard Hinnant's civil_from_days)."""
+    z = z + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    d = doy - (153 * mp + 2) // 5 + 1
+    m = where(mp < 10, mp + 3, mp - 9)
+    return yoe + era * 400 + (m <= 2), m, d
+
+
+def _clean_times(clean, now, fraction: bool, where: Callable) -> tuple:
+    """Clean time breakdown as computed by relativedelta(now, clean), on epoch seconds.
+
+    Works on NumPy integer arrays (with numpy.where) as well as on Python ints (with _where_scalar).
+    `fraction` tells whether now has a fraction of a second on top of the whole epoch seconds.
+    """
+    clean_days = clean // SECONDS_PER_DAY
+    clean_time_of_day = clean - clean_days * SECONDS_PER_DAY
+    y1, m1, _ = _civil_from_days(now // SECONDS_PER_DAY, where)
+    y2, m2, d2 = _civil_from_days(clean_days, where)
+
+    def add_months(months):
+        total = y2 * 12 + m2 - 1 + months
+        y, m = total // 12, total % 12 + 1
+        days_in_month = _days_from_civil(y + m // 12, m % 12 + 1, 1) - _days_from_civil(y, m, 1)
+        return _days_from_civil(y, m, where(d2 < days_in_month, d2, days_in_month)) * SECONDS_PER_DAY + \
+            clean_time_of_day
+
+    # Whole months between the dates, corrected by one if the day and time of the month haven't been reached yet
+    months = (y1 - y2) * 12 + (m1 - m2)
+    forward = now >= clean
+    shifted = add_months(months)
+    overshot = where(forward, now < shifted, (now > shifted) | ((now == shifted) & fraction))
+    months = where(overshot, months + where(forward, -1, 1), months)
+    rest = now - where(overshot, add_months(months), shifted)
+
+    # relativedelta keeps the sign of the difference on every field
+    sign = where(forward, 1, -1)
+    months, rest = months * sign, rest * sign
+    seconds, minutes = rest % 60, rest // 60
+    minutes, hours = minutes % 60, minutes // 60
+    hours, days = hours % 24, hours // 24
+    weeks = days // 7
+    return (months // 12 * sign, months % 12 * sign, weeks * sign, (days - weeks * 7) * sign, hours * sign,
+            minutes * sign, seconds * sign, (now - clean) // SECONDS_PER_DAY)
+
+
+def compute_clean_time(clean_epoch: int, offset: int, now: datetime.datetime = None) -> tuple:
+    """Compute the clean time of a single user.
+
+    :param clean_epoch: Clean date as epoch seconds
+    :param offset: UTC offset in seconds
+    :param now: UTC time, defaults to now
+    :return: (years, months, weeks, days, hours, minutes, seconds, days since), see CleanTimes
+    """
+    now = now or datetime.datetime.utcnow()
+    return _clean_times(clean_epoch, datetime_to_epoch(now) + offset, now.microsecond > 0, _where_scalar)
+
+
+def compute_clean_times(clean_epochs: Sequence[int], offsets: Sequence[int],
+                        now: datetime.datetime = None) -> CleanTimes:
+    """Compute the clean time of many users at once.
+
+    The result is identical to compute_clean_time for each user, i.e. to relativedelta(local time, clean date) and the
+    days since. With NumPy installed the calendar arithmetic runs on whole arrays.
+
+    :param clean_epochs: Clean dates as epoch seconds
+    :param offsets: UTC offsets in seconds
+    :param now: UTC time, defaults to now
+    :return: CleanTimes with one list entry per user
+    """
+    now = now or datetime.datetime.utcnow()
+    now_epoch = datetime_to_epoch(now)
+    fraction = now.microsecond > 0
+    numpy = load_numpy()
+    if numpy is not None:
+        clean = numpy.asarray(clean_epochs, dtype=numpy.int64)
+        local_now = now_epoch + numpy.asarray(offsets, dtype=numpy.int64)
+        return CleanTimes(*(column.tolist() for column in _clean_times(clean, local_now, fraction, numpy.where)))
+    rows = [_clean_times(clean, now_epoch + offset, fraction, _where_scalar)
+            for clean, offset in zip(clean_epochs, offsets)]
+    columns = zip(*rows) if rows else ((),) * len(CleanTimes._fields)
+    return CleanTimes(*(list(column) for column in columns))
+
+
+def format_clean_times(clean_times: CleanTimes) -> List[Tuple[str, int]]:
+    """Format computed clean times like utils.format_clean_time_str.
+
+    :param clean_times: Output of compute_clean_times
+    :return: List of (clean time string, days since)
+    """
+    return [(format_clean_time_str(*fields[:7]), fields[7]) for fields in zip(*clean_times)]
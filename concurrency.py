@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import functools
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackContext, Dispatcher
+
+
+class ChatSerializer:
+    """Runs handler callbacks concurrently on the dispatcher's worker pool while keeping each chat's updates in order.
+
+    Wrapped callbacks return immediately on the dispatcher thread. Updates of a chat are appended to that chat's queue
+    and a single task per chat drains the queue on a worker thread, so different chats are handled concurrently but
+    updates of the same chat (and their `context.user_data` changes) never overlap and run in arrival order.
+    """
+
+    def __init__(self, dispatcher: Dispatcher) -> None:
+        self._dispatcher = dispatcher
+        self._pending: Dict[int, Deque[Tuple[Callable, Update, CallbackContext]]] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, callback: Callable[[Update, CallbackContext], None]) -> Callable[[Update, CallbackContext], None]:
+        """Wrap a handler callback to run serialized per chat on the worker pool."""
+        @functools.wraps(callback)
+        def wrapper(update: Update, context: CallbackContext) -> None:
+            chat = getattr(update, "effective_chat", None)
+            if chat is None:
+                callback(update, context)
+                return
+            self._submit(chat.id, (callback, update, context))
+        return wrapper
+
+    def _submit(self, chat_id: int, task: Tuple[Callable, Update, CallbackContext]) -> None:
+        with self._lock:
+            tasks = self._pending.get(chat_id)
+            if tasks is not None:
+                # A worker is already draining this chat's queue
+                tasks.append(task)
+                return
+            self._pending[chat_id] = deque([task])
+        self._dispatcher.run_async(self._drain, chat_id)
+
+    def _drain(self, chat_id: int) -> None:
+        while True:
+            with self._lock:
+                tasks = self._pending[chat_id]
+                if not tasks:
+                    del self._pending[chat_id]
+                    return
+                callback, update, context = tasks.popleft()
+            try:
+                callback(update, context)
+            except Exception as e:
+                self._dispatcher.dispatch_error(update, e)
+
+    def pending_chats(self) -> int:
+        """Number of chats with updates waiting or being handled."""
+        with self._lock:
+            return len(self._pending)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Config:
+    """Runtime configuration read from the environment (or .env file)."""
+    TOKEN = os.environ.get("SOBER_SERENITY_TOKEN")
+    DB_NAME = os.environ.get("SOBER_SERENITY_DB_NAME", "SoberSerenity.db")
+    # Dispatcher worker threads. One extra DB connection is kept for the JobQueue thread.
+    WORKERS = int(os.environ.get("SOBER_SERENITY_WORKERS", 4))
+    # Run handlers concurrently on the dispatcher worker threads (updates of a chat are still handled in order)
+    CONCURRENT_HANDLERS = os.environ.get("SOBER_SERENITY_CONCURRENT_HANDLERS", "1") == "1"
+    DB_POOL_SIZE = int(os.environ.get("SOBER_SERENITY_DB_POOL_SIZE", WORKERS + 1))
+    DB_MMAP_SIZE = int(os.environ.get("SOBER_SERENITY_DB_MMAP_SIZE", 64 * 1024 * 1024))
+    # Negative value is in KiB as per SQLite's PRAGMA cache_size semantics
+    DB_CACHE_SIZE = int(os.environ.get("SOBER_SERENITY_DB_CACHE_SIZE", -8000))
+    # Prepared statements kept per connection
+    DB_STATEMENT_CACHE_SIZE = int(os.environ.get("SOBER_SERENITY_DB_STATEMENT_CACHE_SIZE", 128))
+    # Minimum number of seconds between checks of the quotes table for changes
+    QUOTES_REFRESH_INTERVAL = float(os.environ.get("SOBER_SERENITY_QUOTES_REFRESH_INTERVAL", 3600))
+    # Maximum number of user profiles kept in memory
+    USER_CACHE_SIZE = int(os.environ.get("SOBER_SERENITY_USER_CACHE_SIZE", 10000))
+    # Comma separated user IDs allowed to use admin commands (e.g. /stats)
+    ADMIN_USER_IDS = frozenset(int(user_id)
+                               for user_id in os.environ.get("SOBER_SERENITY_ADMIN_USER_IDS", "").split(",")
+                               if user_id.strip())
+    # Number of user IDs read from the database per broadcast batch
+    BROADCAST_BATCH_SIZE = int(os.environ.get("SOBER_SERENITY_BROADCAST_BATCH_SIZE", 500))
+    # Number of threads sending broadcast messages
+    BROADCAST_WORKERS = int(os.environ.get("SOBER_SERENITY_BROADCAST_WORKERS", 8))
+    # Number of threads sending outbound messages and maximum number of queued messages per thread
+    OUTBOUND_SENDERS = int(os.environ.get("SOBER_SERENITY_OUTBOUND_SENDERS", 4))
+    OUTBOUND_QUEUE_SIZE = int(os.environ.get("SOBER_SERENITY_OUTBOUND_QUEUE_SIZE", 10000))
+    # Bot API base URL, the token is appended (e.g. a local fake Telegram endpoint: http://127.0.0.1:8081/bot)
+    BOT_API_URL = os.environ.get("SOBER_SERENITY_BOT_API_URL") or None
+    # How updates are received: "polling" or "webhook"
+    UPDATE_MODE = os.environ.get("SOBER_SERENITY_UPDATE_MODE", "polling")
+    # Webhook listener. Defaults suit a TLS terminating reverse proxy forwarding to a local plain HTTP port.
+    WEBHOOK_LISTEN = os.environ.get("SOBER_SERENITY_WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT = int(os.environ.get("SOBER_SERENITY_WEBHOOK_PORT", 8443))
+    WEBHOOK_PATH = os.environ.get("SOBER_SERENITY_WEBHOOK_PATH", "webhook")
+    # Public URL registered with Telegram (e.g. https://bot.example.com/webhook)
+    WEBHOOK_URL = os.environ.get("SOBER_SERENITY_WEBHOOK_URL") or None
+    # Only needed when the bot terminates TLS itself instead of a reverse proxy
+    WEBHOOK_CERT = os.environ.get("SOBER_SERENITY_WEBHOOK_CERT") or None
+    WEBHOOK_KEY = os.environ.get("SOBER_SERENITY_WEBHOOK_KEY") or None
+    # Maximum number of simultaneous HTTPS connections Telegram opens to the webhook
+    WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("SOBER_SERENITY_WEBHOOK_MAX_CONNECTIONS", 40))
+    # Append incoming updates to this file (one JSON record per line) for offline replay. Contains user messages.
+    UPDATE_LOG = os.environ.get("SOBER_SERENITY_UPDATE_LOG") or None
+    # Log file, rotated at LOG_MAX_BYTES with LOG_BACKUPS old files kept. Records are written by a background thread.
+    LOG_FILE = os.environ.get("SOBER_SERENITY_LOG_FILE", "Logs/SoberSerenityBotLog.log")
+    LOG_MAX_BYTES = int(os.environ.get("SOBER_SERENITY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    LOG_BACKUPS = int(os.environ.get("SOBER_SERENITY_LOG_BACKUPS", 5))
+    # Share (0.0 - 1.0) of sent messages logged with their full text, for debugging. Contains user content.
+    LOG_BODY_SAMPLE_RATE = float(os.environ.get("SOBER_SERENITY_LOG_BODY_SAMPLE_RATE", 0.0))
+    # Key of the user ID hashes in message logs, a random key per run (hashes not comparable across runs) if unset
+    LOG_USER_HASH_KEY = os.environ.get("SOBER_SERENITY_LOG_USER_HASH_KEY") or None
+    # Local Prometheus text metrics endpoint (http://METRICS_LISTEN:METRICS_PORT/metrics), disabled if no port is set
+    METRICS_LISTEN = os.environ.get("SOBER_SERENITY_METRICS_LISTEN", "127.0.0.1")
+    METRICS_PORT = int(os.environ.get("SOBER_SERENITY_METRICS_PORT") or 0) or None
+    # Handler profiles and allocation snapshots (written by /profiling or SIGUSR1) and default share of sampled calls
+    PROFILE_DIR = os.environ.get("SOBER_SERENITY_PROFILE_DIR", "Logs/profiles")
+    PROFILE_SAMPLE_RATE = float(os.environ.get("SOBER_SERENITY_PROFILE_SAMPLE_RATE", 0.05))
+    # Start receiving updates before caches are loaded and notifications restored (which then happens in background)
+    FAST_START = os.environ.get("SOBER_SERENITY_FAST_START", "1") == "1"
+    # Sharded mode: a webhook router hands updates to SHARDS worker processes by chat ID (1 runs a single process)
+    SHARDS = int(os.environ.get("SOBER_SERENITY_SHARDS", 1))
+    # Maximum number of updates queued per worker, the router answers 503 (Telegram retries later) when full
+    SHARD_QUEUE_SIZE = int(os.environ.get("SOBER_SERENITY_SHARD_QUEUE_SIZE", 1000))
+    # Storage backend: "sqlite" (default), "kv" (user profiles in a local key-value store at KV_PATH, filled from the
+    # USERS table on first start) or "memory" (copy of all data in memory, not persisted, for tests and benchmarks)
+    STORAGE = os.environ.get("SOBER_SERENITY_STORAGE", "sqlite")
+    KV_PATH = os.environ.get("SOBER_SERENITY_KV_PATH", "SoberSerenityUsers.kv")
+    # Encrypt the database at rest with SQLCipher (needs pysqlcipher3). The key is derived once per process from
+    # DB_PASSPHRASE (the bot token by default) with DB_KDF_ITER iterations, or given as DB_RAW_KEY (64 hex digits,
+    # no key derivation at all). Connections are keyed with the derived raw key.
+    DB_ENCRYPTED = os.environ.get("SOBER_SERENITY_DB_ENCRYPTED", "0") == "1"
+    DB_PASSPHRASE = os.environ.get("SOBER_SERENITY_DB_PASSPHRASE") or TOKEN
+    DB_RAW_KEY = os.environ.get("SOBER_SERENITY_DB_RAW_KEY") or None
+    DB_KDF_ITER = int(os.environ.get("SOBER_SERENITY_DB_KDF_ITER", 256000))
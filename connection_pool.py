@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Sequence
+
+import sqlite3
+
+from models import PoolStats, StatementCacheStats
+
+
+class PooledConnection:
+    """Persistent connection with a bounded prepared statement cache.
+
+    SQLite keeps the last `cache_size` prepared statements of a connection (see `cached_statements` of
+    `sqlite3.connect`). The same bounded LRU bookkeeping is mirrored here on the SQL text so cache hits and misses
+    can be reported. Queries must use `?` placeholders for values for the cache to be effective.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, cache_size: int) -> None:
+        self.connection = connection
+        self._cache_size = cache_size
+        self._statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _track(self, sql: str) -> None:
+        if sql in self._statements:
+            self._statements.move_to_end(sql)
+            self.hits += 1
+            return
+        self.misses += 1
+        self._statements[sql] = None
+        if len(self._statements) > self._cache_size:
+            self._statements.popitem(last=False)
+
+    def execute(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        """Execute a single statement with bound parameters."""
+        self._track(sql)
+        return self.connection.execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> sqlite3.Cursor:
+        """Execute a statement once for each parameter sequence."""
+        self._track(sql)
+        return self.connection.executemany(sql, seq_of_params)
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.connection.in_transaction
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def cached_statements(self) -> int:
+        return len(self._statements)
+
+
+class ConnectionPool:
+    """Fixed size pool of persistent database connections.
+
+    Connections are opened lazily (up to `size`) and kept open for the lifetime of the process. Callers borrow a
+    connection with `connection()` and block when all connections are in use. A connection is returned without an
+    open transaction: work that wasn't committed (e.g. because a statement failed) is rolled back, otherwise the
+    connection would keep holding the write lock and the other connections would fail with "database is locked".
+    """
+
+    def __init__(self, connect: Callable[[], PooledConnection], size: int) -> None:
+        """
+        :param connect: Factory returning a new, fully configured connection
+        :param size: Maximum number of open connections
+        """
+        self._connect = connect
+        self._size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waited = 0
+        self._wait_time = 0.0
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Borrow a connection from the pool and return it once done, uncommitted work is rolled back."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            finally:
+                self._release(conn)
+
+    def _acquire(self) -> PooledConnection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open_or_wait()
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def _open_or_wait(self) -> PooledConnection:
+        with self._lock:
+            can_open = self._created < self._size
+            if can_open:
+                self._created += 1
+        if can_open:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            with self._lock:
+                self._connections.append(conn)
+            return conn
+        start = time.perf_counter()
+        conn = self._idle.get()
+        with self._lock:
+            self._waited += 1
+            self._wait_time += time.perf_counter() - start
+        return conn
+
+    def _release(self, conn: PooledConnection) -> None:
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        """Close all idle connections. Connections currently borrowed are closed by the next `close_all`."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+                self._connections.remove(conn)
+
+    def stats(self) -> PoolStats:
+        """Get pool usage statistics."""
+        with self._lock:
+            return PoolStats(size=self._size, open=self._created, in_use=self._in_use, acquired=self._acquired,
+                             waited=self._waited, wait_time=self._wait_time)
+
+    def statement_cache_stats(self) -> StatementCacheStats:
+        """Get prepared statement cache statistics aggregated over all open connections."""
+        with self._lock:
+            connections = list(self._connections)
+        hits = sum(conn.hits for conn in connections)
+        misses = sum(conn.misses for conn in connections)
+        cached = sum(conn.cached_statements() for conn in connections)
+        hit_rate = hits / (hits + misses) if hits + misses else 0.0
+        return StatementCacheStats(hits=hits, misses=misses, cached=cached, hit_rate=hit_rate)
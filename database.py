@@ -1,41 +1,119 @@
 import datetime
-import os
-import random
-from typing import Tuple, Union
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable, Sequence, Tuple, Union
 
 import sqlite3
-from dateutil.relativedelta import relativedelta
-from dotenv import load_dotenv
-# from pysqlcipher3 import dbapi2 as sqlite3
-from telegram import Chat
 
+import clean_time_batch
+import encryption
+import instrumentation
+import migrations
+import scheduler
 import utils
-from models import DatabaseParams, Tables, Columns, DBKeyValue
+from cache import ContentCache, QuoteSampler, UserCache
+from config import Config
+from connection_pool import ConnectionPool, PooledConnection
+from models import DatabaseParams, Tables, Columns, TABLE_COLUMNS, DBKeyValue, MenuElements, PoolStats, \
+    StatementCacheStats, BroadcastRecord, BroadcastStatus, Repositories
+from repositories import ContentRepository, KeyValueUserRepository, MemoryContentRepository, \
+    MemoryQuoteRepository, MemoryUserRepository, QuoteRepository, UserRepository
 
-load_dotenv()
-sober_serenity_token = os.environ.get('SOBER_SERENITY_TOKEN')
+if TYPE_CHECKING:
+    from telegram import Chat
 
-DB_PARAMS = DatabaseParams("SoberSerenity.db", sober_serenity_token)
+
+def get_db_params() -> DatabaseParams:
+    """Database file and key. The key of an encrypted database is derived on first use, once per process."""
+    key = encryption.database_key(Config.DB_NAME, Config.DB_PASSPHRASE, Config.DB_RAW_KEY, Config.DB_KDF_ITER) \
+        if Config.DB_ENCRYPTED else None
+    return DatabaseParams(Config.DB_NAME, key)
 
 
 def initialize_db(db_params: DatabaseParams) -> Tuple:
     """Initialize database."""
-    connection = sqlite3.connect(db_params.name)
+    driver = encryption.load_sqlcipher() if db_params.key else sqlite3
+    # Connections are shared between dispatcher worker threads through the pool, never used concurrently.
+    connection = driver.connect(db_params.name, check_same_thread=False,
+                                cached_statements=Config.DB_STATEMENT_CACHE_SIZE)
     cursor = connection.cursor()
-    cursor.execute(f"PRAGMA key='{db_params.token}'")
+    if db_params.key:
+        # Raw key, SQLCipher skips its key derivation
+        cursor.execute(f'PRAGMA key = "{db_params.key}"')
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={Config.DB_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={Config.DB_CACHE_SIZE}")
     return connection, cursor
 
 
-def query_db(query) -> Union[list, None]:
-    """Query database."""
-    conn, cur = initialize_db(DB_PARAMS)
-    cur.execute(query)
-    result = cur.fetchall()
-    conn.commit()
-    conn.close()
+def connect_db() -> PooledConnection:
+    """Open a new connection to the bot database."""
+    connection, cursor = initialize_db(get_db_params())
+    cursor.close()
+    return PooledConnection(connection, Config.DB_STATEMENT_CACHE_SIZE)
+
+
+POOL = ConnectionPool(connect_db, Config.DB_POOL_SIZE)
+
+
+def migrate() -> Tuple[int, int]:
+    """Bring the database schema up to date, see migrations.MIGRATIONS.
+
+    :return: Schema version before and after migrating
+    """
+    with POOL.connection() as conn:
+        return migrations.migrate(conn)
+
+
+# SQLite's default limit on the number of host parameters in a single statement
+MAX_QUERY_PARAMS = 999
+
+
+def query_db(query: str, params: Sequence = ()) -> Union[list, None]:
+    """Query database.
+
+    :param query: SQL query with `?` placeholders for values
+    :param params: Values bound to the placeholders
+    :return: Result rows or None if there are no rows
+    """
+    start = time.perf_counter()
+    with POOL.connection() as conn:
+        cur = conn.execute(query, params)
+        result = cur.fetchall()
+        conn.commit()
+    instrumentation.record_query(time.perf_counter() - start)
     return result if bool(result) else None
 
 
+def query_db_many(query: str, seq_of_params: Iterable[Sequence]) -> None:
+    """Execute a data modification query for each parameter sequence in a single transaction.
+
+    :param query: SQL query with `?` placeholders for values
+    :param seq_of_params: Sequence of values bound to the placeholders for each execution
+    """
+    start = time.perf_counter()
+    with POOL.connection() as conn:
+        conn.executemany(query, seq_of_params)
+        conn.commit()
+    instrumentation.record_query(time.perf_counter() - start)
+
+
+def get_pool_stats() -> PoolStats:
+    """Get database connection pool statistics."""
+    return POOL.stats()
+
+
+def get_statement_cache_stats() -> StatementCacheStats:
+    """Get prepared statement cache statistics (hit rate) over all pooled connections."""
+    return POOL.statement_cache_stats()
+
+
+def select_query(table_name: Tables) -> str:
+    """SELECT of all columns of a table by name, in the order of TABLE_COLUMNS."""
+    return f"SELECT {', '.join(column.value for column in TABLE_COLUMNS[table_name])} FROM {table_name.value}"
+
+
 def get_record(table_name: Tables, record: DBKeyValue) -> list:
     """Get record based on a column key and value.
 
@@ -43,9 +121,39 @@ def get_record(table_name: Tables, record: DBKeyValue) -> list:
     :param record: DBKeyValue of primary key
     :return: Return records as list of tuples or empty list if no record is found
     """
-    value = utils.modify_str_int_value(record.value)
-    query = f"SELECT * FROM {table_name.value} WHERE {record.key.value} = {value}"
-    return query_db(query)
+    query = f"{select_query(table_name)} WHERE {record.key.value} = ?"
+    return query_db(query, (record.value,))
+
+
+def get_all_records(table_name: Tables) -> list:
+    """Get all records of a table.
+
+    :param table_name: Table name
+    :return: Return records as list of tuples or empty list if the table is empty
+    """
+    return query_db(select_query(table_name)) or []
+
+
+def get_records_in(table_name: Tables, key: Columns, values: Sequence) -> list:
+    """Get records where a column matches any of the values.
+
+    The number of placeholders is rounded up to the next power of two (padded with a repeated value) so that lookups
+    of different sizes share a small set of prepared statements.
+
+    :param table_name: Table name
+    :param key: Column to match
+    :param values: Column values
+    :return: Return records as list of tuples or empty list if no record is found
+    """
+    records = []
+    for start in range(0, len(values), MAX_QUERY_PARAMS):
+        chunk = list(values[start:start + MAX_QUERY_PARAMS])
+        size = min(1 << (len(chunk) - 1).bit_length(), MAX_QUERY_PARAMS)
+        chunk += chunk[-1:] * (size - len(chunk))
+        placeholders = ", ".join("?" * size)
+        query = f"{select_query(table_name)} WHERE {key.value} IN ({placeholders})"
+        records += query_db(query, chunk) or []
+    return records
 
 
 def get_record_not_value(table_name: Tables, record: DBKeyValue) -> list:
@@ -55,9 +163,8 @@ def get_record_not_value(table_name: Tables, record: DBKeyValue) -> list:
     :param record: DBKeyValue of primary key
     :return: Return records as list of tuples or empty list if no record is found
     """
-    value = utils.modify_str_int_value(record.value)
-    query = f"SELECT * FROM {table_name.value} WHERE {record.key.value} <> {value}"
-    return query_db(query)
+    query = f"{select_query(table_name)} WHERE {record.key.value} <> ?"
+    return query_db(query, (record.value,))
 
 
 def update_record(table_name: Tables, anchor: DBKeyValue, update: DBKeyValue) -> None:
@@ -67,26 +174,44 @@ def update_record(table_name: Tables, anchor: DBKeyValue, update: DBKeyValue) ->
     :param anchor: DBKeyValue of anchor
     :param update: DBKeyValue of update
     """
-    update_value = utils.modify_str_int_value(update.value)
-    anchor_value = utils.modify_str_int_value(anchor.value)
-    query = f"UPDATE {table_name.value} SET {update.key.value} = {update_value} " \
-            f"WHERE {anchor.key.value} = {anchor_value}"
-    return query_db(query)
+    query = f"UPDATE {table_name.value} SET {update.key.value} = ? WHERE {anchor.key.value} = ?"
+    return query_db(query, (update.value, anchor.value))
+
+
+def update_records(table_name: Tables, anchor_key: Columns, update_key: Columns, values: Iterable[Tuple]) -> None:
+    """Update many records in a single transaction.
+
+    :param table_name: Table name
+    :param anchor_key: Column identifying the record
+    :param update_key: Column to update
+    :param values: Tuples of (anchor value, update value)
+    """
+    query = f"UPDATE {table_name.value} SET {update_key.value} = ? WHERE {anchor_key.value} = ?"
+    query_db_many(query, ((update_value, anchor_value) for anchor_value, update_value in values))
 
 
 def insert_record(table_name: Tables, values: Tuple) -> None:
     """Insert record.
 
     :param table_name: Table name
-    :param values: Column values
+    :param values: Column values in the order of TABLE_COLUMNS
+    """
+    query = f"INSERT INTO {table_name.value} ({', '.join(column.value for column in TABLE_COLUMNS[table_name])}) " \
+            f"VALUES ({', '.join('?' * len(values))})"
+    return query_db(query, values)
+
+
+def insert_records(table_name: Tables, records: Sequence[Tuple]) -> None:
+    """Insert many records in a single transaction.
+
+    :param table_name: Table name
+    :param records: Column values in the order of TABLE_COLUMNS for each record
     """
-    query = f"INSERT INTO {table_name.value} VALUES ("
-    for value in values:
-        value = utils.modify_str_int_value(value)
-        query += f"{value}, "
-    query = query[:-2]
-    query += ")"
-    return query_db(query)
+    if not records:
+        return
+    query = f"INSERT INTO {table_name.value} ({', '.join(column.value for column in TABLE_COLUMNS[table_name])}) " \
+            f"VALUES ({', '.join('?' * len(records[0]))})"
+    query_db_many(query, records)
 
 
 def delete_record(table_name: Tables, record: DBKeyValue) -> None:
@@ -95,9 +220,8 @@ def delete_record(table_name: Tables, record: DBKeyValue) -> None:
     :param table_name: Table name
     :param record: DBKeyValue of primary key
     """
-    value = utils.modify_str_int_value(record.value)
-    query = f"DELETE FROM {table_name.value} WHERE {record.key.value} = {value}"
-    return query_db(query)
+    query = f"DELETE FROM {table_name.value} WHERE {record.key.value} = ?"
+    return query_db(query, (record.value,))
 
 
 def get_count(table_name: Tables, key: Columns) -> int:
@@ -107,32 +231,213 @@ def get_count(table_name: Tables, key: Columns) -> int:
     return result[0][0] if bool(result) else 0
 
 
+class SQLiteUserRepository(UserRepository):
+    """User profiles in the USERS table of the bot database."""
+
+    def get(self, user_id: int) -> Union[tuple, None]:
+        result = get_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id))
+        return result[0] if result else None
+
+    def get_many(self, user_ids: Sequence[int]) -> list:
+        return get_records_in(Tables.USERS, Columns.USER_ID, user_ids)
+
+    def all(self) -> list:
+        return get_all_records(Tables.USERS)
+
+    def add(self, row: tuple) -> None:
+        insert_record(Tables.USERS, row)
+
+    def update(self, user_id: int, column: Columns, value: Union[str, int, None]) -> None:
+        update_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id), DBKeyValue(column, value))
+
+    def with_notification(self) -> list:
+        return query_db(f"{select_query(Tables.USERS)} WHERE {Columns.NOTIFICATION_MINUTE.value} IS NOT NULL") or []
+
+    def notification_settings(self) -> list:
+        query = f"SELECT {Columns.USER_ID.value}, {Columns.UTC_OFFSET_MINUTES.value}, " \
+                f"{Columns.NOTIFICATION_MINUTE.value} FROM {Tables.USERS.value} " \
+                f"WHERE {Columns.NOTIFICATION_MINUTE.value} IS NOT NULL"
+        return query_db(query) or []
+
+    def ids_after(self, last_user_id: int, limit: int) -> list:
+        query = f"SELECT {Columns.USER_ID.value} FROM {Tables.USERS.value} WHERE {Columns.USER_ID.value} > ? " \
+                f"ORDER BY {Columns.USER_ID.value} LIMIT ?"
+        return [record[0] for record in query_db(query, (last_user_id, limit)) or []]
+
+    def count_after(self, last_user_id: int) -> int:
+        query = f"SELECT COUNT(*) FROM {Tables.USERS.value} WHERE {Columns.USER_ID.value} > ?"
+        return query_db(query, (last_user_id,))[0][0]
+
+
+class SQLiteContentRepository(ContentRepository):
+    """Readings and prayers in the DAILY_REFLECTION, JUST_FOR_TODAY and PRAYERS tables of the bot database."""
+
+    def readings(self, book: Tables) -> list:
+        return get_all_records(book)
+
+    def reading(self, book: Tables, date: str) -> Union[tuple, None]:
+        result = get_record(book, DBKeyValue(Columns.DATE, date))
+        return result[0] if result else None
+
+    def prayers(self) -> list:
+        return get_all_records(Tables.PRAYERS)
+
+    def prayer(self, title: str) -> Union[tuple, None]:
+        result = get_record(Tables.PRAYERS, DBKeyValue(Columns.TITLE, title))
+        return result[0] if result else None
+
+
+class SQLiteQuoteRepository(QuoteRepository):
+    """Quotes in the MOTIVATIONAL_QUOTES table of the bot database."""
+
+    def quotes(self) -> list:
+        return [record[0] for record in
+                query_db(f"SELECT {Columns.QUOTE.value} FROM {Tables.MOTIVATIONAL_QUOTES.value}") or []]
+
+    def version(self) -> tuple:
+        return query_db(f"SELECT COUNT(*), MAX(rowid) FROM {Tables.MOTIVATIONAL_QUOTES.value}")[0]
+
+
+# Storage backends selectable with Config.STORAGE
+STORAGE_BACKENDS = ("sqlite", "kv", "memory")
+
+
+def check_storage(storage: str) -> None:
+    """Raise ValueError if a storage backend is unknown or can't be used with the database configuration."""
+    if storage not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend {storage!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
+    # The key-value store isn't encrypted, it would keep user profiles in plaintext next to the encrypted database
+    if storage == "kv" and Config.DB_ENCRYPTED:
+        raise ValueError("The kv storage keeps user profiles unencrypted, use sqlite with an encrypted database")
+
+
+def open_repositories(storage: str) -> Repositories:
+    """Open the repositories of a storage backend. The database must be migrated.
+
+    :param storage: "sqlite" keeps everything in the bot database, "kv" keeps user profiles in a local key-value store
+        (Config.KV_PATH, filled from the USERS table when empty) and "memory" keeps a copy of all data in memory,
+        for tests and benchmarks (changes are not persisted)
+    :return: Repositories
+    """
+    check_storage(storage)
+    users, content, quotes = SQLiteUserRepository(), SQLiteContentRepository(), SQLiteQuoteRepository()
+    if storage == "kv":
+        users = KeyValueUserRepository(Config.KV_PATH, users.all)
+    elif storage == "memory":
+        users = MemoryUserRepository(users.all())
+        content = MemoryContentRepository.copy_of(content)
+        quotes = MemoryQuoteRepository(quotes.quotes())
+    return Repositories(users, content, quotes)
+
+
+_repositories: Union[Repositories, None] = None
+_repositories_lock = threading.Lock()
+
+
+def get_repositories() -> Repositories:
+    """Repositories of the configured storage backend, opened on first use (after the database was migrated)."""
+    global _repositories
+    repositories = _repositories
+    if repositories is None:
+        with _repositories_lock:
+            repositories = _repositories
+            if repositories is None:
+                # Nothing was cached yet (the first content load may be what opens the repositories)
+                repositories = _repositories = open_repositories(Config.STORAGE)
+    return repositories
+
+
+def use_storage(storage: str) -> Repositories:
+    """Switch to another storage backend (see open_repositories) and drop the users, content and quotes cached from
+    the previous one."""
+    global _repositories
+    repositories = open_repositories(storage)
+    previous, _repositories = _repositories, repositories
+    if previous is not None:
+        previous.users.close()
+    USER_CACHE.clear()
+    CONTENT_CACHE.invalidate()
+    QUOTE_SAMPLER.invalidate()
+    return repositories
+
+
+def close_repositories() -> None:
+    """Close the storage backend at shutdown."""
+    global _repositories
+    with _repositories_lock:
+        if _repositories is not None:
+            _repositories.users.close()
+            _repositories = None
+
+
+USER_CACHE = UserCache(Config.USER_CACHE_SIZE)
+
+# USERS columns that can be updated and their keys in the user profile dict
+USER_COLUMN_KEYS = {Columns.CLEAN_DATE_EPOCH: "CleanDateTime",
+                    Columns.UTC_OFFSET_MINUTES: "UTCOffset",
+                    Columns.NOTIFICATION_MINUTE: "DailyNotification"}
+
+
 def check_user_exists(user_id: int) -> bool:
     """Check if user already exists.
 
     :param user_id: User ID
     :return: boolean
     """
-    result = get_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id))
-    return bool(result)
+    return get_user(user_id) is not None
 
 
 def get_user(user_id: int) -> dict:
-    """Get user profile.
+    """Get user profile. Profiles are served from USER_CACHE and read from the database only on a cache miss.
 
     :param user_id: User ID
     :return: User profile
     """
-    if check_user_exists(user_id):
-        result = get_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id))
-        user = utils.convert_tuple_to_user_dict(result[0])
-    else:
-        user = None
+    user = USER_CACHE.get(user_id)
+    if user is not None:
+        return user
+    row = get_repositories().users.get(user_id)
+    if row is None:
+        return None
+    user = utils.convert_tuple_to_user_dict(row)
+    USER_CACHE.put(user)
     return user
 
 
+def get_users(user_ids: Sequence[int]) -> list:
+    """Get profiles of many users, reading all USER_CACHE misses with a single query.
+
+    :param user_ids: User IDs
+    :return: Profiles of the existing users, in the order of user_ids
+    """
+    users = {}
+    misses = []
+    for user_id in user_ids:
+        user = USER_CACHE.get(user_id)
+        if user is None:
+            misses.append(user_id)
+        else:
+            users[user_id] = user
+    if misses:
+        for result in get_repositories().users.get_many(misses):
+            user = utils.convert_tuple_to_user_dict(result)
+            USER_CACHE.put(user)
+            users[user["UserID"]] = user
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+
+def update_user_record(user_id: int, update: DBKeyValue) -> None:
+    """Update a column of a user record and write the change through to USER_CACHE.
+
+    :param user_id: User ID
+    :param update: DBKeyValue of update. Column must be one of USER_COLUMN_KEYS.
+    """
+    get_repositories().users.update(user_id, update.key, update.value)
+    USER_CACHE.update(user_id, USER_COLUMN_KEYS[update.key], update.value)
+
+
 def get_users_with_set_notification() -> Union[list, None]:
-    results = get_record_not_value(Tables.USERS, DBKeyValue(Columns.DAILY_NOTIFICATION, ""))
+    results = get_repositories().users.with_notification()
     if results:
         users = []
         for result in results:
@@ -141,36 +446,44 @@ def get_users_with_set_notification() -> Union[list, None]:
     return None
 
 
-def create_user(chat: Chat) -> dict:
+def get_notification_schedule() -> list:
+    """Get UTC minute of day of daily notification for all users with daily notification enabled.
+
+    :return: List of (user ID, UTC minute of day)
+    """
+    return [(user_id, scheduler.local_minute_to_utc_minute(minute, offset or 0))
+            for user_id, offset, minute in get_repositories().users.notification_settings()]
+
+
+def create_user(chat: "Chat") -> dict:
     """Create new user profile and store in USERS table in DB. Return user if user exists."""
     if check_user_exists(chat.id):
         return get_user(chat.id)
-    new_user = (chat.id, chat.username, chat.first_name, chat.last_name, "", "", "", "")
-    insert_record(Tables.USERS, new_user)
-    return utils.convert_tuple_to_user_dict(new_user)
+    new_user = (chat.id, chat.username, chat.first_name, chat.last_name, "", None, None, None)
+    get_repositories().users.add(new_user)
+    user = utils.convert_tuple_to_user_dict(new_user)
+    USER_CACHE.put(user)
+    return user
 
 
-def get_time_offset(user_id: int) -> relativedelta:
+def get_time_offset(user_id: int) -> int:
     """Get UTC offset for user.
 
     :param user_id: User chat
-    :return:
+    :return: UTC offset in minutes, 0 if not set
     """
-    result = get_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id))
-    offset_str = utils.convert_tuple_to_user_dict(result[0])['UTCOffset']
-    return utils.convert_utc_offset_str_relative_delta(offset_str)
+    return get_user(user_id)['UTCOffset'] or 0
 
 
-def update_daily_notification(user_id: int, notification_time: str) -> bool:
+def update_daily_notification(user_id: int, notification_minute: Union[int, None]) -> bool:
     """Update daily notification time.
 
     :param user_id: User chat ID
-    :param notification_time: Notification time
+    :param notification_minute: Local minute of day of the notification, None to disable
     :return: True if Daily notification was updated, otherwise False
     """
     if check_user_exists(user_id):
-        update_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id),
-                      DBKeyValue(Columns.DAILY_NOTIFICATION, notification_time))
+        update_user_record(user_id, DBKeyValue(Columns.NOTIFICATION_MINUTE, notification_minute))
         return True
     return False
 
@@ -179,13 +492,13 @@ def update_user_utc_time_offset(user_id: int, utc_offset: str) -> bool:
     """Update user's UTC time offset.
 
     :param user_id: User chat ID
-    :param utc_offset: UTC offset string
+    :param utc_offset: UTC offset string in the format +/-HH:MM
     :return: True if UTC offset was updated, otherwise False
     """
     if check_user_exists(user_id):
-        if utils.check_offset_format_is_correct(utc_offset):
-            update_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id),
-                          DBKeyValue(Columns.UTC_OFFSET, utc_offset))
+        minutes = utils.parse_utc_offset(utc_offset)
+        if minutes is not None:
+            update_user_record(user_id, DBKeyValue(Columns.UTC_OFFSET_MINUTES, minutes))
             return True
     return False
 
@@ -193,28 +506,65 @@ def update_user_utc_time_offset(user_id: int, utc_offset: str) -> bool:
 def get_user_local_time(user_id: int) -> datetime.datetime:
     """Get user local time."""
     user = get_user(user_id)
-    if user:
-        offset = get_time_offset(user_id)
-        return utils.convert_utc_time_to_local_time(datetime.datetime.utcnow(), offset)
+    if user and user['UTCOffset']:
+        return datetime.datetime.utcnow() + datetime.timedelta(minutes=user['UTCOffset'])
     else:
         return datetime.datetime.utcnow()
 
 
-def get_clean_time_str(clean_date_time: datetime.datetime, user_id: int) -> Tuple:
+def get_clean_time_str(user: dict) -> Tuple:
     """Get clean time based on user specified clean date.
 
-    :param clean_date_time: datetime.datetime object specifying the clean date
-    :param user_id: User ID
-    :return: Clean time string
+    :param user: User profile with clean date set
+    :return: Clean time string and number of days since the clean date
+    """
+    clean_time = clean_time_batch.compute_clean_time(user["CleanDateTime"], (user["UTCOffset"] or 0) * 60)
+    return utils.format_clean_time_str(*clean_time[:7]), clean_time[7]
+
+
+def get_clean_time_strs(users: Sequence[dict]) -> list:
+    """Get clean time of many users at once, same as get_clean_time_str for each of them.
+
+    :param users: User profiles
+    :return: List of (clean time string, days since) per user, None for users without a clean date
+    """
+    valid = [i for i, user in enumerate(users) if user["CleanDateTime"] is not None]
+    clean_times = clean_time_batch.compute_clean_times([users[i]["CleanDateTime"] for i in valid],
+                                                       [(users[i]["UTCOffset"] or 0) * 60 for i in valid])
+    results = [None] * len(users)
+    for i, result in zip(valid, clean_time_batch.format_clean_times(clean_times)):
+        results[i] = result
+    return results
+
+
+def load_content() -> dict:
+    """Load and render all readings and prayers.
+
+    :return: Rendered messages keyed by (book name, MM-DD) for readings and by ("Prayers", prayer title) for prayers
     """
-    local_dt = get_user_local_time(user_id)
-    date_time_delta = relativedelta(local_dt, clean_date_time)
-    clean_time_str = utils.build_clean_time_str(date_time_delta)
-    days_since = (local_dt - clean_date_time).days
-    return clean_time_str, days_since
+    repository = get_repositories().content
+    content = {}
+    books = ((MenuElements.DAILY_REFLECTION.value.name, Tables.DAILY_REFLECTION),
+             (MenuElements.JUST_FOR_TODAY.value.name, Tables.JUST_FOR_TODAY))
+    for book_name, book in books:
+        for record in repository.readings(book):
+            reading = utils.convert_tuple_to_reading_dict(record)
+            content[(book_name, reading["Date"][5:])] = utils.format_reading(book_name, reading)
+    for record in repository.prayers():
+        prayer = utils.convert_tuple_to_prayer_dict(record)
+        content[(MenuElements.PRAYERS.value.name, prayer["Title"])] = utils.format_prayer(prayer)
+    return content
+
 
+CONTENT_CACHE = ContentCache(load_content)
 
-def get_reading(book_name: str, date: datetime.datetime = datetime.datetime.today()) -> str:
+
+def invalidate_content_cache() -> None:
+    """Drop cached readings and prayers. Call after the content tables were modified."""
+    CONTENT_CACHE.invalidate()
+
+
+def get_reading(book_name: str, date: datetime.datetime = None) -> str:
     """Get reading for a day to user.
 
     :param book_name: Name of the book (Alcoholic Anonymous or Narcotics Anonymous)
@@ -222,10 +572,14 @@ def get_reading(book_name: str, date: datetime.datetime = datetime.datetime.toda
     leap year
     :return Reading for the day
     """
+    date = date or datetime.datetime.today()
+    reading = CONTENT_CACHE.get((book_name, f"{date.month:02d}-{date.day:02d}"))
+    if reading is not None:
+        return reading
     date = datetime.datetime(2020, date.month, date.day)
     book = Tables.DAILY_REFLECTION if book_name == "DailyReflection" else Tables.JUST_FOR_TODAY
-    reading = get_record(book, DBKeyValue(Columns.DATE, str(date.date())))
-    return utils.format_reading(book_name, utils.convert_tuple_to_reading_dict(reading[0]))
+    reading = get_repositories().content.reading(book, str(date.date()))
+    return utils.format_reading(book_name, utils.convert_tuple_to_reading_dict(reading))
 
 
 def get_prayer(prayer_name: str) -> str:
@@ -234,22 +588,80 @@ def get_prayer(prayer_name: str) -> str:
     :param prayer_name: Name of the Prayer
     :return Prayer
     """
-    prayer = get_record(Tables.PRAYERS, DBKeyValue(Columns.TITLE, prayer_name))
-    return utils.format_prayer(utils.convert_tuple_to_prayer_dict(prayer[0]))
+    prayer = CONTENT_CACHE.get((MenuElements.PRAYERS.value.name, prayer_name))
+    if prayer is not None:
+        return prayer
+    prayer = get_repositories().content.prayer(prayer_name)
+    return utils.format_prayer(utils.convert_tuple_to_prayer_dict(prayer))
+
+
+def load_motivational_quotes() -> list:
+    """Load all motivational quotes."""
+    return get_repositories().quotes.quotes()
+
+
+def get_motivational_quotes_version() -> tuple:
+    """Cheap signature of the quotes which changes when quotes are added or removed."""
+    return get_repositories().quotes.version()
+
+
+QUOTE_SAMPLER = QuoteSampler(load_motivational_quotes, get_motivational_quotes_version,
+                             Config.QUOTES_REFRESH_INTERVAL)
 
 
 def get_random_motivational_str() -> str:
     """Get a random quote from the list of quotes."""
-    rand_int = random.randrange(get_count(Tables.MOTIVATIONAL_QUOTES, Columns.SL_NO))
-    quote = get_record(Tables.MOTIVATIONAL_QUOTES, DBKeyValue(Columns.SL_NO, rand_int))
-    return quote[0][1]
+    return QUOTE_SAMPLER.sample()
+
+
+# Lower than any user ID (SQLite's smallest integer), used as the start of keyset pagination over USERS
+BEFORE_FIRST_USER_ID = -2 ** 63
+
+
+def get_user_ids_after(last_user_id: int, limit: int) -> list:
+    """Get a batch of user IDs in ascending order (keyset pagination over USERS).
+
+    :param last_user_id: Only user IDs greater than this are returned
+    :param limit: Maximum number of user IDs
+    :return: List of user IDs
+    """
+    return get_repositories().users.ids_after(last_user_id, limit)
+
+
+def count_users_after(last_user_id: int) -> int:
+    """Get number of users with user ID greater than last_user_id."""
+    return get_repositories().users.count_after(last_user_id)
+
+
+def create_broadcast(message: str) -> BroadcastRecord:
+    """Create a new broadcast checkpoint starting before the first user."""
+    with POOL.connection() as conn:
+        cur = conn.execute(f"INSERT INTO {Tables.BROADCASTS.value} ({Columns.MESSAGE.value}, "
+                           f"{Columns.LAST_USER_ID.value}, {Columns.SENT.value}, {Columns.FAILED.value}, "
+                           f"{Columns.STATUS.value}) VALUES (?, ?, ?, ?, ?)",
+                           (message, BEFORE_FIRST_USER_ID, 0, 0, BroadcastStatus.RUNNING.value))
+        conn.commit()
+    return BroadcastRecord(cur.lastrowid, message, BEFORE_FIRST_USER_ID, 0, 0, BroadcastStatus.RUNNING.value)
+
+
+def update_broadcast(broadcast: BroadcastRecord) -> None:
+    """Store broadcast checkpoint."""
+    query = f"UPDATE {Tables.BROADCASTS.value} SET {Columns.LAST_USER_ID.value} = ?, {Columns.SENT.value} = ?, " \
+            f"{Columns.FAILED.value} = ?, {Columns.STATUS.value} = ? WHERE {Columns.BROADCAST_ID.value} = ?"
+    query_db(query, (broadcast.last_user_id, broadcast.sent, broadcast.failed, broadcast.status,
+                     broadcast.broadcast_id))
+
+
+def get_unfinished_broadcasts() -> list:
+    """Get checkpoints of broadcasts that were interrupted before reaching the last user."""
+    records = get_record(Tables.BROADCASTS, DBKeyValue(Columns.STATUS, BroadcastStatus.RUNNING.value))
+    return [BroadcastRecord(*record) for record in records or []]
 
 
 def set_clean_date(user_id: int, str_date: str) -> bool:
     if check_user_exists(user_id):
-        dt = utils.convert_str_to_datetime(str_date)
-        if dt:
-            update_record(Tables.USERS, DBKeyValue(Columns.USER_ID, user_id), DBKeyValue(Columns.CLEAN_DATE, str_date))
-            # ToDo: Force update the user_data in context to reflect the change
+        epoch = utils.parse_date_time_to_epoch(str_date)
+        if epoch is not None:
+            update_user_record(user_id, DBKeyValue(Columns.CLEAN_DATE_EPOCH, epoch))
             return True
     return False
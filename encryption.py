@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, Tuple, Union
+
+# SQLCipher 4 defaults: the key is PBKDF2-HMAC-SHA512 of the passphrase and the random salt stored in the first 16
+# bytes of the database file
+KDF_ALGORITHM = "sha512"
+KEY_SIZE = 32
+SALT_SIZE = 16
+# First bytes of a plaintext SQLite database
+PLAINTEXT_HEADER = b"SQLite format 3\x00"
+# Raw key: 64 hex digits, optionally followed by 32 hex digits of salt
+RAW_KEY = re.compile(r"[0-9a-f]{64}([0-9a-f]{32})?")
+
+_keys: Dict[Tuple, str] = {}
+_keys_lock = threading.Lock()
+
+
+def load_sqlcipher():
+    """SQLCipher DB-API module (pysqlcipher3), the drop-in replacement of sqlite3 for encrypted databases."""
+    try:
+        from pysqlcipher3 import dbapi2
+    except ImportError as e:
+        raise RuntimeError("Database encryption needs pysqlcipher3, see PySQLCipher3 Installation in README.md") \
+            from e
+    return dbapi2
+
+
+def derive_key(passphrase: str, salt: bytes, iterations: int) -> bytes:
+    """Derive the key SQLCipher derives from a passphrase (expensive on purpose, hundreds of ms)."""
+    return hashlib.pbkdf2_hmac(KDF_ALGORITHM, passphrase.encode(), salt, iterations, KEY_SIZE)
+
+
+def read_salt(path: str) -> Union[bytes, None]:
+    """Salt of an encrypted database, None if the database doesn't exist yet or is empty."""
+    try:
+        with open(path, "rb") as f:
+            salt = f.read(SALT_SIZE)
+    except FileNotFoundError:
+        return None
+    if salt == PLAINTEXT_HEADER:
+        raise ValueError(f"{path} is not encrypted, encrypt it with encryption.encrypt_database first")
+    return salt if len(salt) == SALT_SIZE else None
+
+
+def database_key(path: str, passphrase: Union[str, None], raw_key: Union[str, None], iterations: int) -> str:
+    """PRAGMA key value (raw key literal) of an encrypted database, derived once per process.
+
+    SQLCipher runs its key derivation whenever a connection is keyed with a passphrase. Instead the key is derived here
+    once, from the passphrase and the salt of the database (a new random salt for a new database) with the iterations
+    the database was created with, and every connection is keyed with the raw key and salt, which skips the derivation.
+    A configured raw key is used as is, no derivation runs at all.
+
+    :param path: Database file
+    :param passphrase: Passphrase, ignored if a raw key is given
+    :param raw_key: Raw key as 64 hex digits (optionally followed by 32 hex digits of salt), or None
+    :param iterations: KDF iterations of the passphrase (SQLCipher's kdf_iter, 256000 in SQLCipher 4)
+    :return: Key as x'<hex>' literal
+    """
+    cache_key = (os.path.abspath(path), passphrase, raw_key, iterations)
+    with _keys_lock:
+        literal = _keys.get(cache_key)
+        if literal is None:
+            if raw_key:
+                raw_key = raw_key.strip().lower()
+                if not RAW_KEY.fullmatch(raw_key):
+                    raise ValueError("Raw database key must be 64 hex digits, optionally followed by 32 of salt")
+                literal = f"x'{raw_key}'"
+            elif passphrase:
+                salt = read_salt(path) or os.urandom(SALT_SIZE)
+                literal = f"x'{derive_key(passphrase, salt, iterations).hex()}{salt.hex()}'"
+            else:
+                raise ValueError("Database encryption needs a passphrase or a raw key")
+            _keys[cache_key] = literal
+        return literal
+
+
+def encrypt_database(source: str, target: str, key: str) -> None:
+    """Write an encrypted copy of a plaintext database, e.g. to turn on encryption for an existing bot database.
+
+    :param source: Plaintext database
+    :param target: Encrypted database to create
+    :param key: Key of the encrypted database, see database_key
+    """
+    sqlcipher = load_sqlcipher()
+    connection = sqlcipher.connect(source)
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        connection.execute(f"ATTACH DATABASE ? AS encrypted KEY \"{key}\"", (target,))
+        connection.execute("SELECT sqlcipher_export('encrypted')")
+        connection.execute(f"PRAGMA encrypted.user_version = {int(version)}")
+        connection.execute("DETACH DATABASE encrypted")
+    finally:
+        connection.close()
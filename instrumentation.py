@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+QUERY_LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 100, 1000)
+
+
+class Histogram:
+    """Thread-safe histogram with fixed bucket upper bounds (an extra bucket collects values above the last bound)."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Add a value."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Consistent copy of the bucket counts, count and total."""
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile as the upper bound of the bucket containing it (inf for the overflow bucket)."""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class HandlerStats:
+    """Per-handler call statistics.
+
+    queries: Number of DB queries per call
+    db_ms: Time spent in DB queries per call
+    format_ms: Time spent outside of DB queries and queueing messages (message building and formatting) per call
+    enqueue_ms: Time spent handing messages to the outbound queue per call (blocks while the queue is full, includes
+        the Bot API calls while the queue isn't started)
+    send_ms: Bot API round trip of each message of the handler, retries included, measured by the sender threads
+    total_ms: Handler latency
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.format_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.enqueue_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.send_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.total_ms = Histogram(LATENCY_BUCKETS_MS)
+        self._lock = threading.Lock()
+
+    def record_call(self, error: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+
+
+class _Call:
+    """Measurements of the handler call active on the current thread."""
+    __slots__ = ("name", "start", "queries", "db_time", "enqueue_time")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.enqueue_time = 0.0
+
+
+_local = threading.local()
+# All DB queries, including those outside of handlers (jobs, broadcasts)
+QUERY_MS = Histogram(QUERY_LATENCY_BUCKETS_MS)
+# Runs handler calls instead of calling them directly while set, e.g. to profile them: hook(name, handler, args, kwargs)
+_call_hook = None
+_stats: Dict[str, HandlerStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_handler_stats(name: str) -> HandlerStats:
+    """Get (or create) statistics for a handler."""
+    stats = _stats.get(name)
+    if stats is None:
+        with _stats_lock:
+            stats = _stats.setdefault(name, HandlerStats())
+    return stats
+
+
+def get_all_handler_stats() -> Dict[str, HandlerStats]:
+    """Get statistics of all handlers called so far."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _current_call() -> Union[_Call, None]:
+    return getattr(_local, "call", None)
+
+
+def instrumented(handler: Callable) -> Callable:
+    """Decorator recording query count, DB time, formatting time, enqueue time and latency of a handler."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if _current_call() is not None:
+            # Handler called from another handler, measured as part of the outer call
+            return handler(*args, **kwargs)
+        call = _local.call = _Call(name)
+        error = True
+        start = call.start
+        try:
+            hook = _call_hook
+            result = handler(*args, **kwargs) if hook is None else hook(name, handler, args, kwargs)
+            error = False
+            return result
+        finally:
+            total = time.perf_counter() - start
+            _local.call = None
+            stats = get_handler_stats(name)
+            stats.record_call(error)
+            stats.queries.observe(call.queries)
+            stats.db_ms.observe(call.db_time * 1000)
+            stats.enqueue_ms.observe(call.enqueue_time * 1000)
+            stats.format_ms.observe(max(total - call.db_time - call.enqueue_time, 0.0) * 1000)
+            stats.total_ms.observe(total * 1000)
+    return wrapper
+
+
+def current_handler() -> Tuple[str, float]:
+    """Name of the handler active on the current thread and seconds since it was called, ("", 0.0) if none."""
+    call = _current_call()
+    if call is None:
+        return "", 0.0
+    return call.name, time.perf_counter() - call.start
+
+
+def set_call_hook(hook: Union[Callable[[str, Callable, tuple, dict], object], None]) -> None:
+    """Set (or remove with None) the hook running instrumented handler calls."""
+    global _call_hook
+    _call_hook = hook
+
+
+def record_query(duration: float) -> None:
+    """Record a DB query of `duration` seconds for the handler active on the current thread."""
+    QUERY_MS.observe(duration * 1000)
+    call = _current_call()
+    if call is not None:
+        call.queries += 1
+        call.db_time += duration
+
+
+@contextmanager
+def enqueue_timer() -> Iterator[None]:
+    """Time handing a message to the outbound queue by the handler active on the current thread."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        call = _current_call()
+        if call is not None:
+            call.enqueue_time += time.perf_counter() - start
+
+
+def record_send(handler: str, duration: float) -> None:
+    """Record the Bot API round trip (`duration` seconds) of a message queued by a handler, "" for none."""
+    if handler:
+        get_handler_stats(handler).send_ms.observe(duration * 1000)
+
+
+def summary() -> str:
+    """Summarize handler statistics as a plain text table."""
+    lines = [f"{'handler':<28}{'calls':>7}{'err':>5}{'q/call':>8}{'q p99':>7}"
+             f"{'db ms':>8}{'fmt ms':>8}{'enq ms':>8}{'send ms':>9}{'p50 ms':>8}{'p99 ms':>8}"]
+    for name, stats in sorted(get_all_handler_stats().items()):
+        if not stats.calls:
+            continue
+        lines.append(f"{name:<28}{stats.calls:>7}{stats.errors:>5}{stats.queries.mean():>8.1f}"
+                     f"{stats.queries.quantile(0.99):>7}{stats.db_ms.mean():>8.1f}{stats.format_ms.mean():>8.1f}"
+                     f"{stats.enqueue_ms.mean():>8.1f}{stats.send_ms.mean():>9.1f}{stats.total_ms.quantile(0.5):>8}"
+                     f"{stats.total_ms.quantile(0.99):>8}")
+    return "\n".join(lines)
+
+
+def reset() -> None:
+    """Drop all collected statistics."""
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import hashlib
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Union
+
+import instrumentation
+from config import Config
+
+LOG_FORMAT = '%(asctime)s - %(filename)s - %(funcName)s - Line: %(lineno)d - %(levelname)s - %(message)s'
+
+logger = logging.getLogger(__name__)
+
+
+def start_logging(path: str, max_bytes: int, backups: int) -> QueueListener:
+    """Route all log records through a queue to a background thread writing the rotated log file (and the console for
+    errors), so handler threads never wait on file I/O.
+
+    :param path: Log file
+    :param max_bytes: Size at which the log file is rotated
+    :param backups: Number of rotated log files kept
+    :return: Started queue listener, stop it at shutdown to flush pending records
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    console_handler.setLevel(logging.ERROR)
+
+    records = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.handlers = [QueueHandler(records)]
+    root_logger.setLevel(logging.INFO)
+    listener = QueueListener(records, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class MessageLog:
+    """Logs sent messages as structured records without their text.
+
+    Each record holds the handler, a keyed hash of the user (chat) ID, the message length and the handler latency so
+    far. The full text is only logged for a random sample of messages.
+    """
+
+    def __init__(self, sample_rate: float, hash_key: Union[str, None] = None) -> None:
+        """
+        :param sample_rate: Share (0.0 - 1.0) of messages logged with their text
+        :param hash_key: Key of the user hashes, a random key if None
+        """
+        self.sample_rate = sample_rate
+        self._hash_key = hash_key.encode() if hash_key else os.urandom(16)
+
+    def user_hash(self, user_id: int) -> str:
+        """Keyed hash of a user ID, stable for a key but not reversible without it."""
+        return hashlib.blake2b(str(user_id).encode(), key=self._hash_key, digest_size=8).hexdigest()
+
+    def log(self, user_id: int, message: str) -> None:
+        """Log a message sent to a user."""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        handler, latency = instrumentation.current_handler()
+        if self.sample_rate and random.random() < self.sample_rate:
+            logger.info("handler=%s user=%s length=%d latency_ms=%.1f body=%r", handler or "-", self.user_hash(user_id),
+                        len(message), latency * 1000, message)
+        else:
+            logger.info("handler=%s user=%s length=%d latency_ms=%.1f", handler or "-", self.user_hash(user_id),
+                        len(message), latency * 1000)
+
+
+# Log of messages sent by the handlers
+MESSAGE_LOG = MessageLog(Config.LOG_BODY_SAMPLE_RATE, Config.LOG_USER_HASH_KEY)
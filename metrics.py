@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Sequence, Union
+
+from telegram import Update
+from telegram.ext import CallbackContext, JobQueue
+
+import database
+import instrumentation
+import outbound
+import scheduler
+from instrumentation import Histogram
+
+PREFIX = "sober_serenity"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_updates = Counter()
+_updates_lock = threading.Lock()
+
+
+def count_update(update: Update, context: CallbackContext) -> None:
+    """TypeHandler callback counting incoming updates by type."""
+    kind = "callback_query" if update.callback_query is not None else "message" if update.message is not None \
+        else "other"
+    with _updates_lock:
+        _updates[kind] += 1
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class _Writer:
+    """Prometheus text exposition format writer, keeping the samples of a metric family together."""
+
+    def __init__(self) -> None:
+        self._families: Dict[str, List[str]] = {}
+
+    def _family(self, name: str, kind: str, help_text: str) -> List[str]:
+        lines = self._families.get(name)
+        if lines is None:
+            lines = self._families[name] = [f"# HELP {PREFIX}_{name} {help_text}", f"# TYPE {PREFIX}_{name} {kind}"]
+        return lines
+
+    def text(self) -> str:
+        return "".join(line + "\n" for lines in self._families.values() for line in lines)
+
+    def sample(self, name: str, kind: str, help_text: str, value: float, **labels) -> None:
+        self._family(name, kind, help_text).append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+
+    def histogram(self, name: str, help_text: str, histogram: Histogram, scale: float = 1.0, **labels) -> None:
+        """Write a histogram, bucket bounds and total are multiplied by scale (e.g. 0.001 for ms to seconds)."""
+        lines = self._family(name, "histogram", help_text)
+        counts, count, total = histogram.snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{PREFIX}_{name}_bucket{_labels(dict(labels, le=f'{bound * scale:g}'))} {cumulative}")
+        lines.append(f"{PREFIX}_{name}_bucket{_labels(dict(labels, le='+Inf'))} {count}")
+        lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {total * scale}")
+        lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {count}")
+
+
+def render(job_queue: Union[JobQueue, None] = None) -> str:
+    """Render all metrics in the Prometheus text format. Everything is read from existing counters on demand."""
+    w = _Writer()
+    with _updates_lock:
+        updates = dict(_updates)
+    for kind, count in sorted(updates.items()):
+        w.sample("updates_total", "counter", "Incoming updates", count, type=kind)
+
+    for name, stats in sorted(instrumentation.get_all_handler_stats().items()):
+        w.sample("handler_calls_total", "counter", "Handler calls", stats.calls, handler=name)
+        w.sample("handler_errors_total", "counter", "Handler calls raising an exception", stats.errors, handler=name)
+        w.histogram("handler_latency_seconds", "Handler latency", stats.total_ms, 0.001, handler=name)
+        w.histogram("handler_queries", "DB queries per handler call", stats.queries, handler=name)
+
+    w.histogram("db_query_duration_seconds", "DB query duration", instrumentation.QUERY_MS, 0.001)
+    pool = database.get_pool_stats()
+    w.sample("db_connections_open", "gauge", "Open pooled DB connections", pool.open)
+    w.sample("db_connections_in_use", "gauge", "Borrowed pooled DB connections", pool.in_use)
+    w.sample("db_connection_waits_total", "counter", "Waits for a free DB connection", pool.waited)
+    w.sample("db_connection_wait_seconds_total", "counter", "Time spent waiting for a DB connection", pool.wait_time)
+
+    queue = outbound.OUTBOUND
+    w.histogram("send_latency_seconds", "Bot API send latency, retries included", queue.send_ms, 0.001)
+    w.histogram("outbound_queue_wait_seconds", "Time messages wait in the outbound queue", queue.queue_ms, 0.001)
+    w.sample("messages_sent_total", "counter", "Messages sent", queue.sent)
+    w.sample("messages_failed_total", "counter", "Messages that could not be sent", queue.failed)
+    w.sample("send_retries_total", "counter", "Sends retried after a rate limit", queue.retries)
+    w.sample("outbound_queue_depth", "gauge", "Messages waiting to be sent", queue.depth())
+
+    notifications = scheduler.NOTIFICATIONS
+    w.sample("notification_ticks_total", "counter", "Runs of the daily notification job", notifications.ticks)
+    w.sample("notifications_total", "counter", "Daily notifications handed to the sender", notifications.notified)
+    w.sample("notification_failures_total", "counter", "Failed notification minutes", notifications.failures)
+    w.sample("notification_users", "gauge", "Users with daily notification enabled", len(notifications))
+    if job_queue is not None:
+        w.sample("jobs", "gauge", "Scheduled JobQueue jobs", len(job_queue.jobs()))
+
+    user_cache = database.USER_CACHE.stats()
+    content_cache = database.CONTENT_CACHE.stats()
+    statements = database.get_statement_cache_stats()
+    caches = (("user", user_cache.hits, user_cache.misses, user_cache.size),
+              ("content", content_cache.hits, content_cache.misses, content_cache.size),
+              ("statement", statements.hits, statements.misses, statements.cached))
+    for name, hits, misses, size in caches:
+        w.sample("cache_hits_total", "counter", "Cache hits", hits, cache=name)
+        w.sample("cache_misses_total", "counter", "Cache misses", misses, cache=name)
+        w.sample("cache_hit_ratio", "gauge", "Cache hits / lookups", hits / (hits + misses) if hits + misses else 0.0,
+                 cache=name)
+        w.sample("cache_entries", "gauge", "Cached entries", size, cache=name)
+    return w.text()
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving `render()` at /metrics on a daemon thread.
+
+    Nothing is computed between scrapes: metrics are read from the counters and histograms the bot keeps anyway.
+    """
+
+    def __init__(self, listen: str, port: int, job_queue: Union[JobQueue, None] = None) -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render(job_queue).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Sequence) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((listen, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
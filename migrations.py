@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import logging
+from typing import Tuple
+
+import utils
+from connection_pool import PooledConnection
+from models import Columns, Migration, Tables
+
+logger = logging.getLogger(__name__)
+
+# Legacy string columns of USERS, the integer columns replacing them and the parser converting the legacy values
+_USER_TIME_COLUMNS = ((Columns.CLEAN_DATE, Columns.CLEAN_DATE_EPOCH, utils.parse_date_time_to_epoch),
+                      (Columns.UTC_OFFSET, Columns.UTC_OFFSET_MINUTES, utils.parse_utc_offset),
+                      (Columns.DAILY_NOTIFICATION, Columns.NOTIFICATION_MINUTE, utils.parse_time_of_day))
+
+_USERS = Tables.USERS.value
+_NOTIFICATION_INDEX = "USERS_NOTIFICATION_MINUTE"
+
+
+def _get_columns(conn: PooledConnection, table: Tables) -> set:
+    """Get column names of a table, empty if the table doesn't exist."""
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table.value})").fetchall()}
+
+
+def _add_user_time_columns(conn: PooledConnection) -> None:
+    """Add integer clean date, UTC offset and notification time columns and fill them from the legacy strings.
+
+    Empty or malformed legacy values become NULL.
+    """
+    columns = _get_columns(conn, Tables.USERS)
+    if not columns or Columns.CLEAN_DATE_EPOCH.value in columns:
+        return
+    for _, column, _ in _USER_TIME_COLUMNS:
+        conn.execute(f"ALTER TABLE {_USERS} ADD COLUMN {column.value} INTEGER")
+    legacy = ", ".join(legacy_column.value for legacy_column, _, _ in _USER_TIME_COLUMNS)
+    # Rows are addressed by rowid, the legacy table has no index on user_id
+    rows = conn.execute(f"SELECT rowid, {legacy} FROM {_USERS}").fetchall()
+    assignments = ", ".join(f"{column.value} = ?" for _, column, _ in _USER_TIME_COLUMNS)
+    parsers = [parse for _, _, parse in _USER_TIME_COLUMNS]
+    conn.executemany(f"UPDATE {_USERS} SET {assignments} WHERE rowid = ?",
+                     [tuple(parse(value) if value else None for parse, value in zip(parsers, row[1:])) + (row[0],)
+                      for row in rows])
+
+
+def _create_typed_users(conn: PooledConnection) -> None:
+    """Rebuild USERS with typed columns and user_id as primary key, dropping the legacy string columns.
+
+    If a user ID appears more than once, the most recently inserted row is kept.
+    """
+    exists = bool(_get_columns(conn, Tables.USERS))
+    conn.execute(f"CREATE TABLE {_USERS}_MIGRATION ("
+                 f"{Columns.USER_ID.value} INTEGER PRIMARY KEY, {Columns.USER_NAME.value} TEXT, "
+                 f"{Columns.FIRST_NAME.value} TEXT, {Columns.LAST_NAME.value} TEXT, "
+                 f"{Columns.ADDICTIONS.value} TEXT NOT NULL DEFAULT '', {Columns.CLEAN_DATE_EPOCH.value} INTEGER, "
+                 f"{Columns.UTC_OFFSET_MINUTES.value} INTEGER, {Columns.NOTIFICATION_MINUTE.value} INTEGER)")
+    if exists:
+        conn.execute(f"INSERT OR REPLACE INTO {_USERS}_MIGRATION "
+                     f"SELECT {Columns.USER_ID.value}, {Columns.USER_NAME.value}, {Columns.FIRST_NAME.value}, "
+                     f"{Columns.LAST_NAME.value}, COALESCE({Columns.ADDICTIONS.value}, ''), "
+                     f"{Columns.CLEAN_DATE_EPOCH.value}, {Columns.UTC_OFFSET_MINUTES.value}, "
+                     f"{Columns.NOTIFICATION_MINUTE.value} FROM {_USERS} ORDER BY rowid")
+        conn.execute(f"DROP TABLE {_USERS}")
+    conn.execute(f"ALTER TABLE {_USERS}_MIGRATION RENAME TO {_USERS}")
+
+
+def _create_content_indexes(conn: PooledConnection) -> None:
+    """Index readings by date and title and prayers by title (content tables that don't exist are skipped)."""
+    for table, columns in ((Tables.DAILY_REFLECTION, (Columns.DATE, Columns.TITLE)),
+                           (Tables.JUST_FOR_TODAY, (Columns.DATE, Columns.TITLE)),
+                           (Tables.PRAYERS, (Columns.TITLE,))):
+        if not _get_columns(conn, table):
+            continue
+        for column in columns:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table.value}_{column.value.upper()} "
+                         f"ON {table.value}({column.value})")
+
+
+def _create_notification_index(conn: PooledConnection) -> None:
+    """Partial index of users with daily notification enabled, covering the notification schedule query."""
+    conn.execute(f"CREATE INDEX {_NOTIFICATION_INDEX} "
+                 f"ON {_USERS}({Columns.NOTIFICATION_MINUTE.value}, {Columns.UTC_OFFSET_MINUTES.value}) "
+                 f"WHERE {Columns.NOTIFICATION_MINUTE.value} IS NOT NULL")
+
+
+def _create_broadcasts(conn: PooledConnection) -> None:
+    """Broadcast checkpoints (the table may already exist, it used to be created at startup)."""
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {Tables.BROADCASTS.value} ("
+                 f"{Columns.BROADCAST_ID.value} INTEGER PRIMARY KEY, {Columns.MESSAGE.value} TEXT NOT NULL, "
+                 f"{Columns.LAST_USER_ID.value} INTEGER NOT NULL, {Columns.SENT.value} INTEGER NOT NULL, "
+                 f"{Columns.FAILED.value} INTEGER NOT NULL, {Columns.STATUS.value} TEXT NOT NULL)")
+
+
+# Never change or reorder released migrations, append new ones with the next version
+MIGRATIONS = (
+    Migration(1, "Integer clean date, UTC offset and notification time columns", _add_user_time_columns),
+    Migration(2, "Typed USERS table with user_id primary key", _create_typed_users),
+    Migration(3, "Reading date and title and prayer title indexes", _create_content_indexes),
+    Migration(4, "Partial index of users with daily notification", _create_notification_index),
+    Migration(5, "BROADCASTS checkpoint table", _create_broadcasts),
+)
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn: PooledConnection) -> int:
+    """Get schema version recorded in the database (SQLite user_version), 0 for an unversioned database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: PooledConnection) -> Tuple[int, int]:
+    """Apply all pending migrations.
+
+    Every migration runs in its own transaction together with the update of the recorded schema version, so an
+    interrupted migration is rolled back completely and retried on the next start.
+
+    :param conn: Database connection
+    :return: Schema version before and after migrating
+    """
+    start_version = version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than the supported version {SCHEMA_VERSION}")
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with conn.connection:
+            conn.execute("BEGIN")
+            migration.apply(conn)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+        version = migration.version
+        logger.info("Migrated database to schema version %d: %s", version, migration.description)
+    return start_version, version
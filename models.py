@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 from enum import Enum
-from typing import NamedTuple, Union
+from typing import TYPE_CHECKING, Callable, NamedTuple, Union
 
-from telegram import Update
+from telegram import CallbackQuery, ReplyMarkup, Update
 from telegram.ext import CallbackContext
 
+if TYPE_CHECKING:
+    from repositories import ContentRepository, QuoteRepository, UserRepository
+
 
 class MenuElementValues(NamedTuple):
     """Menu Element name and data tuple.
@@ -43,6 +46,7 @@ class Tables(Enum):
     PRAYERS = "PRAYERS"
     MOTIVATIONAL_QUOTES = "MOTIVATIONAL_QUOTES"
     USERS = "USERS"
+    BROADCASTS = "BROADCASTS"
 
 
 class Columns(Enum):
@@ -70,16 +74,91 @@ class Columns(Enum):
     CLEAN_DATE = "clean_date"
     UTC_OFFSET = "utc_offset"
     DAILY_NOTIFICATION = "daily_notification"
+    CLEAN_DATE_EPOCH = "clean_date_epoch"
+    UTC_OFFSET_MINUTES = "utc_offset_minutes"
+    NOTIFICATION_MINUTE = "notification_minute"
+    BROADCAST_ID = "broadcast_id"
+    MESSAGE = "message"
+    LAST_USER_ID = "last_user_id"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS = "status"
+
+
+# Columns of each table in the order they are selected and inserted (queries never rely on SELECT * column order)
+TABLE_COLUMNS = {
+    Tables.DAILY_REFLECTION: (Columns.DATE, Columns.DAY, Columns.MONTH, Columns.TITLE, Columns.SNIPPET,
+                              Columns.REFERENCE, Columns.PAGE, Columns.CONTENT, Columns.COPYRIGHT, Columns.WEBSITE),
+    Tables.JUST_FOR_TODAY: (Columns.DATE, Columns.DAY, Columns.MONTH, Columns.TITLE, Columns.SNIPPET,
+                            Columns.REFERENCE, Columns.PAGE, Columns.CONTENT, Columns.JUST_FOR_TODAY,
+                            Columns.COPYRIGHT, Columns.WEBSITE),
+    Tables.PRAYERS: (Columns.TITLE, Columns.NAME, Columns.PRAYER),
+    Tables.MOTIVATIONAL_QUOTES: (Columns.SL_NO, Columns.QUOTE),
+    Tables.USERS: (Columns.USER_ID, Columns.USER_NAME, Columns.FIRST_NAME, Columns.LAST_NAME, Columns.ADDICTIONS,
+                   Columns.CLEAN_DATE_EPOCH, Columns.UTC_OFFSET_MINUTES, Columns.NOTIFICATION_MINUTE),
+    Tables.BROADCASTS: (Columns.BROADCAST_ID, Columns.MESSAGE, Columns.LAST_USER_ID, Columns.SENT, Columns.FAILED,
+                        Columns.STATUS),
+}
+
+
+class Keyboards(Enum):
+    """Static inline keyboards."""
+    MAIN_MENU = "main_menu"
+    READINGS_MENU = "readings_menu"
+    PRAYERS_MENU = "prayers_menu"
+
+
+class Responses(Enum):
+    """Static responses."""
+    MAIN_MENU = "main_menu"
+    READINGS_MENU = "readings_menu"
+    PRAYERS_MENU = "prayers_menu"
+    HELP = "help"
+    UNKNOWN_COMMAND = "unknown_command"
+
+
+class StaticResponse(NamedTuple):
+    """Response built once and reused for every request.
+
+    text: Message text
+    parse_mode: Telegram ParseMode of the text, None for plain text
+    reply_markup: Inline keyboard pre-encoded as JSON, None for no keyboard
+    """
+    text: str
+    parse_mode: Union[str, None] = None
+    reply_markup: Union[str, None] = None
+
+
+class Shard(NamedTuple):
+    """Worker process of the sharded mode.
+
+    index: Worker index, the worker handles the chats with shard_of(chat ID, count) == index
+    count: Number of workers
+    """
+    index: int
+    count: int
+
+
+class Repositories(NamedTuple):
+    """Storage backend of the bot data, see database.open_repositories.
+
+    users: User profiles
+    content: Readings and prayers
+    quotes: Motivational quotes
+    """
+    users: "UserRepository"
+    content: "ContentRepository"
+    quotes: "QuoteRepository"
 
 
 class DatabaseParams(NamedTuple):
-    """Database parameters (NAME, TOKEN).
+    """Database parameters (NAME, KEY).
 
     name: Database file name
-    token: Encryption token
+    key: SQLCipher raw key literal (x'...') of an encrypted database, None for a plaintext database
     """
     name: str
-    token: str
+    key: Union[str, None]
 
 
 class DBKeyValue(NamedTuple):
@@ -103,3 +182,115 @@ class BotUCM(NamedTuple):
     update: Update
     context: CallbackContext
     message: str
+
+
+class PoolStats(NamedTuple):
+    """Database connection pool statistics.
+
+    size: Maximum number of connections
+    open: Number of currently open connections
+    in_use: Number of connections currently borrowed
+    acquired: Total number of times a connection was borrowed
+    waited: Number of times a caller had to wait for a free connection
+    wait_time: Total time (seconds) spent waiting for a free connection
+    """
+    size: int
+    open: int
+    in_use: int
+    acquired: int
+    waited: int
+    wait_time: float
+
+
+class StatementCacheStats(NamedTuple):
+    """Prepared statement cache statistics.
+
+    hits: Number of statements served from the cache
+    misses: Number of statements that had to be prepared
+    cached: Number of statements currently cached over all connections
+    hit_rate: hits / (hits + misses)
+    """
+    hits: int
+    misses: int
+    cached: int
+    hit_rate: float
+
+
+class CacheStats(NamedTuple):
+    """In-memory cache statistics.
+
+    size: Number of cached entries
+    hits: Number of lookups served from the cache
+    misses: Number of lookups not found in the cache
+    """
+    size: int
+    hits: int
+    misses: int
+
+
+class BroadcastRecord(NamedTuple):
+    """Broadcast checkpoint as stored in the BROADCASTS table.
+
+    broadcast_id: Broadcast ID
+    message: Message sent to all users
+    last_user_id: Highest user ID the message was sent to (users are processed in ascending user ID order)
+    sent: Number of users the message was sent to
+    failed: Number of users the message couldn't be sent to
+    status: One of BroadcastStatus values
+    """
+    broadcast_id: int
+    message: str
+    last_user_id: int
+    sent: int
+    failed: int
+    status: str
+
+
+class BroadcastStatus(Enum):
+    """Broadcast status."""
+    RUNNING = "running"
+    FINISHED = "finished"
+
+
+class OutboundMessage(NamedTuple):
+    """Message queued for sending.
+
+    chat_id: Chat to send the message to
+    text: Message text
+    parse_mode: Telegram ParseMode of the text, None for plain text
+    reply_markup: Keyboard attached to the message, either a ReplyMarkup or its pre-encoded JSON
+    callback_query: Callback query answered before the message is sent
+    """
+    chat_id: int
+    text: str
+    parse_mode: Union[str, None] = None
+    reply_markup: Union[ReplyMarkup, str, None] = None
+    callback_query: Union[CallbackQuery, None] = None
+
+
+class Migration(NamedTuple):
+    """Database schema migration.
+
+    version: Schema version after the migration
+    description: What the migration changes
+    apply: Callable applying the migration on a connection, inside the migration's transaction
+    """
+    version: int
+    description: str
+    apply: Callable
+
+
+class CleanTimes(NamedTuple):
+    """Clean time of a batch of users, one list entry per user.
+
+    years, months, weeks, days, hours, minutes, seconds: Clean time breakdown as shown to the user
+    days_since: Total number of days since the clean date
+    """
+    years: list
+    months: list
+    weeks: list
+    days: list
+    hours: list
+    minutes: list
+    seconds: list
+    days_since: list
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import logging
+import queue
+import threading
+import time
+from typing import List
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+import instrumentation
+from config import Config
+from instrumentation import Histogram, LATENCY_BUCKETS_MS
+from models import OutboundMessage
+
+# Number of attempts for a message rate limited by Telegram (RetryAfter)
+MAX_SEND_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+
+class MessageQueue:
+    """Outbound message queue with its own sender threads.
+
+    Handlers enqueue fully built messages and return immediately while sender threads do the Bot API round trips.
+    Messages are sharded over the sender threads by chat ID, so messages to the same chat are sent in order. Each
+    shard is bounded: `enqueue` blocks when a shard is full. Until `start()` is called messages are sent inline.
+    """
+
+    def __init__(self, senders: int, max_size: int) -> None:
+        """
+        :param senders: Number of sender threads
+        :param max_size: Maximum number of queued messages per sender thread
+        """
+        self._senders = max(1, senders)
+        self._max_size = max_size
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        self.queue_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.send_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start sender threads."""
+        if self._threads:
+            return
+        self._queues = [queue.Queue(self._max_size) for _ in range(self._senders)]
+        for index, shard in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(shard,), name=f"Sender-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Send all queued messages and stop sender threads."""
+        for shard in self._queues:
+            shard.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._queues = []
+        self._threads = []
+
+    def enqueue(self, bot: Bot, message: OutboundMessage) -> None:
+        """Queue a message for sending. Its send time is recorded for the handler active on the current thread."""
+        handler, _ = instrumentation.current_handler()
+        queues = self._queues
+        if not queues:
+            self._send(bot, message, time.perf_counter(), handler)
+            return
+        queues[hash(message.chat_id) % len(queues)].put((bot, message, time.perf_counter(), handler))
+
+    def depth(self) -> int:
+        """Number of messages waiting to be sent."""
+        return sum(shard.qsize() for shard in self._queues)
+
+    def _run(self, shard: queue.Queue) -> None:
+        while True:
+            item = shard.get()
+            if item is None:
+                return
+            self._send(*item)
+
+    def _send(self, bot: Bot, message: OutboundMessage, enqueued_at: float, handler: str) -> None:
+        start = time.perf_counter()
+        self.queue_ms.observe((start - enqueued_at) * 1000)
+        sent = False
+        if message.callback_query is not None:
+            # The message is sent even if the query can't be answered (e.g. it is too old)
+            try:
+                message.callback_query.answer()
+            except Exception:
+                logger.exception("Answering callback query of %s failed", message.chat_id)
+        try:
+            for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+                try:
+                    bot.send_message(chat_id=message.chat_id, text=message.text, parse_mode=message.parse_mode,
+                                     reply_markup=message.reply_markup)
+                    sent = True
+                    break
+                except RetryAfter as e:
+                    if attempt == MAX_SEND_ATTEMPTS:
+                        # No sleep before giving up, it would hold up every chat of this sender
+                        logger.warning("Sending message to %s failed, still rate limited after %s attempts",
+                                       message.chat_id, MAX_SEND_ATTEMPTS)
+                        break
+                    with self._lock:
+                        self.retries += 1
+                    time.sleep(e.retry_after)
+        except Exception:
+            logger.exception("Sending message to %s failed", message.chat_id)
+        finally:
+            duration = time.perf_counter() - start
+            self.send_ms.observe(duration * 1000)
+            instrumentation.record_send(handler, duration)
+            with self._lock:
+                if sent:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+
+    def summary(self) -> str:
+        """Summarize queue depth and latencies."""
+        return f"outbound: depth {self.depth()}, sent {self.sent}, failed {self.failed}, retries {self.retries}, " \
+               f"queue ms mean {self.queue_ms.mean():.1f} p99 {self.queue_ms.quantile(0.99)}, " \
+               f"send ms mean {self.send_ms.mean():.1f} p99 {self.send_ms.quantile(0.99)}"
+
+
+# Outbound message queue of the bot
+OUTBOUND = MessageQueue(Config.OUTBOUND_SENDERS, Config.OUTBOUND_QUEUE_SIZE)
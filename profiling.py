@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Union
+
+import instrumentation
+from config import Config
+
+# Stack frames kept per traced allocation
+TRACE_FRAMES = 10
+# Functions per handler in the text summary and allocation sites in the allocation report
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 25
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerProfiler:
+    """Profiles a random sample of instrumented handler calls (clean_time, readings, notification_callback, ...).
+
+    While started, a share of handler calls runs under cProfile and the profiles are aggregated per handler.
+    Optionally tracemalloc traces allocations from the start on, so the dump shows where memory grew since. Only one
+    call is profiled at a time, calls arriving meanwhile run unprofiled. While stopped no hook is installed and
+    handler calls are not affected at all.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.rate = 0.0
+        self.started_at = None
+        self.sampled = Counter()
+        self.busy = 0
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._baseline: Union[tracemalloc.Snapshot, None] = None
+        self._tracing = False
+        self._profile_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.started_at is not None
+
+    def start(self, rate: float, trace_allocations: bool = False) -> None:
+        """Start (or change the sample rate of) profiling.
+
+        :param rate: Share (0.0 - 1.0) of handler calls profiled
+        :param trace_allocations: Also trace allocations with tracemalloc (slows down every allocation while on)
+        """
+        with self._lock:
+            self.rate = min(max(rate, 0.0), 1.0)
+            if self.started_at is None:
+                self.started_at = time.time()
+            if trace_allocations and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+                self._tracing = True
+                self._baseline = tracemalloc.take_snapshot()
+            instrumentation.set_call_hook(self._call)
+        logger.info("Profiling %.1f%% of handler calls%s", self.rate * 100,
+                    ", tracing allocations" if self._tracing else "")
+
+    def stop(self) -> List[str]:
+        """Stop profiling and write the results.
+
+        :return: Paths of the written files
+        """
+        with self._lock:
+            if self.started_at is None:
+                return []
+            instrumentation.set_call_hook(None)
+        # Let a call being profiled finish
+        with self._profile_lock:
+            pass
+        paths = self.dump()
+        with self._lock:
+            if self._tracing:
+                tracemalloc.stop()
+            self._tracing = False
+            self._baseline = None
+            self._stats = {}
+            self.sampled = Counter()
+            self.busy = 0
+            self.started_at = None
+        return paths
+
+    def _call(self, name: str, handler, args: tuple, kwargs: dict):
+        if random.random() >= self.rate:
+            return handler(*args, **kwargs)
+        if not self._profile_lock.acquire(blocking=False):
+            self.busy += 1
+            return handler(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active (Python 3.12+ allows only one)
+                return handler(*args, **kwargs)
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._add(name, profile)
+        finally:
+            self._profile_lock.release()
+
+    def _add(self, name: str, profile: cProfile.Profile) -> None:
+        with self._lock:
+            self.sampled[name] += 1
+            stats = self._stats.get(name)
+            if stats is None:
+                self._stats[name] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    def dump(self) -> List[str]:
+        """Write aggregated pstats per handler, a text summary and (if traced) the top allocation growth since start.
+
+        :return: Paths of the written files
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            sampled = dict(self.sampled)
+            baseline = self._baseline
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, time.strftime("%Y%m%d-%H%M%S"))
+        paths = []
+        summary = io.StringIO()
+        summary.write(self.status() + "\n")
+        for name, handler_stats in sorted(stats.items()):
+            path = f"{prefix}-{name}.pstats"
+            handler_stats.dump_stats(path)
+            paths.append(path)
+            summary.write(f"\n=== {name}: {sampled.get(name, 0)} calls ===\n")
+            handler_stats.stream = summary
+            handler_stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        if baseline is not None and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            path = f"{prefix}-allocations.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n"
+                        f"top {TOP_ALLOCATIONS} allocation sites by growth since profiling started:\n")
+                for stat in snapshot.compare_to(baseline, "lineno")[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+            paths.append(path)
+        path = f"{prefix}-summary.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(summary.getvalue())
+        paths.append(path)
+        logger.info("Wrote profiles: %s", ", ".join(paths))
+        return paths
+
+    def status(self) -> str:
+        """Describe the profiling state."""
+        if self.started_at is None:
+            return "profiling: off"
+        with self._lock:
+            sampled = sum(self.sampled.values())
+        since = time.strftime("%H:%M:%S", time.localtime(self.started_at))
+        return f"profiling: {self.rate * 100:.1f}% of calls since {since}, {sampled} profiled, " \
+               f"{self.busy} skipped while busy, allocation tracing {'on' if self._tracing else 'off'}"
+
+    def toggle(self) -> None:
+        """Start profiling at the configured sample rate with allocation tracing, or stop it and write the results."""
+        if self.active:
+            self.stop()
+        else:
+            self.start(Config.PROFILE_SAMPLE_RATE, trace_allocations=True)
+
+
+# Handler profiler of the bot
+PROFILER = HandlerProfiler(Config.PROFILE_DIR)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+import bisect
+import dbm
+import functools
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+import instrumentation
+from models import Columns, Tables, TABLE_COLUMNS
+
+# Position of each USERS column in a user row
+USER_COLUMN_INDEX = {column: index for index, column in enumerate(TABLE_COLUMNS[Tables.USERS])}
+
+
+def _recorded(method: Callable) -> Callable:
+    """Record the duration of a repository operation like a database query, so handler statistics stay comparable
+    between storage backends."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            instrumentation.record_query(time.perf_counter() - start)
+    return wrapper
+
+
+class UserRepository(ABC):
+    """User profiles, stored as user rows: USERS column values in the order of TABLE_COLUMNS."""
+
+    @abstractmethod
+    def get(self, user_id: int) -> Union[tuple, None]:
+        """Get the row of a user, None if the user doesn't exist."""
+
+    @abstractmethod
+    def get_many(self, user_ids: Sequence[int]) -> List[tuple]:
+        """Get the rows of the existing users among user_ids, in any order."""
+
+    @abstractmethod
+    def all(self) -> List[tuple]:
+        """Get the rows of all users."""
+
+    @abstractmethod
+    def add(self, row: tuple) -> None:
+        """Add a new user."""
+
+    @abstractmethod
+    def update(self, user_id: int, column: Columns, value: Union[str, int, None]) -> None:
+        """Update a column of a user, users that don't exist are left alone."""
+
+    def with_notification(self) -> List[tuple]:
+        """Get the rows of all users with daily notification enabled."""
+        index = USER_COLUMN_INDEX[Columns.NOTIFICATION_MINUTE]
+        return [row for row in self.all() if row[index] is not None]
+
+    def notification_settings(self) -> List[Tuple[int, Union[int, None], int]]:
+        """Get (user ID, UTC offset minutes, local notification minute) of all users with daily notification enabled.
+        """
+        offset = USER_COLUMN_INDEX[Columns.UTC_OFFSET_MINUTES]
+        minute = USER_COLUMN_INDEX[Columns.NOTIFICATION_MINUTE]
+        return [(row[0], row[offset], row[minute]) for row in self.with_notification()]
+
+    @abstractmethod
+    def ids_after(self, last_user_id: int, limit: int) -> List[int]:
+        """Get up to limit user IDs greater than last_user_id, in ascending order."""
+
+    @abstractmethod
+    def count_after(self, last_user_id: int) -> int:
+        """Get the number of users with a user ID greater than last_user_id."""
+
+    def close(self) -> None:
+        """Release the storage, the repository is not used afterwards."""
+
+
+class ContentRepository(ABC):
+    """Readings and prayers, stored as rows of their tables (column values in the order of TABLE_COLUMNS)."""
+
+    @abstractmethod
+    def readings(self, book: Tables) -> List[tuple]:
+        """Get all readings of a book (Tables.DAILY_REFLECTION or Tables.JUST_FOR_TODAY)."""
+
+    @abstractmethod
+    def reading(self, book: Tables, date: str) -> Union[tuple, None]:
+        """Get the reading of a book for a date (YYYY-MM-DD, year 2020), None if there is none."""
+
+    @abstractmethod
+    def prayers(self) -> List[tuple]:
+        """Get all prayers."""
+
+    @abstractmethod
+    def prayer(self, title: str) -> Union[tuple, None]:
+        """Get a prayer by title, None if there is none."""
+
+
+class QuoteRepository(ABC):
+    """Motivational quotes."""
+
+    @abstractmethod
+    def quotes(self) -> List[str]:
+        """Get all quotes."""
+
+    @abstractmethod
+    def version(self) -> tuple:
+        """Cheap signature which changes when quotes are added or removed."""
+
+
+class MemoryUserRepository(UserRepository):
+    """User rows in a dict, for tests and benchmarks. Nothing is persisted."""
+
+    def __init__(self, rows: Iterable[tuple] = ()) -> None:
+        """
+        :param rows: Initial user rows
+        """
+        self._rows: Dict[int, tuple] = {row[0]: tuple(row) for row in rows}
+        self._ids = sorted(self._rows)
+        self._lock = threading.Lock()
+
+    @_recorded
+    def get(self, user_id: int) -> Union[tuple, None]:
+        return self._rows.get(user_id)
+
+    @_recorded
+    def get_many(self, user_ids: Sequence[int]) -> List[tuple]:
+        rows = self._rows
+        return [rows[user_id] for user_id in set(user_ids) if user_id in rows]
+
+    @_recorded
+    def all(self) -> List[tuple]:
+        return list(self._rows.values())
+
+    @_recorded
+    def add(self, row: tuple) -> None:
+        with self._lock:
+            if row[0] not in self._rows:
+                bisect.insort(self._ids, row[0])
+            self._rows[row[0]] = tuple(row)
+
+    @_recorded
+    def update(self, user_id: int, column: Columns, value: Union[str, int, None]) -> None:
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is not None:
+                index = USER_COLUMN_INDEX[column]
+                self._rows[user_id] = row[:index] + (value,) + row[index + 1:]
+
+    @_recorded
+    def ids_after(self, last_user_id: int, limit: int) -> List[int]:
+        with self._lock:
+            start = bisect.bisect_right(self._ids, last_user_id)
+            return self._ids[start:start + limit]
+
+    @_recorded
+    def count_after(self, last_user_id: int) -> int:
+        with self._lock:
+            return len(self._ids) - bisect.bisect_right(self._ids, last_user_id)
+
+
+class KeyValueUserRepository(UserRepository):
+    """User rows in a local embedded key-value store (the best available `dbm`), one JSON encoded row per user ID.
+
+    A profile lookup is a single key read without SQL parsing or row mapping. User IDs are also kept sorted in memory
+    for the broadcast pagination. Scans over all users (notification schedule) read every value, they only run at
+    startup. An empty store is filled once from `seed` (e.g. the USERS table). Every write is synced, profile writes
+    are rare (registration and settings) compared to lookups. The store is opened by one process only, it can't be
+    shared by the workers of the sharded mode.
+    """
+
+    def __init__(self, path: str, seed: Union[Callable[[], Iterable[tuple]], None] = None) -> None:
+        """
+        :param path: Store file (dbm may add an extension)
+        :param seed: Callable returning the user rows of an empty store
+        """
+        self._lock = threading.Lock()
+        self._db = dbm.open(path, "c")
+        self._ids = sorted(int(key) for key in self._db.keys())
+        if not self._ids and seed is not None:
+            for row in seed():
+                self._db[self._key(row[0])] = self._encode(row)
+            self._ids = sorted(int(key) for key in self._db.keys())
+            self._sync()
+
+    @staticmethod
+    def _key(user_id: int) -> bytes:
+        return str(user_id).encode()
+
+    @staticmethod
+    def _encode(row: tuple) -> bytes:
+        return json.dumps(row, separators=(",", ":")).encode()
+
+    @staticmethod
+    def _decode(value: bytes) -> tuple:
+        return tuple(json.loads(value))
+
+    def _sync(self) -> None:
+        """Write the store through to disk. dbm.dumb only writes its index on sync or close, an index left behind by
+        an unclean exit points at stale or partly overwritten values."""
+        if hasattr(self._db, "sync"):
+            self._db.sync()
+
+    @_recorded
+    def get(self, user_id: int) -> Union[tuple, None]:
+        with self._lock:
+            value = self._db.get(self._key(user_id))
+        return self._decode(value) if value is not None else None
+
+    @_recorded
+    def get_many(self, user_ids: Sequence[int]) -> List[tuple]:
+        with self._lock:
+            values = [self._db.get(self._key(user_id)) for user_id in set(user_ids)]
+        return [self._decode(value) for value in values if value is not None]
+
+    @_recorded
+    def all(self) -> List[tuple]:
+        with self._lock:
+            values = [self._db[key] for key in self._db.keys()]
+        return [self._decode(value) for value in values]
+
+    @_recorded
+    def add(self, row: tuple) -> None:
+        key = self._key(row[0])
+        with self._lock:
+            if key not in self._db:
+                bisect.insort(self._ids, row[0])
+            self._db[key] = self._encode(row)
+            self._sync()
+
+    @_recorded
+    def update(self, user_id: int, column: Columns, value: Union[str, int, None]) -> None:
+        key = self._key(user_id)
+        index = USER_COLUMN_INDEX[column]
+        with self._lock:
+            stored = self._db.get(key)
+            if stored is not None:
+                row = self._decode(stored)
+                self._db[key] = self._encode(row[:index] + (value,) + row[index + 1:])
+                self._sync()
+
+    @_recorded
+    def ids_after(self, last_user_id: int, limit: int) -> List[int]:
+        with self._lock:
+            start = bisect.bisect_right(self._ids, last_user_id)
+            return self._ids[start:start + limit]
+
+    @_recorded
+    def count_after(self, last_user_id: int) -> int:
+        with self._lock:
+            return len(self._ids) - bisect.bisect_right(self._ids, last_user_id)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class MemoryContentRepository(ContentRepository):
+    """Readings and prayers in dicts, for tests and benchmarks."""
+
+    def __init__(self, readings: Dict[Tables, List[tuple]], prayers: List[tuple]) -> None:
+        """
+        :param readings: Reading rows per book
+        :param prayers: Prayer rows
+        """
+        self._readings = {book: list(rows) for book, rows in readings.items()}
+        self._by_date = {book: {row[0]: tuple(row) for row in rows} for book, rows in readings.items()}
+        self._prayers = list(prayers)
+        self._by_title = {row[0]: tuple(row) for row in prayers}
+
+    @classmethod
+    def copy_of(cls, content: ContentRepository) -> "MemoryContentRepository":
+        """In-memory copy of another content repository."""
+        return cls({book: content.readings(book) for book in (Tables.DAILY_REFLECTION, Tables.JUST_FOR_TODAY)},
+                   content.prayers())
+
+    @_recorded
+    def readings(self, book: Tables) -> List[tuple]:
+        return list(self._readings.get(book, ()))
+
+    @_recorded
+    def reading(self, book: Tables, date: str) -> Union[tuple, None]:
+        return self._by_date.get(book, {}).get(date)
+
+    @_recorded
+    def prayers(self) -> List[tuple]:
+        return list(self._prayers)
+
+    @_recorded
+    def prayer(self, title: str) -> Union[tuple, None]:
+        return self._by_title.get(title)
+
+
+class MemoryQuoteRepository(QuoteRepository):
+    """Quotes in a list, for tests and benchmarks."""
+
+    def __init__(self, quotes: Iterable[str]) -> None:
+        self._quotes = list(quotes)
+
+    @_recorded
+    def quotes(self) -> List[str]:
+        return list(self._quotes)
+
+    @_recorded
+    def version(self) -> tuple:
+        return len(self._quotes), len(self._quotes)
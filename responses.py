@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ParseMode
+
+from models import Keyboards, MenuElements, Responses, StaticResponse
+from strings import Strings
+
+# Number of builds timed when a keyboard is registered
+TIMED_BUILDS = 20
+
+
+def _button(text: str, element: MenuElements) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text, callback_data=str(element.value.data))
+
+
+def build_main_menu_keyboard() -> InlineKeyboardMarkup:
+    """Main menu keyboard"""
+    keyboard = [
+        [_button(Strings.PROFILE_BUTTON, MenuElements.PROFILE),
+         _button(Strings.CLEAN_TIME_BUTTON, MenuElements.CLEAN_TIME)],
+        [_button(Strings.READINGS_BUTTON, MenuElements.READINGS),
+         _button(Strings.PRAYERS_BUTTON, MenuElements.PRAYERS)],
+    ]
+    return InlineKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
+def build_readings_menu_keyboard() -> InlineKeyboardMarkup:
+    """Readings menu keyboard"""
+    keyboard = [
+        [_button(Strings.DAILY_REFLECTION_BUTTON, MenuElements.DAILY_REFLECTION),
+         _button(Strings.JUST_FOR_TODAY_BUTTON, MenuElements.JUST_FOR_TODAY)],
+        [_button(Strings.MAIN_MENU_BUTTON, MenuElements.MAIN_MENU)],
+    ]
+    return InlineKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
+def build_prayers_menu_keyboard() -> InlineKeyboardMarkup:
+    """Prayers menu keyboard"""
+    keyboard = [
+        [_button(Strings.LORDS_PRAYER_BUTTON, MenuElements.LORDS_PRAYER),
+         _button(Strings.SERENITY_PRAYER_BUTTON, MenuElements.SERENITY_PRAYER)],
+        [_button(Strings.ST_JOSEPHS_PRAYER_BUTTON, MenuElements.ST_JOSEPHS_PRAYER),
+         _button(Strings.TENDER_AND_COMPASSIONATE_GOD_BUTTON, MenuElements.TENDER_AND_COMPASSIONATE_GOD)],
+        [_button(Strings.THIRD_STEP_PRAYER_BUTTON, MenuElements.THIRD_STEP_PRAYER),
+         _button(Strings.SEVENTH_STEP_PRAYER_BUTTON, MenuElements.SEVENTH_STEP_PRAYER)],
+        [_button(Strings.ELEVENTH_STEP_PRAYER_BUTTON, MenuElements.ELEVENTH_STEP_PRAYER),
+         _button(Strings.MAIN_MENU_BUTTON, MenuElements.MAIN_MENU)],
+    ]
+    return InlineKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
+def _measure_build(build: Callable[[], str]) -> Tuple[int, float]:
+    """Peak bytes allocated by and seconds taken by a single build.
+
+    Allocation is only measured if tracemalloc isn't already in use (e.g. by a profiling session), 0 otherwise.
+    """
+    allocated = 0
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        try:
+            build()
+            allocated = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(TIMED_BUILDS):
+        build()
+    return allocated, (time.perf_counter() - start) / TIMED_BUILDS
+
+
+class ResponseRegistry:
+    """Menus and fixed messages, built once and reused for every request.
+
+    Keyboards are stored pre-encoded as the reply_markup JSON PTB would otherwise build and serialize from new
+    InlineKeyboardMarkup objects on every send (PTB passes a str reply_markup through to the request unchanged). The
+    cost of a per-request build is measured once, on the first `summary()`, and multiplied by the number of uses.
+    """
+
+    def __init__(self) -> None:
+        self._keyboards: Dict[Keyboards, str] = {}
+        self._responses: Dict[Responses, Tuple[StaticResponse, Keyboards]] = {}
+        self._builders: Dict[Keyboards, Callable[[], InlineKeyboardMarkup]] = {}
+        self._build_costs: Dict[Keyboards, Tuple[int, float]] = {}
+        self._uses = Counter()
+        self._lock = threading.Lock()
+
+    def register_keyboard(self, name: Keyboards, build: Callable[[], InlineKeyboardMarkup]) -> None:
+        """Build and encode a keyboard."""
+        self._keyboards[name] = build().to_json()
+        self._builders[name] = build
+
+    def register(self, name: Responses, text: str, parse_mode: str = None, keyboard: Keyboards = None) -> None:
+        """Register a fixed message, optionally with a registered keyboard attached."""
+        reply_markup = self._keyboards[keyboard] if keyboard else None
+        self._responses[name] = (StaticResponse(text, parse_mode, reply_markup), keyboard)
+
+    def keyboard(self, name: Keyboards) -> str:
+        """Get pre-encoded keyboard."""
+        with self._lock:
+            self._uses[name] += 1
+        return self._keyboards[name]
+
+    def get(self, name: Responses) -> StaticResponse:
+        """Get static response."""
+        response, keyboard = self._responses[name]
+        with self._lock:
+            self._uses[name] += 1
+            if keyboard:
+                self._uses[keyboard] += 1
+        return response
+
+    def summary(self) -> str:
+        """Summarize uses of static responses and the allocation and time saved by not building keyboards."""
+        with self._lock:
+            uses = dict(self._uses)
+        for name, build in self._builders.items():
+            if name not in self._build_costs:
+                self._build_costs[name] = _measure_build(lambda: build().to_json())
+        lines = []
+        saved_bytes = saved_seconds = 0
+        for name, (allocated, seconds) in self._build_costs.items():
+            count = uses.get(name, 0)
+            saved_bytes += count * allocated
+            saved_seconds += count * seconds
+            lines.append(f"keyboard {name.value:<15} uses {count:>8}  build {allocated:>6} B {seconds * 1e6:>7.1f} us")
+        for name in self._responses:
+            lines.append(f"response {name.value:<15} uses {uses.get(name, 0):>8}")
+        lines.append(f"saved: {saved_bytes / 1024:.1f} KiB allocated, {saved_seconds * 1000:.1f} ms")
+        return "\n".join(lines)
+
+
+def build_static_responses(registry: ResponseRegistry) -> None:
+    """Build all menus and fixed messages."""
+    registry.register_keyboard(Keyboards.MAIN_MENU, build_main_menu_keyboard)
+    registry.register_keyboard(Keyboards.READINGS_MENU, build_readings_menu_keyboard)
+    registry.register_keyboard(Keyboards.PRAYERS_MENU, build_prayers_menu_keyboard)
+    registry.register(Responses.MAIN_MENU, Strings.MAIN_MENU, keyboard=Keyboards.MAIN_MENU)
+    registry.register(Responses.READINGS_MENU, Strings.READINGS_MENU, keyboard=Keyboards.READINGS_MENU)
+    registry.register(Responses.PRAYERS_MENU, Strings.PRAYERS_MENU, keyboard=Keyboards.PRAYERS_MENU)
+    registry.register(Responses.HELP, Strings.HELP, parse_mode=ParseMode.HTML)
+    registry.register(Responses.UNKNOWN_COMMAND, Strings.UNKNOWN_COMMAND)
+
+
+# Static responses of the bot, built once at startup
+RESPONSES = ResponseRegistry()
+build_static_responses(RESPONSES)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import threading
+from collections import Counter
+from typing import Callable, Dict, Union
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from models import MenuElements
+
+
+class MenuRouter:
+    """Routes callback queries and menu element commands through one precomputed table.
+
+    Every menu element is looked up by its callback data character or its command name (the lowercase element key,
+    e.g. daily_reflection) in a dict, instead of testing one regex CallbackQueryHandler after the other and scanning
+    MenuElements for the element. Callbacks are registered per element, so a new menu only needs its elements
+    registered. Routed callback queries are counted per element.
+    """
+
+    def __init__(self) -> None:
+        self._by_data: Dict[str, MenuElements] = {element.value.data: element for element in MenuElements}
+        self._by_command: Dict[str, MenuElements] = {element.name.lower(): element for element in MenuElements}
+        self._callbacks: Dict[str, Callable[[Update, CallbackContext], None]] = {}
+        self._routed = Counter()
+        self._unrouted = 0
+        self._lock = threading.Lock()
+
+    def register(self, callback: Callable[[Update, CallbackContext], None], *elements: MenuElements) -> None:
+        """Register the callback query handler of menu elements (replaces a previously registered one)."""
+        for element in elements:
+            self._callbacks[element.value.data] = callback
+
+    def from_data(self, data: str) -> Union[MenuElements, None]:
+        """Get menu element from callback data, None for unknown data."""
+        return self._by_data.get(data)
+
+    def from_command(self, text: str) -> Union[MenuElements, None]:
+        """Get menu element from command message text, e.g. "/daily_reflection@SoberSerenityBot", None if unknown."""
+        command = text.split(maxsplit=1)[0][1:].split("@", 1)[0] if text else ""
+        return self._by_command.get(command.lower())
+
+    def element(self, update: Update) -> Union[MenuElements, None]:
+        """Get menu element of a command or callback query update."""
+        if update.callback_query is not None:
+            return self.from_data(update.callback_query.data)
+        return self.from_command(update.message.text)
+
+    def dispatch(self, update: Update, context: CallbackContext) -> None:
+        """CallbackQueryHandler callback: run the handler registered for the callback data.
+
+        Callback queries with unknown data are counted and otherwise ignored, like unmatched queries used to be.
+        """
+        data = update.callback_query.data
+        callback = self._callbacks.get(data)
+        with self._lock:
+            if callback is None:
+                self._unrouted += 1
+            else:
+                self._routed[data] += 1
+        if callback is not None:
+            callback(update, context)
+
+    def summary(self) -> str:
+        """Summarize routed callback queries per menu element."""
+        with self._lock:
+            routed = dict(self._routed)
+            unrouted = self._unrouted
+        lines = [f"callback {self._by_data[data].name.lower():<28} {count:>8}"
+                 for data, count in sorted(routed.items(), key=lambda item: -item[1])]
+        lines.append(f"callback {'(unrouted)':<28} {unrouted:>8}")
+        return "\n".join(lines)
+
+
+# Menu router of the bot
+ROUTER = MenuRouter()
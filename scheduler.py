@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import datetime
+import logging
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, Tuple, Union
+
+from telegram.ext import CallbackContext, JobQueue
+
+MINUTES_PER_DAY = 24 * 60
+# Number of missed minutes (e.g. after a long GC pause or a busy JobQueue) fired late instead of skipped
+MAX_CATCH_UP_MINUTES = 5
+
+logger = logging.getLogger(__name__)
+
+
+def utc_minute_of_day(dt: datetime.datetime) -> int:
+    """Minute of day (0 - 1439) of a UTC datetime."""
+    return dt.hour * 60 + dt.minute
+
+
+def local_minute_to_utc_minute(minute: int, offset: int) -> int:
+    """Convert local minute of day to UTC minute of day.
+
+    :param minute: Local minute of day
+    :param offset: UTC offset in minutes
+    """
+    return (minute - offset) % MINUTES_PER_DAY
+
+
+def utc_minute_to_local_minute(minute: int, offset: int) -> int:
+    """Convert UTC minute of day to local minute of day.
+
+    :param minute: UTC minute of day
+    :param offset: UTC offset in minutes
+    """
+    return (minute + offset) % MINUTES_PER_DAY
+
+
+class NotificationScheduler:
+    """Daily notifications indexed by UTC minute of day.
+
+    Instead of one JobQueue job per user, users are kept in 1440 compact buckets (one `array` of user IDs per minute
+    of day) and a single job runs every minute, handing that minute's whole bucket to the notify callback. Enabling
+    and disabling a notification only updates the index.
+    """
+
+    def __init__(self) -> None:
+        self._buckets = [array('q') for _ in range(MINUTES_PER_DAY)]
+        self._minutes = {}
+        self._lock = threading.Lock()
+        self._notify = None
+        self._last_minute = None
+        # Users whose notification changed while the index is being restored
+        self._changed = None
+        # Updated by the job only
+        self.ticks = 0
+        self.notified = 0
+        self.failures = 0
+
+    @staticmethod
+    def _build_index(schedule: Iterable[Tuple[int, int]]) -> Tuple[List[array], Dict[int, int]]:
+        buckets = [array('q') for _ in range(MINUTES_PER_DAY)]
+        minutes = {}
+        for user_id, minute in schedule:
+            buckets[minute].append(user_id)
+            minutes[user_id] = minute
+        return buckets, minutes
+
+    def rebuild(self, schedule: Iterable[Tuple[int, int]]) -> None:
+        """Replace the index.
+
+        :param schedule: (user ID, UTC minute of day) pairs
+        """
+        buckets, minutes = self._build_index(schedule)
+        with self._lock:
+            self._buckets = buckets
+            self._minutes = minutes
+
+    def restore(self, load_schedule: Callable[[], Iterable[Tuple[int, int]]]) -> None:
+        """Replace the index with a schedule loaded while notifications may already be enabled and disabled.
+
+        Notifications changed during the load keep their current state instead of the loaded one.
+
+        :param load_schedule: Callable returning (user ID, UTC minute of day) pairs
+        """
+        with self._lock:
+            self._changed = set()
+        try:
+            buckets, minutes = self._build_index(load_schedule())
+        except Exception:
+            with self._lock:
+                self._changed = None
+            raise
+        with self._lock:
+            for user_id in self._changed:
+                loaded = minutes.pop(user_id, None)
+                if loaded is not None:
+                    bucket = buckets[loaded]
+                    del bucket[bucket.index(user_id)]
+                current = self._minutes.get(user_id)
+                if current is not None:
+                    buckets[current].append(user_id)
+                    minutes[user_id] = current
+            self._buckets = buckets
+            self._minutes = minutes
+            self._changed = None
+
+    def enable(self, user_id: int, minute: int) -> None:
+        """Enable (or move) daily notification for a user at a UTC minute of day."""
+        with self._lock:
+            self._remove(user_id)
+            self._buckets[minute].append(user_id)
+            self._minutes[user_id] = minute
+
+    def disable(self, user_id: int) -> Union[int, None]:
+        """Disable daily notification for a user.
+
+        :return: UTC minute of day the notification was set for, None if it was not enabled
+        """
+        with self._lock:
+            return self._remove(user_id)
+
+    def _remove(self, user_id: int) -> Union[int, None]:
+        if self._changed is not None:
+            self._changed.add(user_id)
+        minute = self._minutes.pop(user_id, None)
+        if minute is not None:
+            bucket = self._buckets[minute]
+            del bucket[bucket.index(user_id)]
+        return minute
+
+    def get(self, user_id: int) -> Union[int, None]:
+        """Get UTC minute of day of a user's daily notification, None if it is not enabled."""
+        return self._minutes.get(user_id)
+
+    def users_at(self, minute: int) -> Tuple[int, ...]:
+        """Get IDs of users to notify at a UTC minute of day."""
+        with self._lock:
+            return tuple(self._buckets[minute])
+
+    def __len__(self) -> int:
+        return len(self._minutes)
+
+    def start(self, job_queue: JobQueue, notify: Callable[[CallbackContext, Tuple[int, ...]], None]) -> None:
+        """Schedule the per minute job, once (e.g. a retried warm-up may call this again).
+
+        :param job_queue: Job queue to run the job on
+        :param notify: Callback sending the notification to all users of a minute's bucket at once
+        """
+        self._notify = notify
+        if job_queue.get_jobs_by_name(self.__class__.__name__):
+            return
+        now = datetime.datetime.utcnow()
+        first = 60 - now.second - now.microsecond / 1e6
+        job_queue.run_repeating(self._tick, interval=60, first=first, name=self.__class__.__name__)
+
+    def _tick(self, context: CallbackContext) -> None:
+        current = utc_minute_of_day(datetime.datetime.utcnow())
+        if current == self._last_minute:
+            return
+        if self._last_minute is None:
+            missed = 0
+        else:
+            missed = min((current - self._last_minute - 1) % MINUTES_PER_DAY, MAX_CATCH_UP_MINUTES)
+        self._last_minute = current
+        self.ticks += 1
+        for minute in range(current - missed, current + 1):
+            user_ids = self.users_at(minute % MINUTES_PER_DAY)
+            if not user_ids:
+                continue
+            try:
+                self._notify(context, user_ids)
+                self.notified += len(user_ids)
+            except Exception:
+                self.failures += 1
+                logger.exception("Daily notifications at minute %s failed", minute % MINUTES_PER_DAY)
+
+
+# Daily notifications of all users
+NOTIFICATIONS = NotificationScheduler()
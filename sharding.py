@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Sequence, Union
+
+# Fibonacci hashing multiplier, spreads consecutive and same-remainder chat IDs over the workers
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+
+# Seconds a worker gets to finish its queued updates at shutdown before it is terminated
+STOP_TIMEOUT = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(chat_id: int, shards: int) -> int:
+    """Worker index (0 - shards-1) owning a chat. Users are keyed by their (private) chat ID, so a user's profile,
+    cache entry and daily notification all belong to one worker.
+
+    Not chat_id % shards: the outbound queue picks a sender thread by chat ID modulo the number of senders, so each
+    worker would only use a fraction of its senders.
+    """
+    return (((chat_id * _HASH_MULTIPLIER) & _HASH_MASK) >> 32) % shards
+
+
+def shard_path(path: str, index: int) -> str:
+    """Per worker file name, e.g. Logs/SoberSerenityBotLog.log -> Logs/SoberSerenityBotLog.shard1.log"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+def update_chat_id(update_json: dict) -> int:
+    """Chat ID of an update (the sender for updates without a chat, e.g. inline queries), 0 if it has neither."""
+    for key, value in update_json.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        sender = value.get("from")
+        if sender:
+            return sender["id"]
+    return 0
+
+
+class ShardRouter:
+    """Webhook ingress of the sharded mode.
+
+    Receives the updates Telegram POSTs to the webhook and hands each one, still encoded, to the worker process owning
+    its chat (`shard_of`). Every worker runs its own dispatcher, user cache, outbound queue and slice of the daily
+    notifications, so handlers of different chats run on separate interpreters and GILs. Updates of a chat always
+    reach the same worker, in order. A full worker queue is answered with 503, Telegram then delivers the update again
+    later.
+    """
+
+    def __init__(self, shards: int, target: Callable[[int, int, multiprocessing.Queue], None], listen: str, port: int,
+                 path: str, queue_size: int) -> None:
+        """
+        :param shards: Number of worker processes
+        :param target: Worker process function, called with (index, shards, update queue). Encoded updates are read
+            from the queue until None.
+        :param listen: Webhook listener address
+        :param port: Webhook listener port, 0 picks a free port
+        :param path: Webhook URL path
+        :param queue_size: Maximum number of updates queued per worker
+        """
+        # Workers start from a fresh interpreter instead of inheriting open database connections and threads
+        context = multiprocessing.get_context("spawn")
+        self.shards = shards
+        self.routed = Counter()
+        self.rejected = 0
+        self._queues = [context.Queue(queue_size) for _ in range(shards)]
+        self._processes = [context.Process(target=target, args=(index, shards, self._queues[index]),
+                                           name=f"shard-{index}")
+                           for index in range(shards)]
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((listen, port), self._handler_class("/" + path.lstrip("/")))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def pids(self) -> List[Union[int, None]]:
+        return [process.pid for process in self._processes]
+
+    def start(self) -> None:
+        """Start the worker processes and the webhook listener."""
+        for process in self._processes:
+            process.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="shard-router", daemon=True)
+        self._thread.start()
+        logger.info("Routing updates on port %s to %s workers (pids %s)", self.port, self.shards, self.pids)
+
+    def stop(self) -> None:
+        """Stop accepting updates, let the workers finish the queued ones and wait for them to exit."""
+        self._server.shutdown()
+        self._server.server_close()
+        for update_queue in self._queues:
+            update_queue.put(None)
+        for process in self._processes:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Worker %s did not stop, terminating it", process.name)
+                process.terminate()
+                process.join()
+        logger.info("Routed updates per worker: %s, rejected %s", dict(sorted(self.routed.items())), self.rejected)
+
+    def route(self, body: bytes) -> bool:
+        """Queue an encoded update for the worker owning its chat.
+
+        :return: False if the worker queue is full
+        :raise ValueError: If body is not a JSON object
+        """
+        update_json = json.loads(body)
+        if not isinstance(update_json, dict):
+            raise ValueError("Update is not a JSON object")
+        shard = shard_of(update_chat_id(update_json), self.shards)
+        try:
+            self._queues[shard].put_nowait(body)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.routed[shard] += 1
+        return True
+
+    def _handler_class(self, path: str) -> type:
+        router = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path != path:
+                    status = 404
+                else:
+                    try:
+                        status = 200 if router.route(body) else 503
+                    except (ValueError, KeyError, TypeError):
+                        status = 400
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format: str, *args: Sequence) -> None:
+                pass
+
+        return Handler
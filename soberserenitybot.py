@@ -1,48 +1,184 @@
 #!/usr/bin/env python3
+import html
+import json
 import logging
+import multiprocessing
 import os
+import signal
+import threading
+import time
 from collections import namedtuple
 from enum import Enum
+from typing import Union
 
-from dotenv import load_dotenv
-from telegram import Update, ParseMode, ReplyMarkup
+from telegram import Bot, Update, ParseMode, ReplyMarkup
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext, MessageHandler, Filters, \
-    JobQueue
+    JobQueue, TypeHandler
 
 import bot_helper
+import broadcast
+import clean_time_batch
+import concurrency
 import database
+import instrumentation
+import log_pipeline
+import metrics
+import outbound
+import scheduler
+import sharding
 import utils
-from models import BotUCM, MenuElements
+from config import Config
+from models import BotUCM, MenuElements, OutboundMessage, Responses, Shard, StaticResponse
+from profiling import PROFILER
+from responses import RESPONSES
+from routing import ROUTER
 from strings import Strings
+from update_log import UpdateLogWriter
+
+# Attempts of the background warm-up (fast start) and seconds before the first retry, doubled for every further one
+WARM_UP_ATTEMPTS = 4
+WARM_UP_RETRY_DELAY = 5.0
 
 
 class SoberSerenity:
-    def __init__(self, token) -> None:
-        self.updater = Updater(token=token)
+    def __init__(self, token, shard: Union[Shard, None] = None,
+                 updates: Union[multiprocessing.Queue, None] = None) -> None:
+        """
+        :param token: Bot token
+        :param shard: Worker of the sharded mode, None for a single process receiving all updates
+        :param updates: Encoded updates sent by the shard router (sharded mode only)
+        """
+        self.shard = shard
+        self.updates = updates
+        self.updater = Updater(token=token, workers=Config.WORKERS, base_url=Config.BOT_API_URL)
         self.dispatcher = self.updater.dispatcher
         self.job_queue = JobQueue()
         self.job_queue.set_dispatcher(self.dispatcher)
+        self.update_log = None
+        self.warm_up_failed = False
 
     def run(self) -> None:
+        """Set up handlers, start receiving updates and block until the bot is stopped."""
+        # Without a public URL PTB registers https://<listen>:<port>/<path> with Telegram, which can't reach it. A local
+        # Bot API endpoint (SOBER_SERENITY_BOT_API_URL) can reach the local listener, e.g. for testing.
+        if self.shard is None and Config.UPDATE_MODE == "webhook" and not Config.WEBHOOK_URL and not Config.BOT_API_URL:
+            raise ValueError("Webhook mode needs SOBER_SERENITY_WEBHOOK_URL, the public URL Telegram posts updates to")
+        # Repositories are opened on first use, which may be a handler or the background warm-up
+        database.check_storage(Config.STORAGE)
+        self.add_handlers()
+
+        # Bring the database schema up to date (in the sharded mode the router does so before starting workers)
+        if self.shard is None:
+            database.migrate()
+
+        # Local metrics endpoint, rendered only when scraped. Shard workers serve theirs on consecutive ports.
+        metrics_server = None
+        if Config.METRICS_PORT:
+            port = Config.METRICS_PORT + (self.shard.index if self.shard else 0)
+            metrics_server = metrics.MetricsServer(Config.METRICS_LISTEN, port, self.updater.job_queue)
+            metrics_server.start()
+
+        # Start the Bot
+        outbound.OUTBOUND.start()
+        if Config.FAST_START:
+            # Answer updates right away and warm up in the background, content is loaded on demand until then
+            self.start_updates()
+            threading.Thread(target=self.warm_up_or_stop, name="warm-up", daemon=True).start()
+        else:
+            self.warm_up()
+            self.start_updates()
+
+        # SIGUSR1 starts sampled handler profiling, the next one stops it and writes the results
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: PROFILER.toggle())
+
+        self.idle()
+        outbound.OUTBOUND.stop()
+        PROFILER.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if self.update_log:
+            self.update_log.close()
+        logging.getLogger(__name__).info("Handler statistics:\n%s", instrumentation.summary())
+        database.close_repositories()
+        database.POOL.close_all()
+        if self.warm_up_failed:
+            raise RuntimeError("Stopped the bot, warm-up failed")
+
+    def warm_up_or_stop(self) -> None:
+        """Warm up in the background (fast start), retrying with backoff.
+
+        If every attempt fails the bot is stopped (like by SIGTERM, run() then raises) instead of answering updates
+        without daily notifications and resumed broadcasts.
+        """
+        for attempt in range(1, WARM_UP_ATTEMPTS + 1):
+            try:
+                self.warm_up()
+                return
+            except Exception:
+                if attempt < WARM_UP_ATTEMPTS:
+                    delay = WARM_UP_RETRY_DELAY * 2 ** (attempt - 1)
+                    logging.getLogger(__name__).warning("Retrying warm-up in %g s", delay)
+                    time.sleep(delay)
+        logging.getLogger(__name__).critical("Warm-up failed %s times, stopping the bot", WARM_UP_ATTEMPTS)
+        self.warm_up_failed = True
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def warm_up(self) -> None:
+        """Load caches, restore daily notifications and resume interrupted broadcasts. Safe to repeat after a failure.
+        """
+        start = time.perf_counter()
+        try:
+            # Load and render readings and prayers once so the handlers don't hit the database for them
+            database.CONTENT_CACHE.load()
+
+            # Daily notifications: restore from the USERS table and fire every minute
+            scheduler.NOTIFICATIONS.restore(self.notification_schedule)
+            scheduler.NOTIFICATIONS.start(self.updater.job_queue, notification_callback)
+
+            # Import NumPy (if installed) before the first batch of notifications needs it
+            clean_time_batch.load_numpy()
+
+            # Finish broadcasts interrupted by the last shutdown (in the sharded mode on the first worker only)
+            if self.shard is None or self.shard.index == 0:
+                broadcast.resume_broadcasts(self.updater.bot)
+        except Exception:
+            logging.getLogger(__name__).exception("Warm-up failed")
+            raise
+        logging.getLogger(__name__).info("Warm-up finished in %.0f ms", (time.perf_counter() - start) * 1000)
+
+    def notification_schedule(self) -> list:
+        """Daily notification schedule (see database.get_notification_schedule) of the users of this process."""
+        schedule = database.get_notification_schedule()
+        if self.shard is None:
+            return schedule
+        return [(user_id, minute) for user_id, minute in schedule
+                if sharding.shard_of(user_id, self.shard.count) == self.shard.index]
+
+    def add_handlers(self) -> None:
+        """Register update, error and (optional) update log handlers with the dispatcher."""
         def get_command_handlers() -> Enum:
             """Command Handlers.
 
             :return: Command handlers as an enum in the format KEY_WORD -> CommandHandler(command, callback)
             """
             Command_Handler = namedtuple("Command_Handler", "command callback")
-            keys_main = ["START", "MENU", "PROFILE", "SET_CLEAN_DATE", "CLEAN_TIME", "HELP"]
+            keys_main = ["START", "MENU", "PROFILE", "SET_CLEAN_DATE", "CLEAN_TIME", "HELP", "STATS", "BROADCAST",
+                         "PROFILING"]
             keys_reading = ["DAILY_REFLECTION", "JUST_FOR_TODAY"]
             keys_prayer = ["LORDS_PRAYER", "SERENITY_PRAYER", "ST_JOSEPHS_PRAYER", "TENDER_AND_COMPASSIONATE_GOD",
                            "THIRD_STEP_PRAYER", "SEVENTH_STEP_PRAYER", "ELEVENTH_STEP_PRAYER"]
             keys_notification = ["ENABLE_DAILY_NOTIFICATION", "DISABLE_DAILY_NOTIFICATION", "SET_UTC_OFFSET"]
             command_keys = keys_main + keys_reading + keys_prayer + keys_notification
-            names_main = ["start", "menu", "profile", "set_clean_date", "clean_time", "help"]
+            names_main = ["start", "menu", "profile", "set_clean_date", "clean_time", "help", "stats", "broadcast",
+                          "profiling"]
             names_reading = ["daily_reflection", "just_for_today"]
             names_prayer = ["lords_prayer", "serenity_prayer", "st_josephs_prayer", "tender_and_compassionate_god",
                             "third_step_prayer", "seventh_step_prayer", "eleventh_step_prayer"]
             names_notification = ["enable_daily_notification", "disable_daily_notification", "set_utc_offset"]
             command_names = names_main + names_reading + names_prayer + names_notification
-            callbacks_main = [start, start, profile, set_clean_date, clean_time, help_command]
+            callbacks_main = [start, start, profile, set_clean_date, clean_time, help_command, stats_command,
+                              broadcast_command, profiling_command]
             callbacks_reading = [readings] * len(names_reading)
             callbacks_prayer = [prayers] * len(names_prayer)
             callbacks_notification = [enable_daily_notification, disable_daily_notification,
@@ -51,59 +187,85 @@ class SoberSerenity:
             return Enum("Commands", {k: Command_Handler(command=v1, callback=v2)
                                      for k, v1, v2 in zip(command_keys, command_names, command_callbacks)})
 
-        def get_callback_query_handler() -> Enum:
-            """Callback Query Handlers.
-
-            :return: Callback query handlers as an enum in the format
-                     KEY_WORD -> CallbackQueryHandler(callback, pattern)
-            """
-            Callback_Query_Handler = namedtuple("CallbackQueryHandler", "callback pattern")
-            callback_keys = ["MAIN_MENU", "PROFILE", "CLEAN_TIME", "READINGS_MENU", "PRAYERS_MENU", "READINGS",
-                             "PRAYERS"]
-            callback_name = [main_menu, profile, clean_time, readings_menu, prayers_menu,
-                             readings, prayers]
-            # Reading patterns
-            readings_pattern = f"({MenuElements.DAILY_REFLECTION.value.data}" \
-                               f"|{MenuElements.JUST_FOR_TODAY.value.data})"
-            # Prayer patterns
-            prayers_pattern = f"({MenuElements.LORDS_PRAYER.value.data}" \
-                              f"|{MenuElements.SERENITY_PRAYER.value.data}" \
-                              f"|{MenuElements.ST_JOSEPHS_PRAYER.value.data}" \
-                              f"|{MenuElements.TENDER_AND_COMPASSIONATE_GOD.value.data}" \
-                              f"|{MenuElements.THIRD_STEP_PRAYER.value.data}" \
-                              f"|{MenuElements.SEVENTH_STEP_PRAYER.value.data}" \
-                              f"|{MenuElements.ELEVENTH_STEP_PRAYER.value.data})"
-            callback_pattern = [MenuElements.MAIN_MENU.value.data, MenuElements.PROFILE.value.data,
-                                MenuElements.CLEAN_TIME.value.data, MenuElements.READINGS.value.data,
-                                MenuElements.PRAYERS.value.data, readings_pattern, prayers_pattern]
-
-            return Enum("CallbackQueries", {k: Callback_Query_Handler(callback=v1, pattern=v2)
-                                            for k, v1, v2 in zip(callback_keys, callback_name, callback_pattern)})
+        def register_callback_queries() -> None:
+            """Register the callback query handlers of the menu elements with the menu router."""
+            ROUTER.register(main_menu, MenuElements.MAIN_MENU)
+            ROUTER.register(profile, MenuElements.PROFILE)
+            ROUTER.register(clean_time, MenuElements.CLEAN_TIME)
+            ROUTER.register(readings_menu, MenuElements.READINGS)
+            ROUTER.register(prayers_menu, MenuElements.PRAYERS)
+            ROUTER.register(readings, MenuElements.DAILY_REFLECTION, MenuElements.JUST_FOR_TODAY)
+            ROUTER.register(prayers, MenuElements.LORDS_PRAYER, MenuElements.SERENITY_PRAYER,
+                            MenuElements.ST_JOSEPHS_PRAYER, MenuElements.TENDER_AND_COMPASSIONATE_GOD,
+                            MenuElements.THIRD_STEP_PRAYER, MenuElements.SEVENTH_STEP_PRAYER,
+                            MenuElements.ELEVENTH_STEP_PRAYER)
+
+        # Handlers run concurrently on the dispatcher's workers, serialized per chat
+        if Config.CONCURRENT_HANDLERS:
+            wrap = concurrency.ChatSerializer(self.dispatcher).wrap
+        else:
+            def wrap(callback):
+                return callback
 
         # Command Handlers
         commands = get_command_handlers()
         for cmd in commands:
-            self.dispatcher.add_handler(CommandHandler(command=cmd.value.command, callback=cmd.value.callback))
+            self.dispatcher.add_handler(CommandHandler(command=cmd.value.command, callback=wrap(cmd.value.callback)))
 
-        # Callback Query Handlers
-        callback_queries = get_callback_query_handler()
-        for cbk in callback_queries:
-            self.dispatcher.add_handler(CallbackQueryHandler(callback=cbk.value.callback, pattern=cbk.value.pattern))
+        # Callback Query Handler, routed by callback data
+        register_callback_queries()
+        self.dispatcher.add_handler(CallbackQueryHandler(callback=wrap(ROUTER.dispatch)))
 
         # MessageHandler
-        self.dispatcher.add_handler(MessageHandler(Filters.command, unknown_command))
+        self.dispatcher.add_handler(MessageHandler(Filters.command, wrap(unknown_command)))
 
         # ErrorHandler
         self.dispatcher.add_error_handler(error_handler)
 
-        # Start the Bot
-        self.updater.start_polling()
-
-        # Run the bot until the user presses Ctrl-C or the process receives SIGINT, SIGTERM or SIGABRT
-        self.updater.idle()
-        return
-
-
+        # Record incoming updates for offline replay, before any other handler
+        if Config.UPDATE_LOG:
+            path = sharding.shard_path(Config.UPDATE_LOG, self.shard.index) if self.shard else Config.UPDATE_LOG
+            self.update_log = UpdateLogWriter(path)
+            self.dispatcher.add_handler(TypeHandler(Update, self.update_log.record), group=-1)
+
+        # Count incoming updates for the metrics endpoint
+        if Config.METRICS_PORT:
+            self.dispatcher.add_handler(TypeHandler(Update, metrics.count_update), group=-2)
+
+    def start_updates(self) -> None:
+        """Start receiving updates by long polling (default), on a local webhook listener or from the shard router."""
+        if self.shard is not None:
+            # Updates are put into the dispatcher's queue by idle()
+            self.updater.job_queue.start()
+            threading.Thread(target=self.dispatcher.start, name="dispatcher", daemon=True).start()
+        elif Config.UPDATE_MODE == "webhook":
+            self.updater.start_webhook(listen=Config.WEBHOOK_LISTEN,
+                                       port=Config.WEBHOOK_PORT,
+                                       url_path=Config.WEBHOOK_PATH,
+                                       cert=Config.WEBHOOK_CERT,
+                                       key=Config.WEBHOOK_KEY,
+                                       webhook_url=Config.WEBHOOK_URL,
+                                       max_connections=Config.WEBHOOK_MAX_CONNECTIONS)
+        else:
+            self.updater.start_polling()
+
+    def idle(self) -> None:
+        """Block until the bot is stopped.
+
+        A single process runs until the user presses Ctrl-C or the process receives SIGINT, SIGTERM or SIGABRT. A shard
+        worker hands the updates sent by the router to the dispatcher until the router stops it.
+        """
+        if self.shard is None:
+            self.updater.idle()
+            return
+        bot = self.updater.bot
+        for body in iter(self.updates.get, None):
+            self.dispatcher.update_queue.put(Update.de_json(json.loads(body), bot))
+        self.updater.job_queue.stop()
+        self.dispatcher.stop()
+
+
+@instrumentation.instrumented
 def profile(update: Update, context: CallbackContext) -> None:
     """Get user profile."""
     update, context, user = bot_helper.get_user(update, context)
@@ -111,22 +273,24 @@ def profile(update: Update, context: CallbackContext) -> None:
     send_message(BotUCM(update, context, msg), reply_markup=bot_helper.main_menu_keyboard())
 
 
+@instrumentation.instrumented
 def set_clean_date(update: Update, context: CallbackContext) -> None:
     """Set Clean Date."""
     update, context, user = bot_helper.get_user(update, context)
     inp = update.message.text.split()
     msg = Strings.SET_CLEAN_DATE_FAILURE.format(user["FirstName"])
     if len(inp) == 3 and database.set_clean_date(user["UserID"], inp[1] + " " + inp[2]):
+        context = bot_helper.update_user(context, database.get_user(user["UserID"]))
         msg = Strings.SET_CLEAN_DATE_SUCCESS.format(user["FirstName"], inp[1] + " " + inp[2])
     send_message(BotUCM(update, context, msg))
 
 
+@instrumentation.instrumented
 def clean_time(update: Update, context: CallbackContext) -> None:
     """Reply with calculated clean time."""
     update, context, user = bot_helper.get_user(update, context)
-    if user["CleanDateTime"]:
-        clean_date_time = utils.convert_str_to_datetime(user["CleanDateTime"])
-        clean_time_str = database.get_clean_time_str(clean_date_time, user["UserID"])
+    if user["CleanDateTime"] is not None:
+        clean_time_str = database.get_clean_time_str(user)
         msg = f"{database.get_random_motivational_str()}\n\n" \
               f"{Strings.CLEAN_TIME.format(clean_time_str[0], clean_time_str[1])}"
     else:
@@ -134,52 +298,49 @@ def clean_time(update: Update, context: CallbackContext) -> None:
     send_message(BotUCM(update, context, msg), reply_markup=bot_helper.main_menu_keyboard())
 
 
+@instrumentation.instrumented
 def readings(update: Update, context: CallbackContext) -> None:
     """Get reading for today."""
     update, context = bot_helper.update_context_with_user_data(update, context)
-    if hasattr(update.message, "text"):
-        inp = update.message.text.split()
-        reading = MenuElements[inp[0][1:].upper()].value.name
-    else:
-        ch = update.callback_query.data
-        reading = utils.get_menu_element_from_chr(ch).value.name
+    reading = ROUTER.element(update).value.name
     update, context, user = bot_helper.get_user(update, context)
     local_dt = database.get_user_local_time(user["UserID"])
     msg = database.get_reading(reading, local_dt)
     send_message(BotUCM(update, context, msg), reply_markup=bot_helper.readings_menu_keyboard())
 
 
+@instrumentation.instrumented
 def prayers(update: Update, context: CallbackContext) -> None:
     """Get prayer."""
     update, context = bot_helper.update_context_with_user_data(update, context)
-    if hasattr(update.message, "text"):
-        prayer = MenuElements[update.message.text[1:].upper()]
-    else:
-        ch = update.callback_query.data
-        prayer = utils.get_menu_element_from_chr(ch)
-    msg = database.get_prayer(prayer.value.name)
+    msg = database.get_prayer(ROUTER.element(update).value.name)
     send_message(BotUCM(update, context, msg), reply_markup=bot_helper.prayers_menu_keyboard())
 
 
+@instrumentation.instrumented
 def set_utc_offset(update: Update, context: CallbackContext) -> None:
     """Set UTC offset."""
     update, context, user = bot_helper.get_user(update, context)
     inp = update.message.text.split()
     msg = Strings.UTC_OFFSET_FAILURE.format(user["FirstName"])
     if len(inp) == 2 and database.update_user_utc_time_offset(user["UserID"], inp[1]):
+        user = database.get_user(user["UserID"])
+        context = bot_helper.update_user(context, user)
+        # The notification is kept at the same local time, so its UTC minute moves with the offset
+        if user["DailyNotification"] is not None:
+            scheduler.NOTIFICATIONS.enable(user["UserID"], scheduler.local_minute_to_utc_minute(
+                user["DailyNotification"], user["UTCOffset"]))
         msg = Strings.UTC_OFFSET_SUCCESS.format(inp[1])
     send_message(BotUCM(update, context, msg))
 
 
+@instrumentation.instrumented
 def enable_daily_notification(update: Update, context: CallbackContext) -> None:
     """Enable daily notifications for clean time at user specified time."""
     update, context, user = bot_helper.get_user(update, context)
-    user_job = bot_helper.get_daily_notification(context, user["UserID"])
-    if user_job:
-        notification_time = utils.convert_utc_time_to_local_time(user_job[0].job.next_run_time,
-                                                                 database.get_time_offset(user["UserID"]))
-        msg = Strings.ENABLE_NOTIFICATION_NOTIFICATION_ALREADY_SET.format(user["FirstName"],
-                                                                          notification_time.time())
+    notification_time = bot_helper.get_daily_notification(user["UserID"])
+    if notification_time:
+        msg = Strings.ENABLE_NOTIFICATION_NOTIFICATION_ALREADY_SET.format(user["FirstName"], notification_time)
     else:
         msg = enable_daily_notification_set(update, context, user)
     send_message(BotUCM(update, context, msg), reply_markup=bot_helper.main_menu_keyboard())
@@ -191,127 +352,229 @@ def enable_daily_notification_set(update: Update, context: CallbackContext, user
     if len(inp) == 3:
         inp = update.message.text.split()
         inp = f"{inp[1]} {inp[2]}"
-        time_local = utils.convert_str_to_datetime(inp)
-        if time_local:
+        epoch = utils.parse_date_time_to_epoch(inp)
+        if epoch is not None:
+            local_minute = epoch // 60 % scheduler.MINUTES_PER_DAY
             offset = database.get_time_offset(user["UserID"])
-            time_utc = utils.convert_local_time_to_utc_time(time_local, offset)
             update, context, user = bot_helper.get_user(update, context)
-            context.job_queue.run_daily(notification_callback, days=tuple(range(7)), time=time_utc.time(),
-                                        context=user["UserID"], name=str(user["UserID"]))
-            user["DailyNotification"] = str(time_local.time())
+            scheduler.NOTIFICATIONS.enable(user["UserID"], scheduler.local_minute_to_utc_minute(local_minute, offset))
+            user["DailyNotification"] = local_minute
             database.update_daily_notification(user["UserID"], user["DailyNotification"])
             bot_helper.update_user(context, user)
-            msg = Strings.ENABLE_NOTIFICATION_SUCCESS.format(user["FirstName"], time_local.time())
+            msg = Strings.ENABLE_NOTIFICATION_SUCCESS.format(user["FirstName"],
+                                                             utils.format_minute_of_day(local_minute))
     return msg
 
 
+@instrumentation.instrumented
 def disable_daily_notification(update: Update, context: CallbackContext) -> None:
     """Disable daily notifications for clean time."""
     update, context, user = bot_helper.get_user(update, context)
-    user_job = bot_helper.get_daily_notification(context, user["UserID"])
-    if user_job:
-        notification_time = utils.convert_utc_time_to_local_time(user_job[0].job.next_run_time,
-                                                                 database.get_time_offset(user["UserID"]))
-        user_job[0].schedule_removal()
-        user["DailyNotification"] = ""
+    minute = scheduler.NOTIFICATIONS.disable(user["UserID"])
+    if minute is not None:
+        notification_time = bot_helper.get_notification_local_time(user["UserID"], minute)
+        user["DailyNotification"] = None
         database.update_daily_notification(user["UserID"], user["DailyNotification"])
         context = bot_helper.update_user(context, user)
-        msg = Strings.DISABLE_NOTIFICATION_SUCCESS.format(user["FirstName"], notification_time.time())
+        msg = Strings.DISABLE_NOTIFICATION_SUCCESS.format(user["FirstName"], notification_time)
     else:
-        user["DailyNotification"] = ""
+        user["DailyNotification"] = None
         database.update_daily_notification(user["UserID"], user["DailyNotification"])
         context = bot_helper.update_user(context, user)
         msg = Strings.DISABLE_NOTIFICATION_NOTIFICATION_NOT_SET.format(user["FirstName"])
     send_message(BotUCM(update, context, msg), reply_markup=bot_helper.main_menu_keyboard())
 
 
+@instrumentation.instrumented
 def help_command(update: Update, context: CallbackContext) -> None:
     """Displays info on how to use the bot."""
     # update.message.reply_text("Use /start or /menu to use this bot.")
-    msg = Strings.HELP
+    msg = RESPONSES.get(Responses.HELP).text
+    send_message(BotUCM(update, context, msg))
+
+
+def stats_command(update: Update, context: CallbackContext) -> None:
+    """Admin command: summarize per-handler query counts and timings."""
+    update, context, user = bot_helper.get_user(update, context)
+    if not bot_helper.is_admin(user):
+        unknown_command(update, context)
+        return
+    summary = "\n\n".join((instrumentation.summary(), outbound.OUTBOUND.summary(), ROUTER.summary(),
+                           RESPONSES.summary()))
+    msg = f"<pre>{html.escape(summary)}</pre>"
+    send_message(BotUCM(update, context, msg))
+
+
+def profiling_command(update: Update, context: CallbackContext) -> None:
+    """Admin command: start, dump or stop sampled handler profiling, or report its state without arguments."""
+    update, context, user = bot_helper.get_user(update, context)
+    if not bot_helper.is_admin(user):
+        unknown_command(update, context)
+        return
+    inp = update.message.text.split()[1:]
+    action = inp[0].lower() if inp else ""
+    if action == "start":
+        try:
+            rate = float(inp[1]) / 100 if len(inp) > 1 else Config.PROFILE_SAMPLE_RATE
+        except ValueError:
+            rate = Config.PROFILE_SAMPLE_RATE
+        PROFILER.start(rate, trace_allocations="trace" in inp[1:])
+        msg = PROFILER.status()
+    elif action == "dump" and PROFILER.active:
+        msg = "\n".join([PROFILER.status()] + PROFILER.dump())
+    elif action == "stop":
+        paths = PROFILER.stop()
+        msg = "\n".join([PROFILER.status()] + paths)
+    else:
+        msg = f"{PROFILER.status()}\n\n{Strings.PROFILING_USAGE}"
+    send_message(BotUCM(update, context, html.escape(msg)))
+
+
+@instrumentation.instrumented
+def broadcast_command(update: Update, context: CallbackContext) -> None:
+    """Admin command: send a message to all users, or report progress of running broadcasts without a message."""
+    update, context, user = bot_helper.get_user(update, context)
+    if not bot_helper.is_admin(user):
+        unknown_command(update, context)
+        return
+    inp = update.message.text.split(maxsplit=1)
+    if len(inp) == 2:
+        running = broadcast.start_broadcast(context.bot, inp[1])
+        msg = Strings.BROADCAST_STARTED.format(running.record.broadcast_id)
+    else:
+        statuses = [Strings.BROADCAST_STATUS.format(running.record.broadcast_id, running.progress())
+                    for running in broadcast.get_active_broadcasts()]
+        msg = "\n".join(statuses) if statuses else Strings.BROADCAST_USAGE
     send_message(BotUCM(update, context, msg))
 
 
 def error_handler(update: Update, context: CallbackContext) -> None:
     """Error handler."""
     msg = Strings.ERROR_MESSAGE
-    send_message(BotUCM(update, context, msg))
+    if update is not None and update.effective_chat:
+        send_message(BotUCM(update, context, msg))
     print(f"Update {update} caused error {context.error}")
 
 
+@instrumentation.instrumented
 def start(update: Update, context: CallbackContext) -> None:
     """Sends a message with three inline buttons attached."""
     update, context = bot_helper.update_context_with_user_data(update, context)
-    update.message.reply_text(bot_helper.main_menu_message(), reply_markup=bot_helper.main_menu_keyboard())
+    response = RESPONSES.get(Responses.MAIN_MENU)
+    with instrumentation.enqueue_timer():
+        outbound.OUTBOUND.enqueue(context.bot, OutboundMessage(chat_id=update.message.chat_id, text=response.text,
+                                                               reply_markup=response.reply_markup))
 
 
-def menu(update: Update, context: CallbackContext, message, keyboard) -> None:
+def menu(update: Update, context: CallbackContext, response: StaticResponse) -> None:
     """General menu control."""
     update, context = bot_helper.update_context_with_user_data(update, context)
     query = update.callback_query
-    query.answer()
-    query.message.reply_text(message, reply_markup=keyboard)
+    with instrumentation.enqueue_timer():
+        outbound.OUTBOUND.enqueue(context.bot, OutboundMessage(chat_id=query.message.chat_id, text=response.text,
+                                                               parse_mode=response.parse_mode,
+                                                               reply_markup=response.reply_markup,
+                                                               callback_query=query))
 
 
+@instrumentation.instrumented
 def main_menu(update: Update, context: CallbackContext) -> None:
     """Main menu."""
-    menu(update, context, bot_helper.main_menu_message(), bot_helper.main_menu_keyboard())
+    menu(update, context, RESPONSES.get(Responses.MAIN_MENU))
 
 
+@instrumentation.instrumented
 def readings_menu(update: Update, context: CallbackContext) -> None:
     """Readings menu."""
-    menu(update, context, bot_helper.readings_menu_message(), bot_helper.readings_menu_keyboard())
+    menu(update, context, RESPONSES.get(Responses.READINGS_MENU))
 
 
+@instrumentation.instrumented
 def prayers_menu(update: Update, context: CallbackContext) -> None:
     """Prayers menu."""
-    menu(update, context, bot_helper.prayers_menu_message(), bot_helper.prayers_menu_keyboard())
-
-
-def send_message(bot_ucm: BotUCM, reply_markup: ReplyMarkup = None) -> None:
-    """Send message."""
-    update = bot_helper.answer_callback_query(bot_ucm.update)
-    update, context, user = bot_helper.get_user(update, bot_ucm.context)
-    root_logger.info(bot_ucm.message)
-    context.bot.sendMessage(chat_id=user["UserID"],
-                            text=bot_ucm.message,
-                            parse_mode=ParseMode.HTML,
-                            reply_markup=reply_markup)
-
-
-def notification_callback(context: CallbackContext) -> None:
-    """Notification callback."""
-    user_chat_id = int(str(context.job.context))
-    user = database.get_user(user_chat_id)
-    if user["CleanDateTime"]:
+    menu(update, context, RESPONSES.get(Responses.PRAYERS_MENU))
+
+
+def send_message(bot_ucm: BotUCM, reply_markup: Union[ReplyMarkup, str] = None) -> None:
+    """Send message. The message is queued and sent by the outbound queue's sender threads."""
+    update = bot_ucm.update
+    log_pipeline.MESSAGE_LOG.log(update.effective_chat.id, bot_ucm.message)
+    with instrumentation.enqueue_timer():
+        outbound.OUTBOUND.enqueue(bot_ucm.context.bot,
+                                  OutboundMessage(chat_id=update.effective_chat.id,
+                                                  text=bot_ucm.message,
+                                                  parse_mode=ParseMode.HTML,
+                                                  reply_markup=reply_markup,
+                                                  callback_query=update.callback_query))
+
+
+@instrumentation.instrumented
+def notification_callback(context: CallbackContext, user_ids: tuple) -> None:
+    """Notification callback. Called by the notification scheduler with all users due in the current minute."""
+    users = database.get_users(user_ids)
+    for user, clean_time_str in zip(users, database.get_clean_time_strs(users)):
+        if clean_time_str is None:
+            continue
         quote = database.get_random_motivational_str()
-        clean_date_time = utils.convert_str_to_datetime(str(user["CleanDateTime"]))
-        clean_time_str = database.get_clean_time_str(clean_date_time, user["UserID"])
         msg = Strings.CLEAN_TIME.format(clean_time_str[0], clean_time_str[1])
-        context.bot.send_message(chat_id=user["UserID"], text=f"{quote}\n\n{msg}")
+        with instrumentation.enqueue_timer():
+            outbound.OUTBOUND.enqueue(context.bot, OutboundMessage(chat_id=user["UserID"], text=f"{quote}\n\n{msg}"))
 
 
+@instrumentation.instrumented
 def unknown_command(update: Update, context: CallbackContext) -> None:
     """Unknown command handler."""
-    msg = Strings.UNKNOWN_COMMAND
-    context.bot.sendMessage(chat_id=update.message.chat_id, text=msg)
+    response = RESPONSES.get(Responses.UNKNOWN_COMMAND)
+    with instrumentation.enqueue_timer():
+        outbound.OUTBOUND.enqueue(context.bot, OutboundMessage(chat_id=update.message.chat_id, text=response.text))
+
+
+def run_shard(index: int, shards: int, updates: multiprocessing.Queue) -> None:
+    """Worker process of the sharded mode, started by the ShardRouter.
+
+    :param index: Worker index
+    :param shards: Number of workers
+    :param updates: Encoded updates of the chats of this worker, None stops the worker
+    """
+    # Ctrl-C reaches the whole process group, the router stops the workers after it stopped accepting updates
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: updates.put(None))
+    log_listener = log_pipeline.start_logging(sharding.shard_path(Config.LOG_FILE, index), Config.LOG_MAX_BYTES,
+                                              Config.LOG_BACKUPS)
+    try:
+        SoberSerenity(Config.TOKEN, Shard(index, shards), updates).run()
+    finally:
+        log_listener.stop()
+
+
+def run_sharded() -> None:
+    """Receive updates on the webhook listener and route them to Config.SHARDS worker processes by chat ID, until the
+    process receives SIGINT or SIGTERM."""
+    if Config.STORAGE != "sqlite":
+        raise ValueError(f"The sharded mode needs the shared SQLite storage, not {Config.STORAGE!r}")
+    database.migrate()
+    router = sharding.ShardRouter(Config.SHARDS, run_shard, Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT,
+                                  Config.WEBHOOK_PATH, Config.SHARD_QUEUE_SIZE)
+    router.start()
+    if Config.WEBHOOK_URL:
+        Bot(Config.TOKEN, base_url=Config.BOT_API_URL).set_webhook(
+            Config.WEBHOOK_URL, max_connections=Config.WEBHOOK_MAX_CONNECTIONS)
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopped.set())
+    while not stopped.wait(1):
+        pass
+    router.stop()
+    database.POOL.close_all()
 
 
 if __name__ == '__main__':
-    root_logger = logging.getLogger()
-    root_logger.handlers = []
-    root_logger.setLevel(logging.INFO)
-    file_handler = logging.FileHandler('Logs/SoberSerenityBotLog.log')
-    console_handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        '%(asctime)s - %(filename)s - %(funcName)s - Line: %(lineno)d - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.ERROR)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-
-    load_dotenv()
-    sober_serenity_token = os.environ.get("SOBER_SERENITY_TOKEN")
-    bot = SoberSerenity(sober_serenity_token)
-    bot.run()
+    log_listener = log_pipeline.start_logging(Config.LOG_FILE, Config.LOG_MAX_BYTES, Config.LOG_BACKUPS)
+
+    try:
+        if Config.SHARDS > 1:
+            run_sharded()
+        else:
+            SoberSerenity(Config.TOKEN).run()
+    finally:
+        log_listener.stop()
@@ -56,3 +56,8 @@ class Strings:
                       "with the bot"
     ERROR_MESSAGE = "Sorry, something went wrong!!!😟😟😟"
     HELP = "Use /start or /menu to use this bot."
+    BROADCAST_USAGE = "Use this format to send a message to all users:\n\n/broadcast MESSAGE"
+    BROADCAST_STARTED = "Broadcast {} started."
+    BROADCAST_STATUS = "Broadcast {}: {}"
+    PROFILING_USAGE = "Use this format to profile handler calls:\n\n/profiling start [PERCENT] [trace]\n" \
+                      "/profiling dump\n/profiling stop"
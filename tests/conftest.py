@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Shared test fixtures.
+
+The configuration is read from the environment when the bot modules are imported, so it is set here, before the test
+modules import them.
+"""
+import os
+import shutil
+
+import pytest
+
+from benchmarks import fakes
+
+# Keep a local .env from turning on database encryption or another storage backend
+os.environ["SOBER_SERENITY_TOKEN"] = fakes.STUB_TOKEN
+os.environ["SOBER_SERENITY_DB_ENCRYPTED"] = "0"
+os.environ["SOBER_SERENITY_STORAGE"] = "sqlite"
+
+# Users of the seeded database have IDs 1..SEEDED_USERS
+SEEDED_USERS = 60
+
+
+@pytest.fixture(scope="session")
+def seeded_database(tmp_path_factory) -> str:
+    """Seeded (see benchmarks.fakes.create_database) and migrated bot database, tests use copies (bot_database)."""
+    import database
+    from config import Config
+    from connection_pool import ConnectionPool
+
+    path = str(tmp_path_factory.mktemp("seeded") / "SoberSerenity.db")
+    fakes.create_database(path, SEEDED_USERS)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(Config, "DB_NAME", path)
+        monkeypatch.setattr(database, "POOL", ConnectionPool(database.connect_db, 1))
+        database.migrate()
+        database.POOL.close_all()
+    return path
+
+
+@pytest.fixture
+def bot_database(seeded_database, tmp_path, monkeypatch) -> str:
+    """Fresh copy of the seeded database, used by the database module during the test."""
+    import database
+    from config import Config
+    from connection_pool import ConnectionPool
+
+    path = str(tmp_path / "SoberSerenity.db")
+    shutil.copyfile(seeded_database, path)
+    monkeypatch.setattr(Config, "DB_NAME", path)
+    monkeypatch.setattr(database, "POOL", ConnectionPool(database.connect_db, 2))
+    yield path
+    database.POOL.close_all()
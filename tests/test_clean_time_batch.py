@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""The batched clean time (with and without NumPy) must match the per-user computation and relativedelta exactly."""
+import datetime
+import random
+from itertools import product
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+import clean_time_batch
+from utils import datetime_to_epoch
+
+CLEAN_DATES = [
+    # Month ends
+    datetime.datetime(2020, 1, 31, 23, 59, 59), datetime.datetime(2021, 4, 30, 12, 0, 0),
+    datetime.datetime(2019, 12, 31, 0, 0, 0), datetime.datetime(2021, 2, 28, 0, 0, 1),
+    datetime.datetime(1999, 3, 31, 6, 30, 0),
+    # Leap days
+    datetime.datetime(2000, 2, 29, 0, 0, 0), datetime.datetime(2020, 2, 29, 12, 0, 0),
+    datetime.datetime(2024, 2, 29, 23, 59, 59),
+    # Around and before the epoch
+    datetime.datetime(1970, 1, 1, 0, 0, 0), datetime.datetime(1969, 12, 31, 23, 0, 0),
+    datetime.datetime(1950, 6, 15, 8, 45, 30),
+    # In the future
+    datetime.datetime(2031, 1, 31, 0, 0, 0), datetime.datetime(2099, 12, 31, 23, 59, 59),
+]
+NOWS = [
+    datetime.datetime(2024, 2, 29, 0, 0, 0, 500000), datetime.datetime(2023, 3, 1, 0, 0, 0),
+    datetime.datetime(2024, 3, 31, 23, 59, 59, 999999), datetime.datetime(2021, 1, 31, 0, 0, 0),
+    datetime.datetime(2025, 2, 28, 12, 30, 0, 250000),
+]
+# UTC offsets in seconds: +00:00, +05:30, -08:00, +14:00, -00:45, -12:00
+OFFSETS = [0, 19800, -28800, 50400, -2700, -43200]
+
+
+def expected_clean_time(clean: datetime.datetime, offset: int, now: datetime.datetime) -> tuple:
+    """Clean time as computed with relativedelta before the batch computation existed."""
+    local = now + datetime.timedelta(seconds=offset)
+    delta = relativedelta(local, clean)
+    return (delta.years, delta.months, delta.weeks, delta.days - delta.weeks * 7, delta.hours, delta.minutes,
+            delta.seconds, (local - clean).days)
+
+
+def random_batches(batches: int, size: int, seed: int) -> list:
+    """(now, clean dates, offsets) of random batches, now with a fractional second in most of them."""
+    rng = random.Random(seed)
+    start = datetime.datetime(1950, 1, 1)
+    return [(datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=rng.randint(0, 20 * 365 * 86400),
+                                                                microseconds=rng.choice((0, rng.randint(1, 999999)))),
+             [start + datetime.timedelta(seconds=rng.randint(0, 90 * 365 * 86400)) for _ in range(size)],
+             [rng.choice(OFFSETS) for _ in range(size)])
+            for _ in range(batches)]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def batch_path(request, monkeypatch) -> str:
+    """Run compute_clean_times on NumPy arrays or element by element."""
+    if request.param == "numpy":
+        if clean_time_batch.load_numpy() is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(clean_time_batch, "numpy", None)
+    return request.param
+
+
+@pytest.mark.parametrize("now", NOWS, ids=str)
+def test_edge_cases(batch_path, now):
+    cases = list(product(CLEAN_DATES, OFFSETS))
+    clean_epochs = [datetime_to_epoch(clean) for clean, _ in cases]
+    offsets = [offset for _, offset in cases]
+    batch = list(zip(*clean_time_batch.compute_clean_times(clean_epochs, offsets, now)))
+    for (clean, offset), clean_epoch, batched in zip(cases, clean_epochs, batch):
+        expected = expected_clean_time(clean, offset, now)
+        assert clean_time_batch.compute_clean_time(clean_epoch, offset, now) == expected, (clean, offset)
+        assert batched == expected, (clean, offset)
+
+
+def test_random_cases(batch_path):
+    for now, cleans, offsets in random_batches(20, 500, seed=0):
+        clean_epochs = [datetime_to_epoch(clean) for clean in cleans]
+        batch = list(zip(*clean_time_batch.compute_clean_times(clean_epochs, offsets, now)))
+        for clean, offset, clean_epoch, batched in zip(cleans, offsets, clean_epochs, batch):
+            expected = expected_clean_time(clean, offset, now)
+            assert clean_time_batch.compute_clean_time(clean_epoch, offset, now) == expected, (clean, offset, now)
+            assert batched == expected, (clean, offset, now)
+
+
+def test_empty_batch(batch_path):
+    assert clean_time_batch.compute_clean_times([], [], NOWS[0]) == tuple([] for _ in range(8))
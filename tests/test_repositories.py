@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Conformance tests of the storage backends (SOBER_SERENITY_STORAGE).
+
+Every test runs against the user, content and quote repositories of each backend in database.STORAGE_BACKENDS, opened
+on a fresh copy of the seeded database, and checks them against the rows stored in that database.
+"""
+import sqlite3
+
+import pytest
+
+import database
+from config import Config
+from models import Columns, Tables, TABLE_COLUMNS
+from repositories import KeyValueUserRepository, USER_COLUMN_INDEX
+from tests.conftest import SEEDED_USERS
+
+BEFORE_FIRST_USER_ID = -2 ** 63
+NEW_USER_ID = SEEDED_USERS + 1000
+NEW_USER = (NEW_USER_ID, "new_user", "New", "User", "", None, None, None)
+
+
+def stored_rows(path: str, table: Tables) -> list:
+    """Rows of a table read straight from the database, column values in the order of TABLE_COLUMNS."""
+    columns = ", ".join(column.value for column in TABLE_COLUMNS[table])
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f"SELECT {columns} FROM {table.value}").fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def stored_users(bot_database) -> dict:
+    """Seeded user rows by user ID."""
+    return {row[0]: row for row in stored_rows(bot_database, Tables.USERS)}
+
+
+@pytest.fixture(params=database.STORAGE_BACKENDS)
+def repositories(request, bot_database, tmp_path, monkeypatch):
+    """Repositories of a storage backend on a fresh copy of the seeded database."""
+    monkeypatch.setattr(Config, "KV_PATH", str(tmp_path / "SoberSerenityUsers.kv"))
+    opened = database.open_repositories(request.param)
+    yield opened
+    opened.users.close()
+
+
+def with_notification(rows) -> list:
+    return sorted(row for row in rows if row[USER_COLUMN_INDEX[Columns.NOTIFICATION_MINUTE]] is not None)
+
+
+def test_get(repositories, stored_users):
+    for user_id in (1, 2, 3, 10, SEEDED_USERS):
+        assert repositories.users.get(user_id) == stored_users[user_id]
+    assert repositories.users.get(NEW_USER_ID) is None
+
+
+def test_get_many(repositories, stored_users):
+    user_ids = [1, 5, 10, 30]
+    rows = repositories.users.get_many(user_ids + [NEW_USER_ID] + user_ids[:2])
+    assert sorted(rows) == sorted(stored_users[user_id] for user_id in user_ids)
+
+
+def test_all(repositories, stored_users):
+    assert sorted(repositories.users.all()) == sorted(stored_users.values())
+
+
+def test_notifications(repositories, stored_users):
+    expected = with_notification(stored_users.values())
+    assert expected, "the seeded users should include some with daily notification"
+    assert sorted(repositories.users.with_notification()) == expected
+    offset, minute = USER_COLUMN_INDEX[Columns.UTC_OFFSET_MINUTES], USER_COLUMN_INDEX[Columns.NOTIFICATION_MINUTE]
+    assert sorted(repositories.users.notification_settings()) == [(row[0], row[offset], row[minute])
+                                                                  for row in expected]
+
+
+def test_ids_and_counts_after(repositories):
+    users = repositories.users
+    assert users.ids_after(BEFORE_FIRST_USER_ID, 5) == [1, 2, 3, 4, 5]
+    assert users.ids_after(5, 3) == [6, 7, 8]
+    assert users.ids_after(SEEDED_USERS - 2, 10) == [SEEDED_USERS - 1, SEEDED_USERS]
+    assert users.ids_after(SEEDED_USERS, 10) == []
+    assert users.count_after(BEFORE_FIRST_USER_ID) == SEEDED_USERS
+    assert users.count_after(5) == SEEDED_USERS - 5
+    assert users.count_after(SEEDED_USERS) == 0
+
+
+def test_add(repositories, stored_users):
+    users = repositories.users
+    users.add(NEW_USER)
+    assert users.get(NEW_USER_ID) == NEW_USER
+    assert sorted(users.all()) == sorted(list(stored_users.values()) + [NEW_USER])
+    assert users.ids_after(SEEDED_USERS, 10) == [NEW_USER_ID]
+    assert users.count_after(BEFORE_FIRST_USER_ID) == SEEDED_USERS + 1
+
+
+def test_update(repositories):
+    users = repositories.users
+    users.add(NEW_USER)
+    users.update(NEW_USER_ID, Columns.CLEAN_DATE_EPOCH, 1262304000)
+    users.update(NEW_USER_ID, Columns.UTC_OFFSET_MINUTES, -330)
+    users.update(NEW_USER_ID, Columns.NOTIFICATION_MINUTE, 450)
+    assert users.get(NEW_USER_ID) == NEW_USER[:5] + (1262304000, -330, 450)
+    assert (NEW_USER_ID, -330, 450) in users.notification_settings()
+
+    users.update(NEW_USER_ID, Columns.NOTIFICATION_MINUTE, None)
+    assert NEW_USER_ID not in [row[0] for row in users.with_notification()]
+
+
+def test_update_of_missing_user(repositories):
+    repositories.users.update(NEW_USER_ID, Columns.NOTIFICATION_MINUTE, 450)
+    assert repositories.users.get(NEW_USER_ID) is None
+    assert repositories.users.count_after(SEEDED_USERS) == 0
+
+
+@pytest.mark.parametrize("book", [Tables.DAILY_REFLECTION, Tables.JUST_FOR_TODAY])
+def test_readings(repositories, bot_database, book):
+    stored = stored_rows(bot_database, book)
+    assert sorted(repositories.content.readings(book)) == sorted(stored)
+    by_date = {row[0]: row for row in stored}
+    for date in ("2020-01-01", "2020-02-29", "2020-12-31"):
+        assert repositories.content.reading(book, date) == by_date[date]
+    assert repositories.content.reading(book, "2019-01-01") is None
+
+
+def test_prayers(repositories, bot_database):
+    stored = stored_rows(bot_database, Tables.PRAYERS)
+    assert sorted(repositories.content.prayers()) == sorted(stored)
+    assert repositories.content.prayer(stored[0][0]) == stored[0]
+    assert repositories.content.prayer("NoSuchPrayer") is None
+
+
+def test_quotes(repositories, bot_database):
+    connection = sqlite3.connect(bot_database)
+    try:
+        stored = [row[0] for row in connection.execute(
+            f"SELECT {Columns.QUOTE.value} FROM {Tables.MOTIVATIONAL_QUOTES.value}")]
+    finally:
+        connection.close()
+    assert sorted(repositories.quotes.quotes()) == sorted(stored)
+    assert repositories.quotes.version() == repositories.quotes.version()
+
+
+def test_key_value_writes_survive_reopening_without_close(bot_database, tmp_path):
+    path = str(tmp_path / "SoberSerenityUsers.kv")
+    users = KeyValueUserRepository(path, database.SQLiteUserRepository().all)
+    users.add(NEW_USER)
+    users.update(1, Columns.FIRST_NAME, "Renamed")
+    # Not closed, like after a crash
+    reopened = KeyValueUserRepository(path)
+    try:
+        assert reopened.get(NEW_USER_ID) == NEW_USER
+        assert reopened.get(1)[USER_COLUMN_INDEX[Columns.FIRST_NAME]] == "Renamed"
+    finally:
+        reopened.close()
+        users.close()
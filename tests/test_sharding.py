@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Sharded mode routing: every update reaches the worker process owning its chat, exactly once and in order.
+
+The workers record the updates they receive instead of handling them. Throughput per number of workers is measured
+by benchmarks.sharding.
+"""
+import http.client
+import json
+import os
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, Tuple
+
+import pytest
+
+import sharding
+
+WEBHOOK_PATH = "webhook"
+
+
+def record_updates(directory: str, index: int, shards: int, updates) -> None:
+    """Worker process writing (update ID, chat ID) of every update it receives to shard<index>.jsonl."""
+    with open(os.path.join(directory, f"shard{index}.jsonl"), "w") as f:
+        while True:
+            body = updates.get()
+            if body is None:
+                return
+            update_json = json.loads(body)
+            f.write(json.dumps([update_json["update_id"], sharding.update_chat_id(update_json)]) + "\n")
+
+
+def received_updates(directory: str, shards: int) -> Dict[int, List[Tuple[int, int]]]:
+    """(update ID, chat ID) received by each worker, in the order received."""
+    received = {}
+    for index in range(shards):
+        with open(os.path.join(directory, f"shard{index}.jsonl")) as f:
+            received[index] = [tuple(json.loads(line)) for line in f]
+    return received
+
+
+def post(port: int, path: str, bodies: List[bytes]) -> List[int]:
+    """POST bodies one after the other on a single connection, returns the status codes."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    statuses = []
+    try:
+        for body in bodies:
+            connection.request("POST", path, body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            statuses.append(response.status)
+    finally:
+        connection.close()
+    return statuses
+
+
+@pytest.fixture(scope="module")
+def recorded_updates() -> List[dict]:
+    """A synthesized mix of commands and button presses of 50 users, as recorded by the update log."""
+    from benchmarks.replay import synthesize
+    return [update_json for _, update_json in synthesize(400, 50, 1.0, seed=0)]
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test_every_update_reaches_the_worker_of_its_chat(shards, recorded_updates, tmp_path):
+    router = sharding.ShardRouter(shards, partial(record_updates, str(tmp_path)), "127.0.0.1", 0, WEBHOOK_PATH,
+                                  len(recorded_updates))
+    router.start()
+    try:
+        statuses = post(router.port, f"/{WEBHOOK_PATH}",
+                        [json.dumps(update_json).encode() for update_json in recorded_updates])
+    finally:
+        router.stop()
+    assert statuses == [200] * len(recorded_updates)
+    received = received_updates(str(tmp_path), shards)
+
+    # Nothing lost or duplicated
+    sent_ids = [update_json["update_id"] for update_json in recorded_updates]
+    assert sorted(update_id for updates in received.values() for update_id, _ in updates) == sorted(sent_ids)
+
+    # Each chat lands on one worker, the one shard_of picks, and its updates arrive in the order they were sent
+    workers = defaultdict(set)
+    for index, updates in received.items():
+        for update_id, chat_id in updates:
+            workers[chat_id].add(index)
+            assert sharding.shard_of(chat_id, shards) == index
+        for chat_id in {chat_id for _, chat_id in updates}:
+            chat_updates = [update_id for update_id, update_chat_id in updates if update_chat_id == chat_id]
+            assert chat_updates == [update_id for update_id in sent_ids if update_id in set(chat_updates)]
+    assert all(len(indexes) == 1 for indexes in workers.values())
+    assert len(workers) == 50
+    # Every worker gets a share of the chats
+    assert all(received.values())
+
+
+def test_bad_requests_are_rejected(tmp_path):
+    router = sharding.ShardRouter(1, partial(record_updates, str(tmp_path)), "127.0.0.1", 0, WEBHOOK_PATH, 10)
+    router.start()
+    try:
+        assert post(router.port, "/other", [b"{}"]) == [404]
+        assert post(router.port, f"/{WEBHOOK_PATH}", [b"not json", b"[]"]) == [400, 400]
+    finally:
+        router.stop()
+    assert received_updates(str(tmp_path), 1) == {0: []}
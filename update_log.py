@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import json
+import threading
+import time
+from typing import Iterator, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+# Buffered records are written to disk at least this often (seconds)
+FLUSH_INTERVAL = 1.0
+
+
+class UpdateLogWriter:
+    """Append-only log of incoming updates.
+
+    Every update is written as one compact JSON line {"t": unix time, "u": update}, which can be replayed with
+    `python -m benchmarks.replay`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def record(self, update: Update, context: CallbackContext = None) -> None:
+        """Append an update to the log. Usable as a TypeHandler callback."""
+        line = json.dumps({"t": round(time.time(), 3), "u": update.to_dict()}, separators=(",", ":"),
+                          ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            now = time.monotonic()
+            if now - self._flushed_at >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._flushed_at = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def read_update_log(path: str) -> Iterator[Tuple[float, dict]]:
+    """Read (unix time, update JSON) records from an update log."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["t"], record["u"]
@@ -1,86 +1,95 @@
 #!/usr/bin/env python3
 import datetime
 import os
-from typing import Union, Tuple
-
-from dateutil.relativedelta import relativedelta
-from telegram import Update
+import re
+from typing import TYPE_CHECKING, Union, Tuple
 
 from models import MenuElements
 from strings import Strings
 
+if TYPE_CHECKING:
+    from dateutil.relativedelta import relativedelta
+
 WORKING_DIR = os.getcwd()
 
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_SECOND = datetime.timedelta(seconds=1)
+DATE_TIME_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?: (\d{1,2}):(\d{1,2}):(\d{1,2}))?")
+TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?")
+UTC_OFFSET_PATTERN = re.compile(r"([+-])(\d{2}):(\d{2})")
+# UTC offsets in use range from -12:00 to +14:00
+MAX_UTC_OFFSET_MINUTES = 14 * 60
 
-def get_menu_element_from_chr(ch) -> Union[MenuElements, None]:
-    """Get menu element from char data."""
-    for me in MenuElements:
-        if ch == me.value[0]:
-            return me
-    return None
 
+def parse_date_time_to_epoch(str_date: str) -> Union[int, None]:
+    """Parse date in the format YYYY-MM-DD HH:MM:SS (time is optional) to epoch seconds.
 
-def check_offset_format_is_correct(offset: str):
-    """Check if provided UTC offset is in correct time."""
-    if len(offset.split(':')):
-        return False
-    offset_split_1 = offset.split(':')[0]
-    offset_split_2 = offset.split(':')[1]
-    if len(offset_split_1) == 3 and len(offset_split_2) == 2:
-        try:
-            int(offset_split_1[1:])
-            int(offset_split_2)
-            return True
-        except ValueError:
-            return False
-    return False
+    :param str_date: String date in the format YYYY-MM-DD HH:MM:SS
+    :return: Epoch seconds for success and None for failure
+    """
+    match = DATE_TIME_PATTERN.fullmatch(str_date.strip())
+    if not match:
+        return None
+    try:
+        dt = datetime.datetime(*(int(x) for x in match.groups(0)))
+    except ValueError:
+        return None
+    return datetime_to_epoch(dt)
 
 
-def convert_local_time_to_utc_time(local_time: datetime.datetime, offset: relativedelta) -> datetime.datetime:
-    """Convert local time to UTC time based on offset."""
-    return local_time - offset
+def datetime_to_epoch(dt: datetime.datetime) -> int:
+    """Convert a naive datetime to whole epoch seconds (microseconds are dropped)."""
+    return (dt - EPOCH) // ONE_SECOND
 
 
-def convert_utc_time_to_local_time(local_time: datetime.datetime, offset: relativedelta) -> datetime.datetime:
-    """Convert UTC time to local time based on offset."""
-    return local_time + offset
+def format_epoch(epoch: int) -> str:
+    """Format epoch seconds as YYYY-MM-DD HH:MM:SS."""
+    return str(EPOCH + datetime.timedelta(seconds=epoch))
 
 
-def convert_str_to_datetime(str_date: str) -> Union[datetime.datetime, None]:
-    """Convert string date in the format YYYY-MM-DD HH:MM:SS to datetime.datetime object.
+def parse_time_of_day(time_str: str) -> Union[int, None]:
+    """Parse time of day in the format HH:MM:SS (seconds are optional) to minute of day (0 - 1439).
 
-    :param str_date: String date in the format YYYY-MM-DD HH:MM:SS
-    :return: datetime.datetime object for success and None for failure
+    :param time_str: Time of day
+    :return: Minute of day for success and None for failure
     """
-    dt, sc = split_str_date_dt_sc(str_date)
-    if len(dt.split('-')) != 3 or len(sc.split(':')) != 3:
+    match = TIME_PATTERN.fullmatch(time_str.strip())
+    if not match:
         return None
-    yr, mo, dy = dt.split('-')
-    hr, mn, sc = sc.split(':')
-    itr = iter([mo, dy, hr, mn, sc])
-    no_char_accepted = 2
-    if len(yr) != 4 or any(len(elem) > no_char_accepted for elem in itr):
+    hr, mn, sc = (int(x) for x in match.groups(0))
+    if hr > 23 or mn > 59 or sc > 59:
         return None
-    dt_tuple = [int(x) for x in [yr, mo, dy, hr, mn, sc] if x.isdigit()]
-    return datetime.datetime(dt_tuple[0], dt_tuple[1], dt_tuple[2], dt_tuple[3], dt_tuple[4],
-                             dt_tuple[5]) if len(dt_tuple) == 6 else None
+    return hr * 60 + mn
+
+
+def format_minute_of_day(minute: int) -> str:
+    """Format minute of day as HH:MM:SS."""
+    return f"{minute // 60:02d}:{minute % 60:02d}:00"
 
 
-def split_str_date_dt_sc(str_date: str) -> Tuple:
-    """Split string date to date and time.
+def parse_utc_offset(offset: str) -> Union[int, None]:
+    """Parse UTC offset in the format +/-HH:MM to signed minutes.
 
-    :param str_date: String date in the format YYYY-MM-DD
-    :return: Tuple with date and time
+    :param offset: UTC offset
+    :return: Minutes east of UTC for success and None for failure
     """
-    if ' ' not in str_date:
-        dt = str_date
-        sc = '00:00:00'
-    else:
-        dt, sc = str_date.split()
-    return dt, sc
+    match = UTC_OFFSET_PATTERN.fullmatch(offset.strip())
+    if not match:
+        return None
+    sign, hr, mn = match.groups()
+    minutes = int(hr) * 60 + int(mn)
+    if int(mn) > 59 or minutes > MAX_UTC_OFFSET_MINUTES:
+        return None
+    return -minutes if sign == "-" else minutes
+
 
+def format_utc_offset(minutes: int) -> str:
+    """Format signed minutes as UTC offset +/-HH:MM."""
+    hr, mn = divmod(abs(minutes), 60)
+    return f"{'-' if minutes < 0 else '+'}{hr:02d}:{mn:02d}"
 
-def build_clean_time_str(dt_delta: relativedelta) -> str:
+
+def build_clean_time_str(dt_delta: "relativedelta") -> str:
     """Format and create clean time string.
 
     :param dt_delta Relative time delta between NOW and clean date.
@@ -88,10 +97,21 @@ def build_clean_time_str(dt_delta: relativedelta) -> str:
     """
     # Number of days need correction as relativedelta calculates weeks and days separately and not together.
     days_corrected = dt_delta.days - dt_delta.weeks * 7
-    fmt_str = f'{format_string(dt_delta.years, "year")}{format_string(dt_delta.months, "month")}' \
-              f'{format_string(dt_delta.weeks, "week")}{format_string(days_corrected, "day")}' \
-              f'and{format_string(dt_delta.hours, "hour")}{format_string(dt_delta.minutes, "minute")}' \
-              f'{format_string(dt_delta.seconds, "second")}'
+    return format_clean_time_str(dt_delta.years, dt_delta.months, dt_delta.weeks, days_corrected, dt_delta.hours,
+                                 dt_delta.minutes, dt_delta.seconds)
+
+
+def format_clean_time_str(years: int, months: int, weeks: int, days: int, hours: int, minutes: int,
+                          seconds: int) -> str:
+    """Format and create clean time string from its fields.
+
+    :param days: Days on top of the weeks
+    :return: Cleaned string representation of Clean Time
+    """
+    fmt_str = f'{format_string(years, "year")}{format_string(months, "month")}' \
+              f'{format_string(weeks, "week")}{format_string(days, "day")}' \
+              f'and{format_string(hours, "hour")}{format_string(minutes, "minute")}' \
+              f'{format_string(seconds, "second")}'
     return fmt_str.strip()
 
 
@@ -140,27 +160,18 @@ def format_prayer(prayer: dict) -> str:
     return f'<i><u><b>{prayer["Name"]}</b></u></i>\n\n{prayer["Prayer"]}'
 
 
-def get_reading_prayer_name(update: Update) -> str:
-    """Get Reading or Prayer name."""
-    if hasattr(update.message, 'text'):
-        return MenuElements[update.message.text[1:].upper()].value.name
-    else:
-        ch = update.callback_query.data
-        return get_menu_element_from_chr(ch)
-
-
 def convert_tuple_to_user_dict(tuple_data: Tuple) -> dict:
     """Convert tuple record from DB to user dictionary.
 
-    :param tuple_data: User data from DB
+    :param tuple_data: User data from DB, columns in the order of TABLE_COLUMNS
     :return: Dict in the format -> {UserID
                                     UserName
                                     FirstName
                                     LastName
                                     Addictions
-                                    CleanDateTime
-                                    UTCOffset
-                                    DailyNotification}
+                                    CleanDateTime  # Epoch seconds or None
+                                    UTCOffset  # Signed minutes or None
+                                    DailyNotification}  # Local minute of day or None
     """
     addictions = tuple_data[4].split(", ")
     if addictions[0] == "":
@@ -224,31 +235,16 @@ def convert_tuple_to_prayer_dict(tuple_data: Tuple) -> dict:
     return prayer
 
 
-def convert_utc_offset_str_relative_delta(offset_str) -> relativedelta:
-    if offset_str:
-        hr = int(offset_str[1:].split(':')[0])
-        mn = int(offset_str[1:].split(':')[1])
-        offset = relativedelta(hours=hr, minutes=mn, seconds=0)
-    else:
-        offset = relativedelta(hours=0, minute=0, seconds=0)
-    return offset
-
-
 def get_user_profile_str(user: dict) -> str:
     """Get user profile string."""
     user_profile_str = Strings.PROFILE_FIRSTNAME_LASTNAME.format(user['FirstName'], user['LastName'])
     if user['Addictions']:
         user_profile_str += "\n" + Strings.PROFILE_ADDICTIONS.format(', '.join(user['Addictions']))
-    if user['CleanDateTime']:
-        user_profile_str += "\n" + Strings.PROFILE_CLEAN_DATE.format(user['CleanDateTime'])
-    if user['UTCOffset']:
-        user_profile_str += "\n" + Strings.PROFILE_UTC_OFFSET.format(user['UTCOffset'])
-    if user['DailyNotification']:
-        user_profile_str += "\n" + Strings.PROFILE_DAILY_NOTIFICATION.format(user['DailyNotification'])
+    if user['CleanDateTime'] is not None:
+        user_profile_str += "\n" + Strings.PROFILE_CLEAN_DATE.format(format_epoch(user['CleanDateTime']))
+    if user['UTCOffset'] is not None:
+        user_profile_str += "\n" + Strings.PROFILE_UTC_OFFSET.format(format_utc_offset(user['UTCOffset']))
+    if user['DailyNotification'] is not None:
+        user_profile_str += "\n" + Strings.PROFILE_DAILY_NOTIFICATION.format(
+            format_minute_of_day(user['DailyNotification']))
     return user_profile_str
-
-
-def modify_str_int_value(value) -> Union[str, int]:
-    """SQL query needs quotes present for string values. Return value if value is integer else return value wrapped
-    in quotes."""
-    return value if isinstance(value, int) else f"'{value}'"